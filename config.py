@@ -1,22 +1,54 @@
 from dotenv import load_dotenv
+import importlib.util
 import os
 
 # Cargar .env desde la raíz del proyecto
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
 
+def _env_bool(name: str, default: str = "no") -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "yes", "true", "si", "sí")
+
 DB_SERVER = os.getenv("DB_SERVER")
 DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
+DB_DRIVER = os.getenv("DB_DRIVER", "SQL Server")
+
+# Pool de conexiones del engine de SQLAlchemy
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", "yes")
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # segundos; -1 = nunca
+DB_FAST_EXECUTEMANY = _env_bool("DB_FAST_EXECUTEMANY", "yes")
+# Abrir una conexión en segundo plano al arrancar la app
+DB_WARMUP = _env_bool("DB_WARMUP", "yes")
 
 # Consulta por defecto
 CONSULTA = os.getenv("CONSULTA", "")
+# Consulta parametrizada opcional filtrada en servidor; admite :start_date, :end_date
+# y, opcionalmente, :idioma y :grupo. Si está definida tiene prioridad sobre CONSULTA.
+CONSULTA_RANGO = os.getenv("CONSULTA_RANGO", "")
+# Filas por bloque al leer la consulta en streaming (0 = leer todo de una vez)
+DB_CHUNKSIZE = int(os.getenv("DB_CHUNKSIZE", "5000"))
+
+# Caché local de resultados de la consulta (Parquet; por defecto solo si pyarrow está instalado)
+QUERY_CACHE_ENABLED = _env_bool("QUERY_CACHE_ENABLED", "yes" if importlib.util.find_spec("pyarrow") else "no")
+QUERY_CACHE_DIR = os.getenv("QUERY_CACHE_DIR", ".cache/consultas")
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", "86400"))  # segundos; 0 = sin caducidad
+# Sonda de frescura opcional, p. ej. "SELECT MAX(updated_at) FROM dbo.Matriculas"
+CONSULTA_FRESHNESS = os.getenv("CONSULTA_FRESHNESS", "")
 
 # Rutas de salida
 OUTPUT_FILE = os.getenv("OUTPUT_FILE", "calendario_clases.xlsx")
 
 # JSON festivos
 FESTIVOS_JSON = os.getenv("FESTIVOS_JSON", "festivos.json")
+FESTIVOS_SAVE_DELAY_MS = int(os.getenv("FESTIVOS_SAVE_DELAY_MS", "500"))  # agrupa cambios seguidos en una escritura
+
+# Exportación iCalendar (.ics)
+ICS_UID_DOMAIN = os.getenv("ICS_UID_DOMAIN", "gencal.local")  # UID = <Title>@<dominio>: no cambiarlo entre exportaciones
+ICS_CALENDAR_NAME = os.getenv("ICS_CALENDAR_NAME", "Calendario de clases")
+ICS_EXPORT_WORKERS = int(os.getenv("ICS_EXPORT_WORKERS", "4"))  # ficheros escritos a la vez (un .ics por PERNR/Grupo)
 
 # Configuración de SharePoint
 SP_CLIENT_ID = os.getenv("SP_CLIENT_ID")
@@ -27,6 +59,31 @@ SP_SITE_PATH = os.getenv("SP_SITE_PATH")
 SP_LIST_NAME = os.getenv("SP_LIST_NAME", "CalendarioClases")
 SP_DATE_FIELD = os.getenv("SP_DATE_FIELD", "Fecha")
 
+# Caché de metadatos de Graph (site id, list id, columnas)
+SP_CACHE_FILE = os.getenv("SP_CACHE_FILE", "sp_metadata_cache.json")
+SP_CACHE_TTL = int(os.getenv("SP_CACHE_TTL", "86400"))  # segundos; 0 = sin caducidad
+# Contar elementos de la lista al conectar (lento en listas grandes)
+SP_COUNT_ON_CONNECT = _env_bool("SP_COUNT_ON_CONNECT")
+# Peticiones $batch en vuelo en total cuando se sincronizan varias listas a la vez
+SP_THROTTLE_BUDGET = int(os.getenv("SP_THROTTLE_BUDGET", "4"))
+
+# Logs de la aplicación
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()  # DEBUG muestra los diagnósticos de sync
+LOG_MAX_LINES = int(os.getenv("LOG_MAX_LINES", "5000"))  # líneas en memoria y en el visor
+LOG_FLUSH_MS = int(os.getenv("LOG_FLUSH_MS", "100"))  # cada cuánto se vuelca al visor
+LOG_FILE = os.getenv("LOG_FILE", "")  # vacío = sin fichero
+LOG_FILE_MAX_BYTES = int(os.getenv("LOG_FILE_MAX_BYTES", str(5 * 1024 * 1024)))
+LOG_FILE_BACKUPS = int(os.getenv("LOG_FILE_BACKUPS", "3"))
+
+# Trazas de rendimiento (ventana "Rendimiento" y exportación JSON / Chrome trace)
+TRACE_ENABLED = _env_bool("TRACE_ENABLED", "yes")
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "20000"))
+
+# Perfilado (cProfile + tracemalloc + lag del event loop) de cada acción; también con el interruptor "Perfilar"
+PROFILE_ENABLED = _env_bool("PROFILE_ENABLED", "no")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")  # un subdirectorio con fecha por acción
+PROFILE_LOOP_LAG_INTERVAL = float(os.getenv("PROFILE_LOOP_LAG_INTERVAL", "0.05"))  # segundos entre muestras
+
 COLORS = {    
     'success': "#229150",
     'warning': '#F39C12', 
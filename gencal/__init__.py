@@ -0,0 +1,7 @@
+"""
+Línea de comandos sin interfaz gráfica: `python -m gencal <subcomando>`.
+
+Usa los mismos servicios que la aplicación (CalendarService, DatabaseService,
+SharePointService) y no importa Tk, así que puede ejecutarse en un servidor o
+desde una tarea programada.
+"""
@@ -0,0 +1,347 @@
+# File: gencal/cli.py
+"""
+Subcomandos:
+
+    generate   INICIO FIN [-o FICHERO]   genera el calendario desde la BD y lo guarda
+    export     [-o FICHERO]              descarga la lista de SharePoint a fichero
+    load       FICHERO [-o FICHERO]      lee/valida un calendario (y lo convierte de formato)
+    sync       FICHERO --mode MODO       sube un calendario a SharePoint (replace/update)
+    ics        FICHERO -o SALIDA.ics     exporta a iCalendar (--split PERNR|Grupo: un .ics por valor)
+    delete-all [--yes]                   vacía la lista de SharePoint
+    bench      INICIO FIN                mide generación, escritura y lectura por formato
+    batch      FICHERO                   lote de calendarios (ver services/batch.py)
+
+El progreso se muestra en stdout y los logs en stderr. Códigos de salida:
+0 correcto, 1 error, 2 uso incorrecto, 3 sin datos, 130 interrumpido (Ctrl+C).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2
+EXIT_NO_DATA = 3
+EXIT_INTERRUPTED = 130
+
+
+def log(message: str):
+    """log_callback de los servicios: una línea con fecha en stderr"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"{timestamp} - {message}", file=sys.stderr, flush=True)
+
+
+class ConsoleProgress:
+    """
+    Sink de ProgressEvent para la consola. En un terminal reescribe una sola
+    línea; redirigido a fichero escribe como mucho una línea por segundo.
+    """
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._tty = self.stream.isatty()
+        self._min_interval = 0.2 if self._tty else 1.0
+        self._last = 0.0
+        self._width = 0
+
+    def __call__(self, event):
+        now = time.monotonic()
+        if not event.finished and now - self._last < self._min_interval:
+            return
+        self._last = now
+        text = event.format()
+        if self._tty:
+            self.stream.write("\r" + text.ljust(self._width) + ("\n" if event.finished else ""))
+            self._width = 0 if event.finished else len(text)
+        else:
+            self.stream.write(text + "\n")
+        self.stream.flush()
+
+
+class SourceProgress:
+    """Progreso de varios objetivos a la vez: una línea por objetivo cada pocos segundos"""
+    def __init__(self, stream=None, min_interval: float = 2.0):
+        self.stream = stream or sys.stdout
+        self.min_interval = min_interval
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, source, event):
+        key = (source, event.phase)
+        now = time.monotonic()
+        with self._lock:
+            if not event.finished and now - self._last.get(key, 0.0) < self.min_interval:
+                return
+            self._last[key] = now
+            self.stream.write(f"[{source}] {event.format()}\n")
+            self.stream.flush()
+
+
+def _parse_date(value: str) -> datetime:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"fecha no válida '{value}' (formato YYYY-MM-DD)")
+
+
+def _output_path(template: str, start: datetime, end: datetime) -> str:
+    """Admite {start}/{end} en la ruta para procesar varios rangos sin pisar ficheros"""
+    return template.format(start=start.strftime("%Y%m%d"), end=end.strftime("%Y%m%d"))
+
+
+def _sink(progress):
+    from services.events import CallbackSink
+    return CallbackSink(log_fn=log, progress_fn=progress)
+
+
+def _generate(args, progress, output=None):
+    from services.calendar_service import default_query
+    from services.holiday_service import load_festivos
+    from services.workers import generate_calendar_job
+
+    sql_query, params = default_query(args.start, args.end)
+    if not sql_query:
+        raise ValueError("No hay consulta configurada (CONSULTA o CONSULTA_RANGO en .env)")
+    return generate_calendar_job(
+        args.start, args.end, sink=_sink(progress),
+        festivos=load_festivos(args.festivos, log_callback=log), output=output,
+        sql_query=sql_query, params=params, refresh=args.refresh,
+    )
+
+
+def _sharepoint():
+    from services.sharepoint_service import SharePointService
+
+    service = SharePointService(log_callback=log)
+    if not service.authenticate():
+        raise RuntimeError("No se pudo autenticar en SharePoint")
+    return service
+
+
+# ------------------------------
+# SUBCOMANDOS
+# ------------------------------
+def cmd_generate(args, progress) -> int:
+    result = _generate(args, progress, output=_output_path(args.output, args.start, args.end))
+    if not result.rows:
+        log("⚠️ El calendario está vacío; no se escribe fichero")
+        return EXIT_NO_DATA
+    print(f"{result.rows} registros -> {result.output} ({result.seconds:.1f}s, {result.rows_per_s:.0f} filas/s)")
+    return EXIT_OK
+
+
+def cmd_export(args, progress) -> int:
+    from services.progress import ProgressTracker
+
+    service = _sharepoint()
+    tracker = ProgressTracker("Descarga", sink=progress)
+    service.export_list(args.output, progress_cb=tracker.update)
+    event = tracker.finish()
+    print(f"{event.done} elementos -> {args.output}")
+    return EXIT_OK
+
+
+def cmd_load(args, progress) -> int:
+    from services.excel_service import guardar_calendario, leer_calendario
+
+    df = leer_calendario(args.file, log_fn=log)
+    if df.empty:
+        log("⚠️ El fichero no contiene registros")
+        return EXIT_NO_DATA
+    print(f"{len(df)} registros · columnas: {', '.join(map(str, df.columns))}")
+    if args.output:
+        guardar_calendario(df, args.output)
+        print(f"Convertido -> {args.output}")
+    return EXIT_OK
+
+
+def cmd_ics(args, progress) -> int:
+    from services.excel_service import leer_calendario
+    from services.ics_service import exportar_ics
+    from services.progress import ProgressTracker
+
+    df = leer_calendario(args.file, log_fn=log)
+    if df.empty:
+        log("⚠️ El fichero no contiene registros")
+        return EXIT_NO_DATA
+    tracker = ProgressTracker("Exportación ICS", total=len(df), sink=progress)
+    paths = exportar_ics(df, args.output, split_by=args.split, progress_cb=tracker.update, log_fn=log)
+    tracker.finish()
+    print(paths[0] if len(paths) == 1 else f"{len(paths)} ficheros junto a {args.output}")
+    return EXIT_OK
+
+
+def cmd_sync(args, progress) -> int:
+    from services.excel_service import leer_calendario
+    from services.workers import sync_calendar_job
+
+    df = leer_calendario(args.file, log_fn=log)
+    if df.empty:
+        log("⚠️ El fichero no contiene registros")
+        return EXIT_NO_DATA
+    result = sync_calendar_job(df, mode=args.mode, sink=_sink(progress))
+    print(f"{result.rows} registros sincronizados ({args.mode}) en {result.seconds:.1f}s")
+    return EXIT_OK
+
+
+def cmd_delete_all(args, progress) -> int:
+    from services.profiling import run_coroutine
+    from services.progress import ProgressTracker
+
+    if not args.yes:
+        log("❌ delete-all borra TODOS los elementos de la lista; repite con --yes para confirmar")
+        return EXIT_USAGE
+    service = _sharepoint()
+    tracker = ProgressTracker("Borrado", sink=progress)
+    ok = run_coroutine(service.delete_all_items_async(
+        progress_cb=tracker.update,
+        throttle_cb=tracker.add_throttle
+    ))
+    tracker.finish()
+    return EXIT_OK if ok else EXIT_ERROR
+
+
+def cmd_bench(args, progress) -> int:
+    from services.excel_service import guardar_calendario, leer_calendario
+    from services.table_writers import COLUMNAR_SUFFIXES, pyarrow_available
+
+    result = _generate(args, progress)
+    df = result.data
+    results = [("generate", result.seconds, None)]
+    if df.empty:
+        log("⚠️ El calendario está vacío; no hay nada que medir")
+        return EXIT_NO_DATA
+
+    formats = [f".{fmt.strip().lstrip('.')}" for fmt in args.formats.split(",") if fmt.strip()]
+    if not pyarrow_available():
+        skipped = [fmt for fmt in formats if fmt in COLUMNAR_SUFFIXES]
+        if skipped:
+            log(f"⚠️ pyarrow no está instalado: se omiten {', '.join(skipped)}")
+        formats = [fmt for fmt in formats if fmt not in COLUMNAR_SUFFIXES]
+
+    with tempfile.TemporaryDirectory(prefix="gencal-bench-") as tmp:
+        for fmt in formats:
+            filepath = os.path.join(tmp, f"calendario{fmt}")
+            t0 = time.perf_counter()
+            guardar_calendario(df, filepath)
+            results.append((f"write {fmt[1:]}", time.perf_counter() - t0, os.path.getsize(filepath)))
+            t0 = time.perf_counter()
+            leer_calendario(filepath)
+            results.append((f"read {fmt[1:]}", time.perf_counter() - t0, None))
+
+    print(f"\n{len(df)} registros")
+    print(f"{'paso':<16}{'segundos':>10}{'filas/s':>12}{'tamaño':>12}")
+    for name, seconds, size in results:
+        rate = len(df) / seconds if seconds > 0 else 0.0
+        size_txt = f"{size / 1024:.0f} KB" if size is not None else ""
+        print(f"{name:<16}{seconds:>10.3f}{rate:>12.0f}{size_txt:>12}")
+    return EXIT_OK
+
+
+def cmd_batch(args, progress) -> int:
+    from services.batch import format_summary, load_batch_spec, run_batch
+
+    targets, options = load_batch_spec(args.spec)
+    if not targets:
+        log("❌ El fichero de lote no tiene objetivos")
+        return EXIT_USAGE
+
+    kwargs = {"workers": args.workers or options.get("workers")}
+    max_in_flight = args.max_in_flight or options.get("max_in_flight")
+    if max_in_flight:
+        kwargs["max_in_flight"] = max_in_flight
+    outcomes, budget = run_batch(targets, log, SourceProgress(), sync=not args.no_sync, **kwargs)
+
+    print()
+    print(format_summary(outcomes, budget))
+    return EXIT_OK if all(o.ok for o in outcomes) else EXIT_ERROR
+
+
+def build_parser() -> argparse.ArgumentParser:
+    from config import OUTPUT_FILE
+
+    parser = argparse.ArgumentParser(prog="python -m gencal", description="Generador de calendario de clases (sin UI)")
+    parser.add_argument("--trace", metavar="FICHERO",
+                        help="al terminar, guarda los spans de rendimiento en formato Chrome trace")
+    parser.add_argument("--profile", action="store_true",
+                        help="perfila el subcomando (cProfile + tracemalloc + lag del event loop) en PROFILE_DIR")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_range(p):
+        p.add_argument("start", type=_parse_date, help="fecha inicio (YYYY-MM-DD)")
+        p.add_argument("end", type=_parse_date, help="fecha fin (YYYY-MM-DD)")
+        p.add_argument("--festivos", help="JSON de festivos (por defecto FESTIVOS_JSON)")
+        p.add_argument("--refresh", action="store_true", help="ignorar la caché de la consulta")
+
+    p = sub.add_parser("generate", help="generar el calendario desde la BD")
+    add_range(p)
+    p.add_argument("-o", "--output", default=OUTPUT_FILE,
+                   help="fichero de salida (.xlsx/.parquet/.feather/.csv/.ics); admite {start} y {end}")
+    p.set_defaults(func=cmd_generate)
+
+    p = sub.add_parser("export", help="descargar la lista de SharePoint a fichero")
+    p.add_argument("-o", "--output", default="sharepoint_export.xlsx", help="fichero de salida")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("load", help="leer y validar un calendario")
+    p.add_argument("file")
+    p.add_argument("-o", "--output", help="guardar también en este fichero (conversión de formato)")
+    p.set_defaults(func=cmd_load)
+
+    p = sub.add_parser("ics", help="exportar un calendario a iCalendar (Outlook / Google Calendar)")
+    p.add_argument("file")
+    p.add_argument("-o", "--output", default="calendario.ics",
+                   help="fichero .ics (con --split, prefijo: <nombre>_<valor>.ics)")
+    p.add_argument("--split", choices=["PERNR", "Grupo"], help="un fichero por persona o por grupo")
+    p.set_defaults(func=cmd_ics)
+
+    p = sub.add_parser("sync", help="subir un calendario a SharePoint")
+    p.add_argument("file")
+    p.add_argument("--mode", choices=["replace", "update"], default="update",
+                   help="replace: borra todo y reinserta; update: inserta solo Title nuevos")
+    p.set_defaults(func=cmd_sync)
+
+    p = sub.add_parser("delete-all", help="borrar todos los elementos de la lista")
+    p.add_argument("--yes", action="store_true", help="confirmar el borrado")
+    p.set_defaults(func=cmd_delete_all)
+
+    p = sub.add_parser("bench", help="medir generación y escritura/lectura por formato")
+    add_range(p)
+    p.add_argument("--formats", default="xlsx,parquet,feather", help="formatos separados por comas")
+    p.set_defaults(func=cmd_bench)
+
+    p = sub.add_parser("batch", help="generar y sincronizar varios calendarios (JSON/YAML)")
+    p.add_argument("spec", help="fichero de lote")
+    p.add_argument("--workers", type=int, help="procesos para la generación (por defecto, uno por objetivo hasta nº de CPUs)")
+    p.add_argument("--max-in-flight", type=int, help="batches de SharePoint en vuelo en total (SP_THROTTLE_BUDGET)")
+    p.add_argument("--no-sync", action="store_true", help="solo generar (guarda <objetivo>.parquet, o .xlsx sin pyarrow, si no hay 'output')")
+    p.set_defaults(func=cmd_batch)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if hasattr(args, "start") and args.start > args.end:
+        log("❌ La fecha inicio debe ser anterior o igual a fecha fin")
+        return EXIT_USAGE
+    try:
+        if args.profile:
+            from services.profiling import ProfileSession
+            with ProfileSession(f"cli-{args.command}", log_callback=log):
+                return args.func(args, ConsoleProgress())
+        return args.func(args, ConsoleProgress())
+    except KeyboardInterrupt:
+        log("🛑 Interrumpido por el usuario")
+        return EXIT_INTERRUPTED
+    except Exception as e:
+        log(f"❌ {type(e).__name__}: {e}")
+        return EXIT_ERROR
+    finally:
+        if args.trace:
+            from services.tracing import tracer
+            tracer.export_chrome_trace(args.trace)
+            log(f"🧭 Trazas guardadas en {args.trace}")
@@ -1,9 +1,35 @@
+import sys
+import time
+
+_START = time.perf_counter()
+
 from ui.main_window import SharePointSyncApp
 
+# Módulos pesados que no deberían cargarse antes de pintar la ventana
+HEAVY_MODULES = ("pandas", "numpy", "sqlalchemy", "pyodbc", "msal", "aiohttp", "requests", "openpyxl")
+
+
+def print_startup_report(import_s: float):
+    """Imprime tiempos de arranque y qué módulos pesados ya están cargados"""
+    paint_s = time.perf_counter() - _START
+    loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+    print(f"[startup] imports UI: {import_s * 1000:.0f} ms")
+    print(f"[startup] ventana pintada: {paint_s * 1000:.0f} ms")
+    print(f"[startup] módulos pesados cargados: {', '.join(loaded) if loaded else 'ninguno'}")
+    print("[startup] detalle por módulo: python -X importtime main.py 2> importtime.log")
+
+
 def main():
     """Main application entry point"""
+    import_s = time.perf_counter() - _START
     app = SharePointSyncApp()
+    if "--startup-report" in sys.argv:
+        # after_idle se ejecuta cuando Tk ha procesado el primer repintado
+        app.after_idle(lambda: print_startup_report(import_s))
     app.mainloop()
+    app.holiday_writer.flush()
+    app.log_manager.shutdown()
+
 
 if __name__ == "__main__":
     main()
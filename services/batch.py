@@ -0,0 +1,257 @@
+# File: services/batch.py
+"""
+Orquestación por lotes: varios (consulta, rango, festivos, site, lista).
+
+1. Las lecturas de BD y la generación se reparten en un ProcessPoolExecutor
+   (cada proceso con su propio pool de conexiones).
+2. Las sincronizaciones con SharePoint se lanzan en paralelo (hilos) bajo un
+   único ThrottleBudget: peticiones en vuelo limitadas en total y los
+   Retry-After de un 429 pausan a todas.
+
+Formato del fichero (JSON, o YAML si está instalado PyYAML):
+
+    {
+      "workers": 4,
+      "max_in_flight": 4,
+      "defaults": {"festivos": "festivos.json", "mode": "update"},
+      "targets": [
+        {"name": "madrid-t1", "start": "2025-09-01", "end": "2025-12-19",
+         "site_path": "/sites/Madrid", "list": "CalendarioMadrid", "mode": "replace"}
+      ]
+    }
+
+Campos por objetivo: name, start, end, query, festivos, idioma, grupo,
+site_host, site_path, list, mode, output, refresh y sync (true/false).
+"""
+import json
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from config import SP_THROTTLE_BUDGET
+from services.events import CallbackSink, QueueSink, drain
+from services.table_writers import pyarrow_available
+from services.throttle import ThrottleBudget
+from services.workers import WorkerResult, generate_calendar_job, sync_calendar_job
+
+
+@dataclass
+class BatchTarget:
+    """Un calendario a generar y, opcionalmente, sincronizar."""
+    name: str
+    start: datetime
+    end: datetime
+    query: Optional[str] = None
+    festivos: Optional[str] = None
+    idioma: Optional[str] = None
+    grupo: Optional[str] = None
+    site_host: Optional[str] = None
+    site_path: Optional[str] = None
+    list_name: Optional[str] = None
+    mode: str = "update"
+    output: Optional[str] = None
+    refresh: bool = False
+    sync: bool = True
+
+
+@dataclass
+class BatchOutcome:
+    target: BatchTarget
+    generated: Optional[WorkerResult] = None
+    synced: Optional[WorkerResult] = None
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+def _parse_target(raw: dict, defaults: dict, index: int) -> BatchTarget:
+    data = {**defaults, **raw}
+    for key in ("start", "end"):
+        if key not in data:
+            raise ValueError(f"Objetivo #{index}: falta '{key}'")
+    mode = data.get("mode", "update")
+    if mode not in ("replace", "update"):
+        raise ValueError(f"Objetivo #{index}: mode '{mode}' no válido (replace/update)")
+    start = datetime.strptime(str(data["start"]), "%Y-%m-%d")
+    end = datetime.strptime(str(data["end"]), "%Y-%m-%d")
+    if start > end:
+        raise ValueError(f"Objetivo #{index}: la fecha inicio es posterior a la fecha fin")
+    return BatchTarget(
+        name=data.get("name") or f"{data.get('list', 'calendario')}-{start:%Y%m%d}",
+        start=start,
+        end=end,
+        query=data.get("query"),
+        festivos=data.get("festivos"),
+        idioma=data.get("idioma"),
+        grupo=data.get("grupo"),
+        site_host=data.get("site_host"),
+        site_path=data.get("site_path"),
+        list_name=data.get("list"),
+        mode=mode,
+        output=data.get("output"),
+        refresh=bool(data.get("refresh", False)),
+        sync=bool(data.get("sync", True)),
+    )
+
+
+def load_batch_spec(path: str) -> Tuple[List[BatchTarget], dict]:
+    """Lee el fichero de lote; devuelve (objetivos, opciones globales)"""
+    p = Path(path)
+    with p.open("r", encoding="utf-8") as f:
+        if p.suffix.lower() in (".yml", ".yaml"):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("Para ficheros YAML instala PyYAML (o usa JSON)")
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+
+    if isinstance(spec, list):
+        spec = {"targets": spec}
+    defaults = spec.get("defaults", {})
+    targets = [_parse_target(raw, defaults, i) for i, raw in enumerate(spec.get("targets", []), 1)]
+    names = [t.name for t in targets]
+    duplicated = {n for n in names if names.count(n) > 1}
+    if duplicated:
+        raise ValueError(f"Nombres de objetivo repetidos: {', '.join(sorted(duplicated))}")
+    options = {k: spec[k] for k in ("workers", "max_in_flight") if k in spec}
+    return targets, options
+
+
+def _query_for(target: BatchTarget):
+    from services.calendar_service import date_range_params, default_query
+
+    if target.query:
+        return target.query, date_range_params(target.start, target.end, target.idioma, target.grupo)
+    sql_query, params = default_query(target.start, target.end)
+    if params is not None:
+        params.update(idioma=target.idioma, grupo=target.grupo)
+    return sql_query, params
+
+
+def _intermediate_suffix() -> str:
+    """Formato del resultado de la generación: Parquet si hay pyarrow; si no, Excel (openpyxl)"""
+    return ".parquet" if pyarrow_available() else ".xlsx"
+
+
+def run_batch(targets: List[BatchTarget],
+              log_fn: Callable[[str], None],
+              progress_fn: Callable[[str, object], None],
+              workers: Optional[int] = None,
+              max_in_flight: int = SP_THROTTLE_BUDGET,
+              sync: bool = True) -> Tuple[List[BatchOutcome], ThrottleBudget]:
+    """
+    Ejecuta el lote completo. `progress_fn(objetivo, ProgressEvent)` recibe el
+    progreso de todos los objetivos. Devuelve los resultados y el presupuesto
+    compartido (con los 429 y segundos de throttling acumulados).
+    """
+    from services.holiday_service import load_festivos
+
+    outcomes = {t.name: BatchOutcome(t) for t in targets}
+    budget = ThrottleBudget(max_in_flight=max_in_flight)
+    workers = workers or max(1, min(len(targets), os.cpu_count() or 1))
+
+    with tempfile.TemporaryDirectory(prefix="gencal-batch-") as tmp:
+        # ---- 1. Generación en procesos ----
+        log_fn(f"🏭 Generando {len(targets)} calendarios con {workers} procesos...")
+        with multiprocessing.Manager() as manager:
+            events = manager.Queue()
+
+            def on_log(source, message):
+                log_fn(f"[{source}] {message}")
+
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {}
+                suffix = _intermediate_suffix()
+                for t in targets:
+                    sql_query, params = _query_for(t)
+                    if not sql_query:
+                        outcomes[t.name].errors.append("No hay consulta configurada")
+                        continue
+                    if t.output:
+                        output = t.output
+                    elif sync and t.sync:
+                        output = os.path.join(tmp, f"{len(futures)}{suffix}")
+                    else:
+                        output = f"{t.name}{suffix}"  # sin sincronización: se conserva el resultado
+                    future = pool.submit(
+                        generate_calendar_job, t.start, t.end, QueueSink(events, t.name),
+                        load_festivos(t.festivos, log_callback=lambda m, n=t.name: on_log(n, m)), output,
+                        sql_query, params, t.refresh
+                    )
+                    futures[future] = t
+
+                pending = set(futures)
+                while pending:
+                    done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                    drain(events, on_log, progress_fn)
+                    for future in done:
+                        t = futures[future]
+                        try:
+                            outcomes[t.name].generated = future.result()
+                        except Exception as e:
+                            outcomes[t.name].errors.append(f"generación: {e}")
+                drain(events, on_log, progress_fn)
+
+        # ---- 2. Sincronización concurrente con presupuesto compartido ----
+        to_sync = [
+            o for o in outcomes.values()
+            if sync and o.target.sync and o.ok and o.generated and o.generated.rows
+        ]
+        if to_sync:
+            from services.sharepoint_service import SharePointService
+
+            # Token una sola vez antes de lanzar los hilos (evita varios device flows a la vez)
+            SharePointService(log_callback=log_fn).initialize()
+            log_fn(f"☁️ Sincronizando {len(to_sync)} listas (máx. {budget.max_in_flight} batches en vuelo)...")
+
+            def sync_one(outcome: BatchOutcome):
+                t = outcome.target
+                sink = CallbackSink(
+                    log_fn=lambda m, n=t.name: log_fn(f"[{n}] {m}"),
+                    progress_fn=lambda e, n=t.name: progress_fn(n, e),
+                    source=t.name,
+                )
+                return sync_calendar_job(
+                    outcome.generated.output, mode=t.mode, sink=sink,
+                    site_host=t.site_host, site_path=t.site_path, list_name=t.list_name,
+                    throttle_budget=budget,
+                )
+
+            with ThreadPoolExecutor(max_workers=len(to_sync)) as pool:
+                futures = {pool.submit(sync_one, o): o for o in to_sync}
+                for future in futures:
+                    outcome = futures[future]
+                    try:
+                        outcome.synced = future.result()
+                    except Exception as e:
+                        outcome.errors.append(f"sincronización: {e}")
+
+    return list(outcomes.values()), budget
+
+
+def format_summary(outcomes: List[BatchOutcome], budget: Optional[ThrottleBudget] = None) -> str:
+    """Tabla de rendimiento por objetivo"""
+    lines = [f"{'objetivo':<24}{'filas':>9}{'gen s':>9}{'gen f/s':>10}{'sync s':>9}{'sync el/s':>11}  estado"]
+    for o in outcomes:
+        gen, syn = o.generated, o.synced
+        lines.append(
+            f"{o.target.name[:23]:<24}"
+            f"{(gen.rows if gen else 0):>9}"
+            f"{(f'{gen.seconds:.1f}' if gen else '-'):>9}"
+            f"{(f'{gen.rows_per_s:.0f}' if gen else '-'):>10}"
+            f"{(f'{syn.seconds:.1f}' if syn else '-'):>9}"
+            f"{(f'{syn.rows_per_s:.1f}' if syn else '-'):>11}"
+            f"  {'OK' if o.ok else '; '.join(o.errors)}"
+        )
+    if budget is not None and budget.penalties:
+        lines.append(f"Throttling compartido: {budget.penalties} respuestas 429/503, {budget.throttled_s:.0f}s de espera")
+    return "\n".join(lines)
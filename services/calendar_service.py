@@ -1,7 +1,32 @@
 # File: services/calendar_service.py
-from datetime import datetime, timedelta
-from typing import Optional, List
+from datetime import datetime
+from typing import Iterator, Optional, List, Union
 import pandas as pd
+from config import CONSULTA, CONSULTA_RANGO, DB_CHUNKSIZE
+from services.holiday_service import HolidayCalendar
+from services.jobs import JobCancelled, check_cancelled
+from services.tracing import span
+
+# Columnas del calendario generado (mismo orden que en la lista de SharePoint)
+CALENDAR_COLUMNS = ["Title", "PERNR", "Nombre", "Mail", "Fecha",
+                    "Grupo", "Idioma", "Asistencia", "Aviso24h", "Observaciones"]
+
+def date_range_params(start_date: datetime, end_date: datetime,
+                      idioma: Optional[str] = None, grupo: Optional[str] = None) -> dict:
+    """Parámetros para una consulta plantilla con :start_date/:end_date (y :idioma/:grupo)"""
+    return {
+        "start_date": pd.Timestamp(start_date).date(),
+        "end_date": pd.Timestamp(end_date).date(),
+        "idioma": idioma,
+        "grupo": grupo,
+    }
+
+
+def default_query(start_date: datetime, end_date: datetime):
+    """(sql, params): CONSULTA_RANGO parametrizada si está configurada; si no, CONSULTA"""
+    if CONSULTA_RANGO:
+        return CONSULTA_RANGO, date_range_params(start_date, end_date)
+    return CONSULTA, None
 
 class CalendarService:
     def __init__(self, db_service, log_callback=None):
@@ -18,65 +43,121 @@ class CalendarService:
                         start_date: datetime, 
                         end_date: datetime,
                         sql_query: str,
-                        festivos: Optional[List[str]] = None) -> pd.DataFrame:
-        """Generar calendario completo desde la BD"""
+                        festivos: Union[HolidayCalendar, List[str], None] = None,
+                        chunksize: Optional[int] = DB_CHUNKSIZE,
+                        refresh: bool = False,
+                        params: Optional[dict] = None,
+                        progress_cb: callable = None,
+                        cancel_event=None) -> pd.DataFrame:
+        """
+        Generar calendario completo desde la BD.
+
+        `params` se enlaza a la consulta (p. ej. :start_date/:end_date, ver
+        date_range_params) y `refresh` ignora la caché de la consulta.
+        `progress_cb(clases, total)` y `cancel_event` (threading.Event) son
+        opcionales; la cancelación se comprueba entre bloques.
+        """
         try:
             # Validar fechas
             if start_date > end_date:
                 raise ValueError("La fecha inicio debe ser anterior o igual a fecha fin")
 
+            if chunksize:
+                frames = list(self.iter_calendar(start_date, end_date, sql_query, festivos,
+                                                 chunksize, refresh, params,
+                                                 progress_cb, cancel_event))
+                if not frames:
+                    self.log_fn("La consulta no devolvió resultados")
+                    return pd.DataFrame()
+                return pd.concat(frames, ignore_index=True)
+
             # Obtener datos de BD
-            df = self.db_service.read_clases(sql_query)
+            df = self.db_service.read_clases(sql_query, refresh=refresh, params=params)
             if df.empty:
                 self.log_fn("La consulta no devolvió resultados")
                 return pd.DataFrame()
+            check_cancelled(cancel_event)
 
             # Generar calendario
-            return self.generate_calendar_from_df(df, start_date, end_date, festivos)
+            df_out = self.generate_calendar_from_df(df, start_date, end_date, festivos)
+            if progress_cb:
+                progress_cb(len(df), len(df))
+            return df_out
 
+        except JobCancelled:
+            self.log_fn("Generación de calendario cancelada")
+            raise
         except Exception as e:
             self.log_fn(f"Error generando calendario: {str(e)}")
             raise
 
+    def iter_calendar(self,
+                      start_date: datetime,
+                      end_date: datetime,
+                      sql_query: str,
+                      festivos: Union[HolidayCalendar, List[str], None] = None,
+                      chunksize: int = DB_CHUNKSIZE,
+                      refresh: bool = False,
+                      params: Optional[dict] = None,
+                      progress_cb: callable = None,
+                      cancel_event=None) -> Iterator[pd.DataFrame]:
+        """
+        Generar el calendario por bloques: cada bloque de clases leído de la BD
+        se expande a sesiones en cuanto llega, sin esperar al resto.
+        """
+        n_clases = 0
+        for df_chunk in self.db_service.iter_clases(sql_query, chunksize=chunksize,
+                                                    refresh=refresh, params=params):
+            check_cancelled(cancel_event)
+            if df_chunk.empty:
+                continue
+            n_clases += len(df_chunk)
+            self.log_fn(f"Procesando bloque de {len(df_chunk)} clases ({n_clases} acumuladas)")
+            yield self.generate_calendar_from_df(df_chunk, start_date, end_date, festivos)
+            if progress_cb:
+                progress_cb(n_clases, None)
+
     def generate_calendar_from_df(self, df_clases: pd.DataFrame,
                                 start_date: datetime,
                                 end_date: datetime,
-                                festivos: Optional[List[str]] = None) -> pd.DataFrame:
-        """Generar calendario desde DataFrame existente"""
-        festivos_set = set(festivos or [])
-        rows = []
-        start = pd.to_datetime(start_date).normalize()
-        end = pd.to_datetime(end_date).normalize()
-
-        for _, r in df_clases.iterrows():
-            dia = int(r["Dia"])
-            current = start
-            while current <= end:
-                if current.isoweekday() == dia and current.strftime("%Y-%m-%d") not in festivos_set:
-                    base_date = pd.Timestamp('1900-01-01')
-                    numero_dia = (current - base_date).days + 2
-                    titulo = f"{r['PERNR']}-{numero_dia}-{r['Idioma'][:3].upper()}"
+                                festivos: Union[HolidayCalendar, List[str], None] = None) -> pd.DataFrame:
+        """
+        Generar calendario desde DataFrame existente. `festivos` puede ser un
+        HolidayCalendar (reglas por año incluidas) o una lista de 'YYYY-MM-DD'.
+        """
+        with span("calendar.expand", rows=len(df_clases)) as s:
+            holidays = HolidayCalendar.coerce(festivos)
+            rows = []
+            start = pd.to_datetime(start_date).normalize()
+            end = pd.to_datetime(end_date).normalize()
+
+            # Días lectivos del rango agrupados por día de la semana (una sola vez por bloque)
+            days = pd.date_range(start, end, freq="D")
+            days = days[~holidays.mask(days)]
+            base_date = pd.Timestamp('1900-01-01')
+            by_weekday = {wd: [] for wd in range(1, 8)}
+            for current in days:
+                by_weekday[current.isoweekday()].append(
+                    (current.strftime("%Y-%m-%d"), (current - base_date).days + 2)
+                )
+
+            for _, r in df_clases.iterrows():
+                sufijo = r['Idioma'][:3].upper()
+                for fecha, numero_dia in by_weekday.get(int(r["Dia"]), []):
                     rows.append({
-                        "Title": titulo,
+                        "Title": f"{r['PERNR']}-{numero_dia}-{sufijo}",
                         "PERNR": r["PERNR"],
                         "Nombre": r["Nombre"],
                         "Mail": r["Mail"],
-                        "Fecha": current.strftime("%Y-%m-%d"),
+                        "Fecha": fecha,
                         "Grupo": r["Grupo"],
                         "Idioma": r["Idioma"],
                         "Asistencia": "Pendiente",
                         "Aviso24h": "",
                         "Observaciones": ""
                     })
-                current += timedelta(days=1)
-        
 
-
-        # ... al final de generate_calendar_from_df, justo antes del return ...
-        df_out = pd.DataFrame(
-            rows,
-            columns=["Title", "PERNR", "Nombre", "Mail", "Fecha",
-                    "Grupo", "Idioma", "Asistencia", "Aviso24h", "Observaciones"]
-        )
+            df_out = pd.DataFrame(rows, columns=CALENDAR_COLUMNS)
+            s.set(out_rows=len(df_out))
 
         return df_out
@@ -1,28 +1,118 @@
-import pandas as pd
-import urllib
-from sqlalchemy import create_engine
-from config import DB_SERVER, DB_NAME, DB_USER, DB_PASSWORD
+import re
+import threading
+import urllib.parse
+from typing import TYPE_CHECKING, Optional
+from config import (
+    DB_SERVER,
+    DB_NAME,
+    DB_USER,
+    DB_PASSWORD,
+    DB_DRIVER,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_FAST_EXECUTEMANY,
+    DB_CHUNKSIZE,
+    QUERY_CACHE_ENABLED,
+    QUERY_CACHE_DIR,
+    QUERY_CACHE_TTL,
+    CONSULTA_FRESHNESS
+)
+from services.query_cache import QueryResultCache
+from services.table_writers import pyarrow_available
+from services.tracing import span
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas y SQLAlchemy se importan bajo demanda: importar este módulo no debe
+# retrasar el arranque de la UI ni abrir conexiones.
+
+# Tipos explícitos de las columnas que usa el generador de calendario
+CLASES_DTYPES = {
+    "Dia": "Int8",
+    "PERNR": "string",
+    "Grupo": "string",
+    "Idioma": "string",
+    "Nombre": "string",
+    "Mail": "string",
+}
+
+_BIND_PARAM_RE = re.compile(r"(?<!:):([A-Za-z_]\w*)")
+
+def query_bind_names(sql_query: str) -> set:
+    """Nombres de parámetros `:nombre` que aparecen en la consulta"""
+    return set(_BIND_PARAM_RE.findall(sql_query))
+
+def _prepare_query(sql_query: str, params: Optional[dict]):
+    """Devuelve (consulta, parámetros) listos para pd.read_sql"""
+    if not params:
+        return sql_query, None
+    from sqlalchemy import text
+
+    # text() + parámetros enlazados: SQL Server puede filtrar por índice y reutilizar el plan
+    names = query_bind_names(sql_query)
+    return text(sql_query), {k: v for k, v in params.items() if k in names}
+
+def apply_clases_dtypes(df: "pd.DataFrame") -> "pd.DataFrame":
+    """Convierte las columnas conocidas a CLASES_DTYPES (las ausentes se ignoran)"""
+    import pandas as pd
+
+    for col, dtype in CLASES_DTYPES.items():
+        if col not in df.columns:
+            continue
+        if dtype == "string" and pd.api.types.is_float_dtype(df[col]):
+            # Códigos numéricos con NULL llegan como float: 123.0 -> "123"
+            df[col] = df[col].astype("Int64")
+        df[col] = df[col].astype(dtype)
+    return df
 
 class DatabaseService:
     def __init__(self, log_callback=None):
         self.log_fn = log_callback or (lambda x: None)
         self._engine = None
-        self._create_engine()
+        self._engine_lock = threading.Lock()
+        self.cache = None
+        if QUERY_CACHE_ENABLED and not pyarrow_available():
+            self.log_fn("⚠️ QUERY_CACHE_ENABLED necesita pyarrow; caché de consultas desactivada.")
+        elif QUERY_CACHE_ENABLED:
+            self.cache = QueryResultCache(QUERY_CACHE_DIR, ttl=QUERY_CACHE_TTL, log_callback=self.log_fn)
+
+    @property
+    def engine(self):
+        """SQLAlchemy engine, creado en el primer uso"""
+        if self._engine is None:
+            # El precalentamiento (DB_WARMUP) y un trabajo pueden llegar a la vez:
+            # solo uno crea el engine y su pool
+            with self._engine_lock:
+                if self._engine is None:
+                    self._create_engine()
+        return self._engine
 
     def _create_engine(self):
-        """Create SQLAlchemy engine with current config"""
+        """Create pooled SQLAlchemy engine with current config"""
+        from sqlalchemy import create_engine
+
         params = urllib.parse.quote_plus(
-            f"DRIVER={{SQL Server}};"
+            f"DRIVER={{{DB_DRIVER}}};"
             f"SERVER={DB_SERVER};"
             f"DATABASE={DB_NAME};"
             f"UID={DB_USER};PWD={DB_PASSWORD}"
         )
-        self._engine = create_engine(f"mssql+pyodbc:///?odbc_connect={params}")
+        self._engine = create_engine(
+            f"mssql+pyodbc:///?odbc_connect={params}",
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_pre_ping=DB_POOL_PRE_PING,  # descarta conexiones muertas (VPN) antes de usarlas
+            pool_recycle=DB_POOL_RECYCLE,
+            fast_executemany=DB_FAST_EXECUTEMANY
+        )
 
     def test_connection(self) -> bool:
         """Test database connection"""
         try:
-            with self._engine.connect() as conn:
+            with self.engine.connect() as conn:
                 self.log_fn("Conexión exitosa a la base de datos.")
                 return True
         except Exception as e:
@@ -30,27 +120,146 @@ class DatabaseService:
             self.log_fn(error_msg)
             raise RuntimeError(error_msg)
 
-    def read_clases(self, sql_query: str) -> pd.DataFrame:
-        """Execute query and return DataFrame"""
+    def warm_up(self) -> bool:
+        """
+        Abre (y devuelve al pool) una conexión para pagar el login por adelantado.
+        No lanza excepciones: si falla, la primera consulta volverá a intentarlo.
+        """
+        try:
+            with self.engine.connect() as conn:
+                conn.exec_driver_sql("SELECT 1")
+            self.log_fn("Conexión a la base de datos precalentada.")
+            return True
+        except Exception as e:
+            self.log_fn(f"No se pudo precalentar la conexión a la base de datos: {e}")
+            return False
+
+    def _probe_freshness(self) -> Optional[str]:
+        """Ejecuta la sonda CONSULTA_FRESHNESS (si existe) y devuelve su valor como texto"""
+        if not CONSULTA_FRESHNESS:
+            return None
+        try:
+            with self.engine.connect() as conn:
+                value = conn.exec_driver_sql(CONSULTA_FRESHNESS).scalar()
+            return str(value)
+        except Exception as e:
+            self.log_fn(f"⚠️ Sonda de frescura fallida ({e}); se usa solo el TTL de la caché.")
+            return None
+
+    def _cache_lookup(self, sql_query: str, refresh: bool, params: Optional[dict] = None):
+        """Devuelve (clave, valor de sonda, hit) para la consulta; clave None sin caché"""
+        if self.cache is None:
+            return None, None, False
+        key = self.cache.make_key(sql_query, params, connection=f"{DB_DRIVER}|{DB_SERVER}|{DB_NAME}")
+        probe = self._probe_freshness()
+        hit = not refresh and self.cache.is_valid(key, probe)
+        if refresh:
+            self.log_fn("🔄 Recarga forzada: se ignora la caché de la consulta.")
+        self.cache.record(hit)
+        return key, probe, hit
+
+    def _cache_read_failed(self, key: str, error: Exception):
+        self.log_fn(f"⚠️ Caché de la consulta ilegible ({error}); se descarta y se lee de la base de datos.")
+        self.cache.invalidate(key)
+
+    def read_clases(self, sql_query: str, refresh: bool = False,
+                    params: Optional[dict] = None) -> "pd.DataFrame":
+        """Execute query and return DataFrame (usa la caché local si es válida)"""
+        import pandas as pd
+
         if not sql_query:
             raise ValueError("No se ha proporcionado ninguna consulta SQL.")
 
+        key, probe, hit = self._cache_lookup(sql_query, refresh, params)
+        if hit:
+            try:
+                return self.cache.load(key)
+            except Exception as e:
+                self._cache_read_failed(key, e)
+
+        query, bound = _prepare_query(sql_query, params)
         try:
-            with self._engine.connect() as conn:
-                df = pd.read_sql(sql_query, conn)
-            return df
+            with span("db.read_clases") as s, self.engine.connect() as conn:
+                df = apply_clases_dtypes(pd.read_sql(query, conn, params=bound))
+                s.set(rows=len(df), bytes=int(df.memory_usage(index=False).sum()))
         except Exception as e:
             error_msg = f"Error al consultar la base de datos: {e}"
             self.log_fn(error_msg)
             raise RuntimeError(error_msg)
 
-# Singleton instance for backwards compatibility
-_default_service = DatabaseService()
+        if key is not None:
+            self.cache.store(key, df, probe)
+        return df
+
+    def iter_clases(self, sql_query: str, chunksize: int = DB_CHUNKSIZE, refresh: bool = False,
+                    params: Optional[dict] = None):
+        """
+        Ejecuta la consulta con cursor de servidor y devuelve DataFrames
+        tipados de `chunksize` filas a medida que llegan. Si hay caché válida
+        los bloques se leen del Parquet local; si no, se van escribiendo en él.
+        """
+        import pandas as pd
+
+        if not sql_query:
+            raise ValueError("No se ha proporcionado ninguna consulta SQL.")
+
+        key, probe, hit = self._cache_lookup(sql_query, refresh, params)
+        if hit:
+            yielded = False
+            try:
+                for chunk in self.cache.iter_chunks(key, chunksize):
+                    yielded = True
+                    yield chunk
+                return
+            except Exception as e:
+                if yielded:
+                    # Ya se han entregado bloques: releer de la BD los duplicaría
+                    self.cache.invalidate(key)
+                    raise RuntimeError(f"Caché de la consulta corrupta a mitad de lectura: {e}")
+                self._cache_read_failed(key, e)
+
+        query, bound = _prepare_query(sql_query, params)
+        writer = self.cache.writer(key, probe) if key is not None else None
+        try:
+            with self.engine.connect() as conn:
+                conn = conn.execution_options(stream_results=True)
+                chunks = iter(pd.read_sql(query, conn, params=bound, chunksize=chunksize))
+                while True:
+                    # El span mide la espera de cada bloque del cursor de servidor
+                    with span("db.fetch_chunk") as s:
+                        chunk = next(chunks, None)
+                        if chunk is not None:
+                            chunk = apply_clases_dtypes(chunk)
+                            s.set(rows=len(chunk), bytes=int(chunk.memory_usage(index=False).sum()))
+                    if chunk is None:
+                        break
+                    if writer is not None:
+                        writer.write(chunk)
+                    yield chunk
+        except BaseException as e:
+            if writer is not None:
+                writer.abort()
+            if not isinstance(e, Exception):
+                raise
+            error_msg = f"Error al consultar la base de datos: {e}"
+            self.log_fn(error_msg)
+            raise RuntimeError(error_msg)
+        if writer is not None:
+            writer.commit()
+
+# Singleton instance for backwards compatibility (se crea en el primer uso)
+_default_service = None
+
+def _get_default_service() -> DatabaseService:
+    global _default_service
+    if _default_service is None:
+        _default_service = DatabaseService()
+    return _default_service
 
 def test_connection():
     """Legacy function for backwards compatibility"""
-    return _default_service.test_connection()
+    return _get_default_service().test_connection()
 
-def read_clases(sql_query: str) -> pd.DataFrame:
+def read_clases(sql_query: str) -> "pd.DataFrame":
     """Legacy function for backwards compatibility"""
-    return _default_service.read_clases(sql_query)
\ No newline at end of file
+    return _get_default_service().read_clases(sql_query)
@@ -0,0 +1,86 @@
+# File: services/events.py
+import queue
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from services.progress import ProgressEvent
+
+
+@dataclass
+class LogEvent:
+    """Línea de log emitida por un servicio."""
+    message: str
+
+
+class EventSink:
+    """
+    Destino de logs y progreso de los servicios. `sink.log` se pasa como
+    `log_callback` y `sink.progress` como `sink` de ProgressTracker.
+    La clase base descarta los eventos.
+    """
+    source = ""
+
+    def log(self, message: str):
+        pass
+
+    def progress(self, event: ProgressEvent):
+        pass
+
+
+class QueueSink(EventSink):
+    """
+    Sink picklable: envía `(source, evento)` a una cola. Con una cola de
+    `multiprocessing.Manager()` funciona desde un ProcessPoolExecutor; los
+    eventos de progreso intermedios se limitan a uno cada `min_interval` s.
+    """
+    def __init__(self, queue, source: str = "", min_interval: float = 0.1):
+        self.queue = queue
+        self.source = source
+        self.min_interval = min_interval
+        self._last = 0.0
+
+    def log(self, message: str):
+        self.queue.put((self.source, LogEvent(message)))
+
+    def progress(self, event: ProgressEvent):
+        now = time.monotonic()
+        if not event.finished and now - self._last < self.min_interval:
+            return
+        self._last = now
+        self.queue.put((self.source, event))
+
+
+class CallbackSink(EventSink):
+    """Sink en el mismo proceso que delega en funciones (no picklable si ellas no lo son)."""
+    def __init__(self, log_fn: Optional[Callable[[str], None]] = None,
+                 progress_fn: Optional[Callable[[ProgressEvent], None]] = None, source: str = ""):
+        self.log_fn = log_fn or (lambda x: None)
+        self.progress_fn = progress_fn or (lambda e: None)
+        self.source = source
+
+    def log(self, message: str):
+        self.log_fn(message)
+
+    def progress(self, event: ProgressEvent):
+        self.progress_fn(event)
+
+
+def drain(q, on_log: Callable[[str, str], None], on_progress: Callable[[str, ProgressEvent], None],
+          max_items: Optional[int] = None) -> int:
+    """
+    Consume sin bloquear los eventos pendientes de `q` y los reparte a
+    `on_log(source, mensaje)` / `on_progress(source, evento)`. Devuelve cuántos procesó.
+    """
+    count = 0
+    while max_items is None or count < max_items:
+        try:
+            source, event = q.get_nowait()
+        except queue.Empty:
+            break
+        if isinstance(event, LogEvent):
+            on_log(source, event.message)
+        else:
+            on_progress(source, event)
+        count += 1
+    return count
@@ -1,31 +1,142 @@
 # File: services/excel_service.py
-import tkinter as tk
-from tkinter import filedialog
+import os
+import time
+from pathlib import Path
 import pandas as pd
 
-def exportar_calendario(df):
-    if df is None or df.empty:
-        return
-    root = tk.Tk()
-    root.withdraw()
-    filepath = filedialog.asksaveasfilename(
-        defaultextension=".xlsx",
-        filetypes=[("Excel files", "*.xlsx")],
-        initialfile="calendario.xlsx",
-        title="Guardar calendario como"
-    )
-    if filepath:
-        df.to_excel(filepath, index=False)
+from services.calendar_service import CALENDAR_COLUMNS
+from services.jobs import check_cancelled
+from services.table_writers import COLUMNAR_SUFFIXES, open_table_writer, require_pyarrow
+
+EXPORT_CHUNK_ROWS = 5000
+DATE_COLUMNS = ["Fecha"]
+# Importación de Excel: solo las columnas que usa la app (vista previa + sincronización)
+REQUIRED_COLUMNS = ["Title", "PERNR", "Fecha"]
+IMPORT_DTYPES = {col: str for col in CALENDAR_COLUMNS if col not in DATE_COLUMNS}
+
+
+class CalendarSchemaError(ValueError):
+    """El fichero no tiene el formato de calendario esperado."""
+
+
+def guardar_calendario(df, filepath, progress_cb=None, cancel_event=None,
+                       chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Escribe el calendario según la extensión. Parquet/Feather se escriben de una
+    vez con pyarrow (round-trip exacto de dtypes). Excel se escribe en streaming
+    (xlsxwriter constant_memory u openpyxl write-only), por bloques de `chunk_rows`
+    filas, con `Fecha` como fecha nativa. `.ics` genera un único iCalendar (ver
+    ics_service para un fichero por PERNR/Grupo). Si se cancela o falla, se
+    borra el fichero a medio escribir.
+    """
+    suffix = Path(filepath).suffix.lower()
+    if suffix in COLUMNAR_SUFFIXES:
+        return _guardar_columnar(df, filepath, progress_cb, cancel_event)
+    if suffix == ".ics":
+        from services.ics_service import exportar_ics
+        exportar_ics(df, filepath, progress_cb=progress_cb, cancel_event=cancel_event, chunk_rows=chunk_rows)
         return filepath
-    return None
-
-def cargar_calendario():
-    root = tk.Tk()
-    root.withdraw()
-    filepath = filedialog.askopenfilename(
-        title="Seleccionar archivo de calendario",
-        filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")]
-    )
-    if filepath:
-        return pd.read_excel(filepath)
-    return None
\ No newline at end of file
+
+    columns = [c for c in CALENDAR_COLUMNS if c in df.columns]
+    columns += [c for c in df.columns if c not in columns]
+    total = len(df)
+
+    writer = open_table_writer(filepath, columns, date_columns=DATE_COLUMNS)
+    try:
+        for start in range(0, total, chunk_rows):
+            check_cancelled(cancel_event)
+            chunk = df.iloc[start:start + chunk_rows]
+            # NaN/NA -> celda vacía (ni openpyxl ni xlsxwriter aceptan NaN)
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            writer.write_rows(chunk.to_dict("records"))
+            if progress_cb:
+                progress_cb(writer.rows_written, total)
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    return filepath
+
+
+def _guardar_columnar(df, filepath, progress_cb=None, cancel_event=None):
+    # Formatos columnares: guardan los dtypes de pandas y se recargan en milisegundos
+    require_pyarrow(filepath)
+    check_cancelled(cancel_event)
+    tmp_path = f"{filepath}.tmp"
+    try:
+        if Path(filepath).suffix.lower() == ".feather":
+            # Feather exige índice por defecto
+            df.reset_index(drop=True).to_feather(tmp_path)
+        else:
+            df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if progress_cb:
+        progress_cb(len(df), len(df))
+    return filepath
+
+
+def _excel_engine():
+    """calamine (Rust) si está instalado; si no, el motor por defecto (openpyxl)."""
+    try:
+        import python_calamine  # noqa: F401
+        return "calamine"
+    except ImportError:
+        return None
+
+
+def leer_excel(filepath):
+    """
+    Importa un calendario Excel leyendo solo CALENDAR_COLUMNS con dtypes
+    explícitos. La cabecera se valida antes de parsear el cuerpo y `Fecha`
+    se normaliza a 'YYYY-MM-DD' (igual que en un calendario generado).
+    """
+    engine = _excel_engine()
+    header = pd.read_excel(filepath, engine=engine, nrows=0).columns
+    missing = [col for col in REQUIRED_COLUMNS if col not in header]
+    if missing:
+        raise CalendarSchemaError(f"Faltan columnas obligatorias: {', '.join(missing)}")
+
+    usecols = [col for col in CALENDAR_COLUMNS if col in header]
+    df = pd.read_excel(
+        filepath,
+        engine=engine,
+        usecols=usecols,
+        dtype={col: t for col, t in IMPORT_DTYPES.items() if col in usecols},
+    )[usecols]
+
+    fechas = pd.to_datetime(df["Fecha"], errors="coerce", format="mixed")
+    invalid = fechas.isna() & df["Fecha"].notna()
+    if invalid.any():
+        rows = (df.index[invalid][:5] + 2).tolist()  # +2: cabecera y base 1 de Excel
+        raise CalendarSchemaError(
+            f"{int(invalid.sum())} valores de Fecha no válidos (filas {rows}...)"
+        )
+    df["Fecha"] = fechas.dt.strftime("%Y-%m-%d")
+    return df
+
+
+def leer_calendario(filepath, memory_map=True, log_fn=None):
+    """
+    Lee un calendario según la extensión. Parquet/Feather se abren con
+    memory-map (el SO pagina el fichero bajo demanda) y conservan los dtypes.
+    """
+    t0 = time.perf_counter()
+    suffix = Path(filepath).suffix.lower()
+    require_pyarrow(filepath)
+    if suffix == ".feather":
+        import pyarrow.feather as feather
+        df = feather.read_table(filepath, memory_map=memory_map).to_pandas()
+    elif suffix == ".parquet":
+        df = pd.read_parquet(filepath, memory_map=memory_map)
+    else:
+        df = leer_excel(filepath)
+
+    if log_fn:
+        elapsed = time.perf_counter() - t0
+        rate = len(df) / elapsed if elapsed > 0 else 0.0
+        log_fn(f"📥 {len(df)} filas leídas de {Path(filepath).name} en {elapsed:.2f}s ({rate:.0f} filas/s)")
+    return df
@@ -0,0 +1,96 @@
+# File: services/graph_cache.py
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Un lock por fichero: las instancias de un mismo proceso (p. ej. los hilos
+# de sincronización de un lote) se serializan al leer-modificar-escribir
+_file_locks: Dict[str, threading.Lock] = {}
+_file_locks_guard = threading.Lock()
+
+
+def _file_lock(path: Path) -> threading.Lock:
+    with _file_locks_guard:
+        return _file_locks.setdefault(str(path.resolve()), threading.Lock())
+
+
+class GraphMetadataCache:
+    """
+    Caché en disco de metadatos de Graph (site id, list id, mapa de columnas).
+
+    Cada entrada se indexa por "host:ruta|lista" y caduca tras `ttl` segundos.
+    """
+    def __init__(self, path: str, ttl: float = 86400, log_callback=None):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.log_fn = log_callback or (lambda x: None)
+        self._lock = _file_lock(self.path)
+        self._data = None
+
+    @staticmethod
+    def make_key(site_graph_id: str, list_name: str) -> str:
+        return f"{site_graph_id}|{list_name}"
+
+    def _load(self, refresh: bool = False) -> Dict[str, Any]:
+        """Datos en memoria; `refresh` relee el disco (antes de modificar, para no pisar a otras instancias)"""
+        if self._data is None or refresh:
+            self._data = {}
+            if self.path.exists():
+                try:
+                    with self.path.open("r", encoding="utf-8") as f:
+                        self._data = json.load(f)
+                except (OSError, ValueError) as e:
+                    self.log_fn(f"⚠️ Caché de metadatos ilegible ({e}); se ignora.")
+        return self._data
+
+    def _save(self):
+        # Temporal con nombre único: otro proceso puede estar guardando a la vez
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Devuelve la entrada si existe y no ha caducado."""
+        with self._lock:
+            entry = self._load().get(key)
+        if not entry:
+            return None
+        if self.ttl and time.time() - entry.get("updated", 0) > self.ttl:
+            self.log_fn("⌛ Caché de metadatos de SharePoint caducada.")
+            return None
+        return entry
+
+    def update(self, key: str, **fields):
+        """Actualiza (o crea) la entrada y la persiste en disco."""
+        with self._lock:
+            data = self._load(refresh=True)
+            entry = data.setdefault(key, {})
+            entry.update(fields)
+            entry["updated"] = time.time()
+            try:
+                self._save()
+            except OSError as e:
+                self.log_fn(f"⚠️ No se pudo guardar la caché de metadatos: {e}")
+
+    def invalidate(self, key: Optional[str] = None):
+        """Elimina una entrada, o toda la caché si no se indica clave."""
+        with self._lock:
+            data = self._load(refresh=True)
+            if key is None:
+                data.clear()
+            else:
+                data.pop(key, None)
+            try:
+                self._save()
+            except OSError as e:
+                self.log_fn(f"⚠️ No se pudo guardar la caché de metadatos: {e}")
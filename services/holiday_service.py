@@ -1,17 +1,498 @@
 # File: services/holiday_service.py
+"""
+Festivos como calendario indexado.
+
+`HolidayCalendar` combina fechas sueltas, reglas recurrentes (día fijo o
+desplazamiento respecto a Pascua) y conjuntos regionales (ES, ES-MD...).
+Las reglas se expanden por año bajo demanda: preguntar por 2031 expande
+2031 sin que nadie haya tenido que "añadir los festivos de ese año".
+
+Internamente guarda un set de días (pertenencia O(1)) y, al primer rango
+que se consulta, un array ordenado `datetime64[D]` (searchsorted); numpy no
+se importa hasta entonces para no cargarlo al arrancar la UI. Se comporta como la
+lista de 'YYYY-MM-DD' que devolvía antes load_festivos (in, iter, len,
+append, remove, clear), así que HolidayPanel y los trabajos lo usan tal cual.
+
+festivos.json:
+
+    {
+      "festivos": ["2025-09-08"],
+      "regiones": ["ES", "ES-MD"],
+      "reglas": [{"nombre": "Fiesta local", "mes": 11, "dia": 9}],
+      "excluidos": ["2025-12-08"]
+    }
+
+El fichero se escribe de forma atómica (temporal + os.replace) y, desde la
+UI, a través de FestivosWriter: los cambios seguidos se agrupan en una sola
+escritura en segundo plano. import_festivos lee listas CSV o ICS.
+"""
+import csv
 import json
+import os
+import re
+import threading
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from config import FESTIVOS_JSON
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import FESTIVOS_JSON, FESTIVOS_SAVE_DELAY_MS
+
+_EPOCH = date(1970, 1, 1)
+
+
+@dataclass(frozen=True)
+class HolidayRule:
+    """Festivo recurrente: día fijo (mes/dia) o desplazamiento desde el domingo de Pascua"""
+    nombre: str
+    mes: Optional[int] = None
+    dia: Optional[int] = None
+    pascua: Optional[int] = None  # días respecto al domingo de Pascua (-2 = Viernes Santo)
+    region: Optional[str] = None
+
+    def date_for(self, year: int) -> Optional[date]:
+        if self.pascua is not None:
+            return easter_sunday(year) + timedelta(days=self.pascua)
+        try:
+            return date(year, self.mes, self.dia)
+        except (TypeError, ValueError):
+            return None  # p. ej. 29 de febrero en año no bisiesto
+
+    def to_dict(self) -> dict:
+        return {k: v for k, v in asdict(self).items() if v is not None}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HolidayRule":
+        rule = cls(**{k: data.get(k) for k in ("nombre", "mes", "dia", "pascua", "region")})
+        if rule.pascua is None and (rule.mes is None or rule.dia is None):
+            raise ValueError(f"Regla de festivo incompleta: {data}")
+        return rule
+
+
+def easter_sunday(year: int) -> date:
+    """Domingo de Pascua (calendario gregoriano, algoritmo anónimo de Meeus/Jones/Butcher)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _fixed(region, *items):
+    return [HolidayRule(nombre, mes=mes, dia=dia, region=region) for mes, dia, nombre in items]
+
+
+# Conjuntos regionales: "ES" son los nacionales; el resto se suman a ellos
+REGIONAL_RULES: Dict[str, List[HolidayRule]] = {
+    "ES": _fixed(
+        "ES",
+        (1, 1, "Año Nuevo"), (1, 6, "Reyes Magos"), (5, 1, "Día del Trabajo"),
+        (8, 15, "Asunción"), (10, 12, "Hispanidad"), (11, 1, "Todos los Santos"),
+        (12, 6, "Constitución"), (12, 8, "Inmaculada"), (12, 25, "Navidad"),
+    ) + [HolidayRule("Viernes Santo", pascua=-2, region="ES")],
+    "ES-MD": _fixed("ES-MD", (5, 2, "Fiesta de la Comunidad de Madrid"))
+             + [HolidayRule("Jueves Santo", pascua=-3, region="ES-MD")],
+    "ES-CT": _fixed("ES-CT", (6, 24, "Sant Joan"), (9, 11, "Diada"), (12, 26, "Sant Esteve"))
+             + [HolidayRule("Lunes de Pascua", pascua=1, region="ES-CT")],
+    "ES-AN": _fixed("ES-AN", (2, 28, "Día de Andalucía"))
+             + [HolidayRule("Jueves Santo", pascua=-3, region="ES-AN")],
+    "ES-VC": _fixed("ES-VC", (3, 19, "San José"), (10, 9, "Día de la Comunitat Valenciana"))
+             + [HolidayRule("Lunes de Pascua", pascua=1, region="ES-VC")],
+    "ES-PV": _fixed("ES-PV", (7, 25, "Santiago Apóstol"))
+             + [HolidayRule("Jueves Santo", pascua=-3, region="ES-PV"),
+                HolidayRule("Lunes de Pascua", pascua=1, region="ES-PV")],
+}
+
+
+def _to_date(value) -> date:
+    """'YYYY-MM-DD', date, datetime, pd.Timestamp o np.datetime64 -> date"""
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if hasattr(value, "astype"):  # np.datetime64
+        return date.fromordinal(_EPOCH.toordinal() + int(value.astype("datetime64[D]").astype("int64")))
+    raise TypeError(f"Fecha de festivo no válida: {value!r}")
+
+
+def _day(d: date) -> int:
+    return d.toordinal() - _EPOCH.toordinal()
+
+
+class HolidayCalendar:
+    def __init__(self, festivos: Iterable = (), regiones: Iterable[str] = (),
+                 reglas: Iterable[HolidayRule] = (), excluidos: Iterable = ()):
+        self._extra = {_to_date(f) for f in festivos}
+        self.regions: List[str] = []
+        for region in regiones:
+            self._check_region(region)
+            if region not in self.regions:
+                self.regions.append(region)
+        self.rules: List[HolidayRule] = list(reglas)
+        self._excluded = {_to_date(f) for f in excluidos}
+        self._invalidate()
+
+    # ---------- índice ----------
+    def _invalidate(self):
+        self._years = set()
+        self._days = set()
+        self._array = None
+        self._add_days(_day(d) for d in self._extra if d not in self._excluded)
+
+    def _active_rules(self) -> List[HolidayRule]:
+        rules = [r for region in self.regions for r in REGIONAL_RULES[region]]
+        return rules + self.rules
+
+    def _add_days(self, days: Iterable[int]):
+        new = set(days) - self._days
+        if new:
+            self._days |= new
+            self._array = None
+
+    def _sorted_array(self):
+        """Array datetime64[D] ordenado de los días expandidos (se reconstruye tras cambios)"""
+        if self._array is None:
+            import numpy as np
+            self._array = np.array(sorted(self._days), dtype=np.int64).astype("datetime64[D]")
+        return self._array
+
+    def ensure_years(self, first_year: int, last_year: int):
+        """Expande las reglas de los años [first_year, last_year] que falten"""
+        missing = [y for y in range(first_year, last_year + 1) if y not in self._years]
+        if not missing:
+            return
+        rules = self._active_rules()
+        days = []
+        for year in missing:
+            for rule in rules:
+                d = rule.date_for(year)
+                if d is not None and d not in self._excluded:
+                    days.append(_day(d))
+        self._years.update(missing)
+        self._add_days(days)
+
+    def __contains__(self, value) -> bool:
+        try:
+            d = _to_date(value)
+        except (TypeError, ValueError):
+            return False
+        if d.year not in self._years:
+            self.ensure_years(d.year, d.year)
+        return _day(d) in self._days
+
+    def between(self, start, end):
+        """Festivos en [start, end] como array datetime64[D] ordenado"""
+        import numpy as np
+
+        first, last = _to_date(start), _to_date(end)
+        self.ensure_years(first.year, last.year)
+        array = self._sorted_array()
+        lo = np.searchsorted(array, np.datetime64(first, "D"), side="left")
+        hi = np.searchsorted(array, np.datetime64(last, "D"), side="right")
+        return array[lo:hi]
+
+    def mask(self, dates):
+        """Array booleano: True donde la fecha (DatetimeIndex/array datetime64) es festivo"""
+        import numpy as np
+
+        values = np.asarray(dates, dtype="datetime64[D]")
+        if values.size == 0:
+            return np.zeros(0, dtype=bool)
+        return np.isin(values, self.between(values.min(), values.max()))
+
+    # ---------- API tipo lista ('YYYY-MM-DD') ----------
+    def __iter__(self) -> Iterator[str]:
+        """Festivos de los años ya expandidos (y fechas sueltas), en orden"""
+        origin = _EPOCH.toordinal()
+        return (date.fromordinal(origin + d).isoformat() for d in sorted(self._days))
+
+    def __len__(self) -> int:
+        return len(self._days)
+
+    def __bool__(self) -> bool:
+        return bool(self._days) or bool(self.regions) or bool(self.rules)
 
-def load_festivos():
-    p = Path(FESTIVOS_JSON)
+    def __repr__(self) -> str:
+        return f"HolidayCalendar(regiones={self.regions}, reglas={len(self.rules)}, festivos={len(self._extra)})"
+
+    def append(self, value):
+        d = _to_date(value)
+        self._excluded.discard(d)
+        self._extra.add(d)
+        self._add_days([_day(d)])
+
+    def remove(self, value):
+        """Quita una fecha: si venía de una regla, queda excluida solo ese día"""
+        d = _to_date(value)
+        if d not in self:
+            raise ValueError(f"{value} no es festivo")
+        self._extra.discard(d)
+        self._excluded.add(d)
+        self._days.discard(_day(d))
+        self._array = None
+
+    def clear(self):
+        self._extra.clear()
+        self._excluded.clear()
+        self.regions.clear()
+        self.rules.clear()
+        self._invalidate()
+
+    def extend(self, values: Iterable) -> int:
+        """Añade varias fechas de una vez; devuelve cuántas eran nuevas"""
+        dates = {_to_date(v) for v in values}
+        before = len(self._days)
+        self._excluded -= dates
+        self._extra |= dates
+        self._add_days(_day(d) for d in dates)
+        return len(self._days) - before
+
+    # ---------- reglas ----------
+    @staticmethod
+    def _check_region(region: str):
+        if region not in REGIONAL_RULES:
+            raise ValueError(f"Región de festivos desconocida: {region} (disponibles: {', '.join(REGIONAL_RULES)})")
+
+    def add_region(self, region: str) -> bool:
+        """Activa un conjunto regional para todos los años; False si ya estaba"""
+        self._check_region(region)
+        if region in self.regions:
+            return False
+        self.regions.append(region)
+        self._invalidate()
+        return True
+
+    def add_rule(self, rule: HolidayRule):
+        self.add_rules([rule])
+
+    def add_rules(self, rules: Iterable[HolidayRule]) -> int:
+        """Añade reglas (sin duplicados) reindexando una sola vez; devuelve cuántas eran nuevas"""
+        new = [r for r in dict.fromkeys(rules) if r not in self.rules]
+        if new:
+            self.rules.extend(new)
+            self._invalidate()
+        return len(new)
+
+    # ---------- persistencia ----------
+    def copy(self) -> "HolidayCalendar":
+        """Copia independiente (para pasar a un trabajo sin compartir estado con la UI)"""
+        return HolidayCalendar.from_dict(self.to_dict())
+
+    def to_dict(self) -> dict:
+        data = {"festivos": sorted(d.isoformat() for d in self._extra)}
+        if self.regions:
+            data["regiones"] = list(self.regions)
+        if self.rules:
+            data["reglas"] = [r.to_dict() for r in self.rules]
+        if self._excluded:
+            data["excluidos"] = sorted(d.isoformat() for d in self._excluded)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict, log_callback=None) -> "HolidayCalendar":
+        """
+        Calendario desde el dict de festivos.json. Las entradas no válidas
+        (fecha rara, región desconocida, regla incompleta) se omiten y se
+        avisan por `log_callback`: un valor editado a mano no impide arrancar.
+        """
+        log_fn = log_callback or (lambda x: None)
+
+        def valid(key, parse):
+            items = []
+            for value in data.get(key, []):
+                try:
+                    items.append(parse(value))
+                except (TypeError, ValueError, AttributeError):
+                    log_fn(f"⚠️ Valor no válido en '{key}' de festivos ({value!r}); se ignora.")
+            return items
+
+        def region(value):
+            cls._check_region(value)
+            return value
+
+        return cls(
+            festivos=valid("festivos", _to_date),
+            regiones=valid("regiones", region),
+            reglas=valid("reglas", HolidayRule.from_dict),
+            excluidos=valid("excluidos", _to_date),
+        )
+
+    @classmethod
+    def coerce(cls, festivos) -> "HolidayCalendar":
+        """Acepta un HolidayCalendar, una lista de fechas o None"""
+        if isinstance(festivos, cls):
+            return festivos
+        return cls(festivos=festivos or [])
+
+
+def load_festivos(path=None, log_callback=None) -> HolidayCalendar:
+    p = Path(path or FESTIVOS_JSON)
     if not p.exists():
-        return []
+        return HolidayCalendar()
     with p.open("r", encoding="utf-8") as f:
         data = json.load(f)
-    return data.get("festivos", [])
+    return HolidayCalendar.from_dict(data, log_callback=log_callback)
+
+
+def save_festivos(festivos, path=None):
+    """
+    Guarda festivos (HolidayCalendar, lista o el dict de to_dict) de forma
+    atómica: un corte a mitad de escritura deja el fichero anterior intacto.
+    """
+    p = Path(path or FESTIVOS_JSON)
+    data = festivos if isinstance(festivos, dict) else HolidayCalendar.coerce(festivos).to_dict()
+    tmp_path = p.with_name(f"{p.name}.tmp")
+    try:
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, p)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+
+
+class FestivosWriter:
+    """
+    Escritura diferida de festivos.json: `schedule()` toma una instantánea y
+    programa la escritura a FESTIVOS_SAVE_DELAY_MS; si llega otro cambio antes,
+    solo se escribe el último. `flush()` escribe lo pendiente ya y espera a la
+    escritura en curso, si la hay (al cerrar).
+    """
+    def __init__(self, path=None, delay_ms: int = FESTIVOS_SAVE_DELAY_MS, log_callback=None):
+        self.path = path
+        self.delay = delay_ms / 1000
+        self.log_fn = log_callback or (lambda x: None)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending = None
+        self._timer = None
+
+    def schedule(self, festivos):
+        # La instantánea se toma en el hilo que llama: el hilo de escritura no toca el calendario
+        data = HolidayCalendar.coerce(festivos).to_dict()
+        with self._lock:
+            self._pending = data
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.delay, self._write)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+        self._write()
+
+    def _write(self):
+        # La instantánea se recoge ya con _write_lock: las escrituras van en orden
+        # (una más nueva nunca se adelanta a otra anterior) y flush() espera a la
+        # que esté en curso en el temporizador antes de volver
+        with self._write_lock:
+            with self._lock:
+                data, self._pending, self._timer = self._pending, None, None
+            if data is None:
+                return
+            try:
+                save_festivos(data, self.path)
+            except Exception as e:
+                self.log_fn(f"❌ Error guardando festivos: {e}")
+
+
+# ---------- importación CSV / ICS ----------
+_CSV_DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d")
+
+
+def _parse_csv_date(value: str) -> Optional[date]:
+    value = value.strip()
+    for fmt in _CSV_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _import_csv(path: Path) -> List[date]:
+    """Primera celda con fecha de cada fila; la cabecera y las filas sin fecha se ignoran"""
+    with path.open("r", encoding="utf-8-sig", newline="") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        dates = []
+        for row in csv.reader(f, dialect):
+            d = next((d for d in map(_parse_csv_date, row) if d is not None), None)
+            if d is not None:
+                dates.append(d)
+    return dates
+
+
+def _ics_date(value: str) -> Optional[date]:
+    match = re.match(r"(\d{4})(\d{2})(\d{2})", value.strip())
+    return date(*map(int, match.groups())) if match else None
+
+
+def _unfold_ics(text: str) -> List[str]:
+    """RFC 5545: una línea que empieza por espacio/tab continúa la anterior"""
+    lines = []
+    for raw in text.splitlines():
+        if raw[:1] in (" ", "\t") and lines:
+            lines[-1] += raw[1:]
+        else:
+            lines.append(raw)
+    return lines
+
+
+def _import_ics(path: Path) -> Tuple[List[date], List[HolidayRule]]:
+    """
+    Un festivo por VEVENT (DTSTART; los de varios días hasta DTEND, exclusivo).
+    Los eventos con RRULE:FREQ=YEARLY se convierten en reglas de día fijo.
+    """
+    dates, rules = [], []
+    event = None
+    for line in _unfold_ics(path.read_text(encoding="utf-8-sig")):
+        name, _, value = line.partition(":")
+        key = name.split(";", 1)[0].upper()
+        if line.upper() == "BEGIN:VEVENT":
+            event = {}
+        elif line.upper() == "END:VEVENT" and event is not None:
+            start = event.get("DTSTART")
+            if start is None:
+                event = None
+                continue
+            if "FREQ=YEARLY" in event.get("RRULE", "").upper():
+                rules.append(HolidayRule(event.get("SUMMARY", "Festivo"), mes=start.month, dia=start.day))
+            else:
+                end = event.get("DTEND") or start + timedelta(days=1)
+                dates.extend(start + timedelta(days=i) for i in range(max(1, (end - start).days)))
+            event = None
+        elif event is not None and key in ("DTSTART", "DTEND"):
+            event[key] = _ics_date(value)
+        elif event is not None and key in ("RRULE", "SUMMARY"):
+            event[key] = value.strip()
+    return dates, rules
+
 
-def save_festivos(festivos):
-    p = Path(FESTIVOS_JSON)
-    with p.open("w", encoding="utf-8") as f:
-        json.dump({"festivos": festivos}, f, indent=2, ensure_ascii=False)
\ No newline at end of file
+def import_festivos(path) -> Tuple[List[date], List[HolidayRule]]:
+    """Lee una lista de festivos (.csv o .ics); devuelve (fechas, reglas)"""
+    p = Path(path)
+    suffix = p.suffix.lower()
+    if suffix == ".csv":
+        return _import_csv(p), []
+    if suffix in (".ics", ".ical"):
+        return _import_ics(p)
+    raise ValueError(f"Formato de festivos no soportado: {suffix} (usa .csv o .ics)")
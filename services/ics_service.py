@@ -0,0 +1,327 @@
+# File: services/ics_service.py
+"""
+Exportación del calendario a iCalendar (.ics) para Outlook / Google Calendar.
+
+- Un evento de día completo por sesión; el UID sale de `Title`, así que
+  reimportar un calendario regenerado actualiza los eventos en vez de
+  duplicarlos.
+- Se escribe en streaming, por bloques, a un temporal que se renombra al
+  terminar (un corte o una cancelación no deja un .ics a medias).
+- `split_by="PERNR"` o `"Grupo"` escribe un fichero por persona o grupo
+  (`<nombre>_<clave>.ics` junto a la ruta elegida), en paralelo.
+"""
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import ICS_CALENDAR_NAME, ICS_EXPORT_WORKERS, ICS_UID_DOMAIN
+from services.jobs import check_cancelled
+from services.table_writers import TableWriter
+
+ICS_CHUNK_ROWS = 5000
+ICS_SPLIT_COLUMNS = ("PERNR", "Grupo")
+CRLF = "\r\n"
+_FOLD_OCTETS = 75
+# Líneas de DESCRIPTION: (etiqueta, columna); las vacías se omiten
+DESCRIPTION_FIELDS = (("Alumno", "Nombre"), ("PERNR", "PERNR"),
+                      ("Asistencia", "Asistencia"), ("Observaciones", "Observaciones"))
+
+
+def _escape(value) -> str:
+    """TEXT de RFC 5545: \\ ; , y saltos de línea escapados"""
+    text = "" if value is None else str(value)
+    return (text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _fold(line: str) -> str:
+    """Parte las líneas de más de 75 octetos (UTF-8) con continuación ' '"""
+    if len(line.encode("utf-8")) <= _FOLD_OCTETS:
+        return line + CRLF
+    parts, current, size = [], "", 0
+    for ch in line:
+        octets = len(ch.encode("utf-8"))
+        if size + octets > _FOLD_OCTETS:
+            parts.append(current)
+            current, size = " ", 1
+        current += ch
+        size += octets
+    parts.append(current)
+    return CRLF.join(parts) + CRLF
+
+
+def _text_column(chunk, column):
+    """Columna como texto ('' para nulos o si no existe)"""
+    if column not in chunk.columns:
+        return pd.Series("", index=chunk.index, dtype=object)
+    return chunk[column].astype(object).where(chunk[column].notna(), "").astype(str).astype(object)
+
+
+def _escape_column(series):
+    return (series.str.replace("\\", "\\\\", regex=False).str.replace(";", "\\;", regex=False)
+            .str.replace(",", "\\,", regex=False).str.replace("\r\n", "\\n", regex=False)
+            .str.replace("\n", "\\n", regex=False))
+
+
+def _fold_long(line: str) -> str:
+    """Como _fold, sin el coste de codificar las líneas cortas (la mayoría)"""
+    if len(line) <= _FOLD_OCTETS and line.isascii():
+        return line + CRLF
+    return _fold(line)
+
+
+def _dtstamp() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _event_mask(chunk):
+    """Filas que generan evento: Fecha válida y Title (sin Title no hay UID estable)"""
+    if "Fecha" not in chunk.columns or "Title" not in chunk.columns:
+        return pd.Series(False, index=chunk.index)
+    return pd.to_datetime(chunk["Fecha"], errors="coerce").notna() & chunk["Title"].notna()
+
+
+def format_events(chunk, dtstamp: str) -> pd.Series:
+    """
+    VEVENTs de un bloque del calendario, formateados por columnas (fechas, UID,
+    escapado) y no fila a fila. El índice es el de las filas con evento: las
+    que no tienen Fecha válida o Title se omiten (no habría UID estable).
+    """
+    if chunk.empty or "Fecha" not in chunk.columns or "Title" not in chunk.columns:
+        return pd.Series([], dtype=object)
+    fechas = pd.to_datetime(chunk["Fecha"], errors="coerce")
+    valid = fechas.notna() & chunk["Title"].notna()
+    if not valid.all():
+        chunk, fechas = chunk[valid], fechas[valid]
+    if chunk.empty:
+        return pd.Series([], dtype=object)
+
+    # Pocas fechas distintas por bloque: se formatean una vez cada una
+    codes, days = pd.factorize(fechas.dt.normalize())
+    dtstart = days.strftime("%Y%m%d").to_numpy()[codes].tolist()
+    dtend = (days + pd.Timedelta(days=1)).strftime("%Y%m%d").to_numpy()[codes].tolist()
+    # UID estable a partir del Title de la sesión (PERNR-díaExcel-IDI)
+    uids = (chunk["Title"].astype(str).str.replace(r"[^A-Za-z0-9._-]+", "-", regex=True)
+            .str.strip("-") + f"@{ICS_UID_DOMAIN}")
+
+    idioma, grupo = _text_column(chunk, "Idioma"), _text_column(chunk, "Grupo")
+    summaries = _escape_column(
+        "Clase de " + idioma.where(idioma != "", "idioma")
+        + grupo.map(lambda g: f" ({g})" if g else "")
+    )
+    parts = [(label, _text_column(chunk, col)) for label, col in DESCRIPTION_FIELDS]
+    descriptions = _escape_column(pd.Series(
+        ["\n".join(f"{label}: {value}" for (label, _), value in zip(parts, values) if value)
+         for values in zip(*(column.tolist() for _, column in parts))],
+        index=chunk.index, dtype=object,
+    ))
+
+    stamp = f"DTSTAMP:{dtstamp}{CRLF}"
+    return pd.Series([
+        f"BEGIN:VEVENT{CRLF}"
+        f"{_fold_long('UID:' + uid)}{stamp}"
+        f"DTSTART;VALUE=DATE:{start}{CRLF}DTEND;VALUE=DATE:{end}{CRLF}"
+        f"{_fold_long('SUMMARY:' + summary)}{_fold_long('DESCRIPTION:' + description)}"
+        f"TRANSP:TRANSPARENT{CRLF}END:VEVENT{CRLF}"
+        for uid, start, end, summary, description in zip(
+            uids.tolist(), dtstart, dtend, summaries.tolist(), descriptions.tolist()
+        )
+    ], index=chunk.index, dtype=object)
+
+
+class IcsCalendarWriter(TableWriter):
+    """
+    TableWriter que escribe VEVENTs por bloques (DataFrame o filas dict):
+    solo mantiene en memoria el bloque en curso. Escribe a `<fichero>.tmp` y
+    lo renombra al cerrar.
+    """
+    def __init__(self, filepath, columns=None, date_columns=None,
+                 calendar_name: str = ICS_CALENDAR_NAME, dtstamp: Optional[str] = None):
+        super().__init__(filepath, [] if columns is None else list(columns), date_columns)
+        self._tmp_path = f"{self.filepath}.tmp"
+        self.dtstamp = dtstamp or _dtstamp()
+        self._fh = open(self._tmp_path, "w", encoding="utf-8", newline="")
+        self._fh.write("".join(_fold(line) for line in (
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            "PRODID:-//gencal//Calendario de clases//ES",
+            "CALSCALE:GREGORIAN",
+            "METHOD:PUBLISH",
+            f"X-WR-CALNAME:{_escape(calendar_name)}",
+        )))
+
+    def write_rows(self, rows: Iterable[Dict]):
+        self.write_frame(pd.DataFrame(list(rows)))
+
+    def write_frame(self, chunk) -> int:
+        """Escribe un bloque del calendario; devuelve cuántos eventos ha escrito"""
+        return self.write_events(format_events(chunk, self.dtstamp).tolist())
+
+    def write_events(self, events: List[str]) -> int:
+        """Escribe VEVENTs ya formateados (format_events)"""
+        self._fh.write("".join(events))
+        self.rows_written += len(events)
+        return len(events)
+
+    def close(self):
+        if self._fh.closed:
+            return
+        self._fh.write(_fold("END:VCALENDAR"))
+        self._fh.close()
+        os.replace(self._tmp_path, self.filepath)
+
+    def abort(self):
+        if not self._fh.closed:
+            self._fh.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+def _write_ics(df, filepath, chunk_rows, on_rows, cancel_event, dtstamp=None) -> str:
+    writer = IcsCalendarWriter(filepath, df.columns, dtstamp=dtstamp)
+    try:
+        for start in range(0, len(df), chunk_rows):
+            check_cancelled(cancel_event)
+            chunk = df.iloc[start:start + chunk_rows]
+            on_rows(len(chunk), writer.write_frame(chunk))
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    return str(filepath)
+
+
+def _write_ics_events(events: List[str], filepath, dtstamp) -> str:
+    writer = IcsCalendarWriter(filepath, dtstamp=dtstamp)
+    try:
+        writer.write_events(events)
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    return str(filepath)
+
+
+def _split_path(filepath: Path, key) -> Path:
+    safe = re.sub(r"[^A-Za-z0-9._-]+", "_", str(key)).strip("_") or "sin_valor"
+    return filepath.with_name(f"{filepath.stem}_{safe}.ics")
+
+
+def _split_paths(filepath: Path, keys) -> Dict[object, str]:
+    """
+    Ruta por clave. Claves distintas que se sanean igual ("A/B" y "A_B") o que
+    solo difieren en mayúsculas (Windows) reciben un sufijo _2, _3... en vez
+    de sobrescribirse.
+    """
+    paths, used = {}, set()
+    for key in keys:
+        path = _split_path(filepath, key)
+        n = 1
+        while path.name.lower() in used:
+            n += 1
+            path = path.with_name(f"{_split_path(filepath, key).stem}_{n}.ics")
+        used.add(path.name.lower())
+        paths[key] = str(path)
+    return paths
+
+
+def _export_split(df, target: Path, split_by: str, chunk_rows, on_rows, cancel_event, max_workers) -> List[str]:
+    """
+    Un fichero por valor de `split_by`. Los grupos grandes se escriben en
+    streaming cada uno en su hilo; los pequeños (la mayoría con PERNR) se
+    formatean juntos por lotes de ~chunk_rows filas, para no pagar el coste
+    de pandas por cada fichero, y cada fichero se vuelca en un hilo.
+    """
+    df = df.reset_index(drop=True)
+    dtstamp = _dtstamp()
+    keys = df[split_by].astype(object).where(df[split_by].notna(), "")
+    groups = sorted(df.groupby(keys, sort=False).indices.items(), key=lambda item: str(item[0]))
+    # Las claves sin ninguna fila con evento no generan un .ics vacío
+    has_event = _event_mask(df).to_numpy()
+    empty = [(key, pos) for key, pos in groups if not has_event[pos].any()]
+    for _, pos in empty:
+        on_rows(len(pos), 0)
+    groups = [(key, pos) for key, pos in groups if has_event[pos].any()]
+    paths = _split_paths(target, [key for key, _ in groups])
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = []
+        try:
+            batch = []
+
+            def flush_batch():
+                check_cancelled(cancel_event)
+                positions = np.concatenate([pos for _, pos in batch])
+                events = format_events(df.iloc[positions], dtstamp)
+                for key, pos in batch:
+                    texts = events.reindex(pos).dropna().tolist()
+                    futures.append(pool.submit(_write_ics_events, texts, paths[key], dtstamp))
+                    on_rows(len(pos), len(texts))
+                batch.clear()
+
+            batch_rows = 0
+            for key, pos in groups:
+                if len(pos) >= chunk_rows:
+                    futures.append(pool.submit(_write_ics, df.iloc[pos], paths[key], chunk_rows,
+                                               on_rows, cancel_event, dtstamp))
+                    continue
+                batch.append((key, pos))
+                batch_rows += len(pos)
+                if batch_rows >= chunk_rows:
+                    flush_batch()
+                    batch_rows = 0
+            if batch:
+                flush_batch()
+            for future in futures:
+                future.result()
+        except BaseException:
+            for future in futures:
+                future.cancel()  # los que aún no han empezado ya no se escriben
+            raise
+    return list(paths.values())
+
+
+def exportar_ics(df, filepath, split_by: Optional[str] = None,
+                 progress_cb: Optional[Callable[[int, int], None]] = None,
+                 cancel_event=None, max_workers: int = ICS_EXPORT_WORKERS,
+                 chunk_rows: int = ICS_CHUNK_ROWS, log_fn=None) -> List[str]:
+    """
+    Escribe el calendario como .ics. Sin `split_by`, un único fichero en
+    `filepath`; con "PERNR" o "Grupo", un fichero por valor junto a `filepath`.
+    `progress_cb(filas, total)`. Devuelve las rutas escritas.
+    """
+    log_fn = log_fn or (lambda x: None)
+    if split_by is not None and split_by not in ICS_SPLIT_COLUMNS:
+        raise ValueError(f"split_by debe ser uno de {ICS_SPLIT_COLUMNS}")
+    if split_by is not None and split_by not in df.columns:
+        raise ValueError(f"El calendario no tiene la columna '{split_by}'")
+
+    total = len(df)
+    lock = threading.Lock()
+    counters = {"rows": 0, "events": 0}
+
+    def on_rows(rows, events):
+        with lock:
+            counters["rows"] += rows
+            counters["events"] += events
+            done = counters["rows"]
+        if progress_cb:
+            progress_cb(done, total)
+
+    target = Path(filepath)
+    if split_by is None:
+        paths = [_write_ics(df, target, chunk_rows, on_rows, cancel_event)]
+    else:
+        paths = _export_split(df, target, split_by, chunk_rows, on_rows, cancel_event, max_workers)
+
+    skipped = total - counters["events"]
+    log_fn(f"📅 ICS: {counters['events']} eventos en {len(paths)} fichero(s)"
+           + (f"; {skipped} filas sin Title/Fecha omitidas" if skipped else ""))
+    return paths
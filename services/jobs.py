@@ -0,0 +1,174 @@
+# File: services/jobs.py
+import asyncio
+import itertools
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class JobCancelled(Exception):
+    """El trabajo se canceló a petición del usuario."""
+
+
+class JobRejected(Exception):
+    """El planificador no acepta el trabajo (duplicado o cola llena)."""
+
+
+def check_cancelled(cancel_event: Optional[threading.Event]):
+    """Lanza JobCancelled si se ha pedido la cancelación (punto de corte cooperativo)."""
+    if cancel_event is not None and cancel_event.is_set():
+        raise JobCancelled("Operación cancelada")
+
+
+async def sleep_cancellable(seconds: float, cancel_event: Optional[threading.Event] = None,
+                            poll: float = 0.5):
+    """asyncio.sleep que se interrumpe (JobCancelled) si se pide cancelar durante la espera."""
+    if cancel_event is None:
+        await asyncio.sleep(seconds)
+        return
+    deadline = time.monotonic() + seconds
+    while True:
+        check_cancelled(cancel_event)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        await asyncio.sleep(min(poll, remaining))
+
+
+class Job:
+    """Trabajo encolado en un recurso. `fn(cancel_event)` hace el trabajo real."""
+    PENDING = "pendiente"
+    RUNNING = "en curso"
+    DONE = "completado"
+    CANCELLED = "cancelado"
+    FAILED = "error"
+
+    _ids = itertools.count(1)
+
+    def __init__(self, name: str, resource: str, fn: Callable[[threading.Event], Any],
+                 on_done: Optional[Callable[["Job"], None]] = None):
+        self.id = next(self._ids)
+        self.name = name
+        self.resource = resource
+        self.fn = fn
+        self.on_done = on_done
+        self.cancel_event = threading.Event()
+        self.status = Job.PENDING
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in (Job.PENDING, Job.RUNNING)
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def raise_for_error(self):
+        """Devuelve el resultado o relanza el error/cancelación del trabajo."""
+        if self.status == Job.CANCELLED:
+            raise JobCancelled("Operación cancelada")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class JobScheduler:
+    """
+    Planificador de trabajos compartido: una cola acotada y un único hilo por
+    recurso ("db", "sharepoint", ...), de modo que dos trabajos sobre el mismo
+    recurso nunca se solapan. La cancelación es cooperativa (cancel_event).
+    """
+    def __init__(self, max_queued: int = 5, on_change: Optional[Callable[[], None]] = None,
+                 log_callback=None):
+        self.max_queued = max_queued
+        self.on_change = on_change or (lambda: None)
+        self.log_fn = log_callback or (lambda x: None)
+        self._lock = threading.Lock()
+        self._queues: Dict[str, queue.Queue] = {}
+        self._jobs: List[Job] = []
+
+    def submit(self, name: str, resource: str, fn: Callable[[threading.Event], Any],
+               on_done: Optional[Callable[[Job], None]] = None, unique: bool = True) -> Job:
+        """
+        Encola un trabajo. Con `unique` se rechaza si ya hay otro activo con el
+        mismo nombre (p. ej. un doble clic en "Subir a SharePoint").
+        """
+        with self._lock:
+            if unique and any(j.active and j.name == name for j in self._jobs):
+                raise JobRejected(f"'{name}' ya está en curso o en cola")
+            q = self._queues.get(resource)
+            if q is None:
+                q = queue.Queue(maxsize=self.max_queued)
+                self._queues[resource] = q
+                threading.Thread(target=self._worker, args=(q,), daemon=True,
+                                 name=f"jobs-{resource}").start()
+            job = Job(name, resource, fn, on_done)
+            try:
+                q.put_nowait(job)
+            except queue.Full:
+                raise JobRejected(f"Cola de '{resource}' llena; espera a que terminen los trabajos")
+            self._jobs.append(job)
+            # Historial acotado: se descartan los trabajos terminados más antiguos
+            finished = [j for j in self._jobs if not j.active]
+            for old in finished[:-20]:
+                self._jobs.remove(old)
+        self.log_fn(f"🗂️ Trabajo #{job.id} '{name}' encolado en '{resource}'")
+        self.on_change()
+        return job
+
+    def _worker(self, q: queue.Queue):
+        while True:
+            job = q.get()
+            if job.cancel_event.is_set():
+                job.status = Job.CANCELLED
+            else:
+                job.status = Job.RUNNING
+                job.started = time.time()
+                self.on_change()
+                try:
+                    job.result = job.fn(job.cancel_event)
+                    job.status = Job.DONE
+                except JobCancelled:
+                    job.status = Job.CANCELLED
+                except Exception as e:
+                    job.error = e
+                    job.status = Job.FAILED
+                job.finished = time.time()
+            self.log_fn(f"🗂️ Trabajo #{job.id} '{job.name}': {job.status} ({job.elapsed:.1f}s)")
+            self.on_change()
+            if job.on_done:
+                try:
+                    job.on_done(job)
+                except Exception as e:
+                    self.log_fn(f"Error en callback del trabajo #{job.id}: {e}")
+            q.task_done()
+
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs)
+
+    def active_jobs(self, resource: Optional[str] = None) -> List[Job]:
+        return [j for j in self.jobs() if j.active and (resource is None or j.resource == resource)]
+
+    def cancel(self, job_id: int):
+        for job in self.jobs():
+            if job.id == job_id and job.active:
+                job.cancel()
+                self.log_fn(f"🛑 Cancelación solicitada para trabajo #{job.id} '{job.name}'")
+        self.on_change()
+
+    def cancel_all(self, resource: Optional[str] = None):
+        for job in self.active_jobs(resource):
+            job.cancel()
+        self.on_change()
@@ -0,0 +1,183 @@
+# File: services/profiling.py
+"""
+Perfilado bajo demanda de una acción completa (generar, sincronizar...).
+
+    with ProfileSession("Sincronizar SharePoint", log_callback=log) as session:
+        ...
+    session.bundle_dir  # carpeta con el paquete para adjuntar a una incidencia
+
+El paquete (PROFILE_DIR/AAAAMMDD-HHMMSS-accion/) contiene:
+- profile.prof   -> cProfile (abrir con `python -m pstats` o snakeviz)
+- profile.txt    -> top de funciones por tiempo acumulado
+- memory.snapshot / memory.txt -> tracemalloc (reabrir con tracemalloc.Snapshot.load)
+- loop_lag.json  -> retraso del event loop en las fases async
+- meta.json      -> acción, duración, resultado, versión de Python
+"""
+import asyncio
+import cProfile
+import io
+import json
+import os
+import platform
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from typing import List, Optional
+
+from config import PROFILE_DIR, PROFILE_LOOP_LAG_INTERVAL
+
+_local = threading.local()
+# cProfile solo admite un perfilador activo a la vez (sys.monitoring en 3.12+)
+_cprofile_lock = threading.Lock()
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+
+def active_session() -> Optional["ProfileSession"]:
+    """Sesión de perfilado del hilo actual (None si no se está perfilando)"""
+    return getattr(_local, "session", None)
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]+", "-", text).strip("-").lower()[:40] or "accion"
+
+
+class ProfileSession:
+    def __init__(self, label: str, out_dir: str = PROFILE_DIR, log_callback=None, top: int = 40):
+        self.label = label
+        self.out_dir = out_dir
+        self.log_fn = log_callback or (lambda x: None)
+        self.top = top
+        self.bundle_dir = None
+        self.loop_lags_ms: List[float] = []
+        self._profiler = None
+        self._started_tracemalloc = False
+        self._t0 = 0.0
+        self._started_at = None
+
+    def __enter__(self):
+        global _tracemalloc_users
+        self._started_at = datetime.now()
+        if _cprofile_lock.acquire(blocking=False):
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self.log_fn("🧪 Otro perfil de CPU está en curso: esta acción solo registra memoria y lag.")
+
+        with _tracemalloc_lock:
+            # El pico de tracemalloc es global: no se reinicia aquí para no falsear el
+            # de otra sesión en curso. Solo es propio de esta si la traza empezó con ella
+            if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+                self._started_tracemalloc = True
+            _tracemalloc_users += 1
+
+        _local.session = self
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _tracemalloc_users
+        elapsed = time.perf_counter() - self._t0
+        _local.session = None
+        if self._profiler is not None:
+            self._profiler.disable()
+            _cprofile_lock.release()
+
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        current, peak = tracemalloc.get_traced_memory() if snapshot else (0, 0)
+        with _tracemalloc_lock:
+            _tracemalloc_users -= 1
+            if _tracemalloc_users == 0 and self._started_tracemalloc:
+                tracemalloc.stop()
+
+        try:
+            self._write_bundle(elapsed, snapshot, current, peak, exc)
+            self.log_fn(f"🧪 Perfil de '{self.label}' guardado en {self.bundle_dir}")
+        except Exception as e:
+            self.log_fn(f"⚠️ No se pudo guardar el perfil: {e}")
+        return False
+
+    def _write_bundle(self, elapsed, snapshot, current, peak, exc):
+        stamp = self._started_at.strftime("%Y%m%d-%H%M%S")
+        self.bundle_dir = os.path.join(self.out_dir, f"{stamp}-{_slug(self.label)}")
+        os.makedirs(self.bundle_dir, exist_ok=True)
+
+        if self._profiler is not None:
+            self._profiler.dump_stats(os.path.join(self.bundle_dir, "profile.prof"))
+            text = io.StringIO()
+            pstats.Stats(self._profiler, stream=text).sort_stats("cumulative").print_stats(self.top)
+            _write_text(os.path.join(self.bundle_dir, "profile.txt"), text.getvalue())
+
+        if snapshot is not None:
+            snapshot.dump(os.path.join(self.bundle_dir, "memory.snapshot"))
+            scope = "" if self._started_tracemalloc else " (compartido con otra sesión en curso)"
+            lines = [f"actual: {current / 1e6:.1f} MB | pico: {peak / 1e6:.1f} MB{scope}", ""]
+            for stat in snapshot.statistics("lineno")[:self.top]:
+                lines.append(str(stat))
+            _write_text(os.path.join(self.bundle_dir, "memory.txt"), "\n".join(lines))
+
+        lags = sorted(self.loop_lags_ms)
+        _write_json(os.path.join(self.bundle_dir, "loop_lag.json"), {
+            "interval_ms": PROFILE_LOOP_LAG_INTERVAL * 1000,
+            "samples": len(lags),
+            "max_ms": lags[-1] if lags else 0.0,
+            "p95_ms": lags[min(len(lags) - 1, int(len(lags) * 0.95))] if lags else 0.0,
+            "over_100ms": sum(1 for lag in lags if lag > 100),
+            "lags_ms": self.loop_lags_ms,
+        })
+
+        _write_json(os.path.join(self.bundle_dir, "meta.json"), {
+            "action": self.label,
+            "started_at": self._started_at.isoformat(timespec="seconds"),
+            "duration_s": round(elapsed, 3),
+            "result": "ok" if exc is None else f"{type(exc).__name__}: {exc}",
+            "cpu_profile": self._profiler is not None,
+            "memory_peak_mb": round(peak / 1e6, 2),
+            # False: la traza ya estaba activa y el pico incluye el de otras sesiones
+            "memory_peak_own": self._started_tracemalloc,
+            "python": sys.version,
+            "platform": platform.platform(),
+        })
+
+
+async def _monitor_loop_lag(session: ProfileSession, interval: float):
+    """Mide cuánto se retrasa el despertar de un sleep: lag del event loop"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        session.loop_lags_ms.append(max(0.0, (loop.time() - expected) * 1000))
+
+
+async def _with_lag_monitor(coro, session: ProfileSession):
+    monitor = asyncio.create_task(_monitor_loop_lag(session, PROFILE_LOOP_LAG_INTERVAL))
+    try:
+        return await coro
+    finally:
+        monitor.cancel()
+
+
+def run_coroutine(coro):
+    """
+    asyncio.run() que, si el hilo está dentro de un ProfileSession, registra
+    además el lag del event loop mientras dura la corrutina.
+    """
+    session = active_session()
+    if session is None:
+        return asyncio.run(coro)
+    return asyncio.run(_with_lag_monitor(coro, session))
+
+
+def _write_text(filepath: str, text: str):
+    with open(filepath, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _write_json(filepath: str, data):
+    with open(filepath, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
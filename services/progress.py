@@ -0,0 +1,78 @@
+# File: services/progress.py
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+
+@dataclass
+class ProgressEvent:
+    """Estado de avance de una fase de un trabajo largo."""
+    phase: str
+    done: int
+    total: Optional[int] = None
+    items_per_s: float = 0.0
+    throttled_s: float = 0.0
+    eta_s: Optional[float] = None
+    finished: bool = False
+
+    @property
+    def fraction(self) -> Optional[float]:
+        if not self.total:
+            return None
+        return min(1.0, self.done / self.total)
+
+    def format(self) -> str:
+        """Texto corto para barra de estado / consola."""
+        parts = [f"{self.phase}: {self.done}" + (f"/{self.total}" if self.total else "")]
+        if self.items_per_s:
+            parts.append(f"{self.items_per_s:.1f} elem/s")
+        if self.eta_s is not None and not self.finished:
+            minutes, seconds = divmod(int(self.eta_s), 60)
+            parts.append(f"ETA {minutes}:{seconds:02d}")
+        if self.throttled_s:
+            parts.append(f"throttling {self.throttled_s:.0f}s")
+        return " · ".join(parts)
+
+
+class ProgressTracker:
+    """
+    Calcula velocidad y ETA de una fase y emite ProgressEvent al `sink`.
+
+    `update(done, total)` tiene la misma firma que los `progress_cb` de los
+    helpers async, así que se puede pasar directamente.
+    """
+    def __init__(self, phase: str, total: Optional[int] = None,
+                 sink: Optional[Callable[[ProgressEvent], None]] = None):
+        self.phase = phase
+        self.total = total
+        self.sink = sink or (lambda e: None)
+        self.done = 0
+        self.throttled_s = 0.0
+        self._start = time.perf_counter()
+
+    def _event(self, finished: bool = False) -> ProgressEvent:
+        elapsed = time.perf_counter() - self._start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.total and rate > 0:
+            eta = max(0.0, (self.total - self.done) / rate)
+        return ProgressEvent(self.phase, self.done, self.total, rate, self.throttled_s, eta, finished)
+
+    def update(self, done: int, total: Optional[int] = None):
+        self.done = done
+        if total is not None:
+            self.total = total
+        self.sink(self._event())
+
+    def advance(self, n: int = 1):
+        self.update(self.done + n)
+
+    def add_throttle(self, seconds: float):
+        """Registra tiempo de espera por throttling (429 / Retry-After)."""
+        self.throttled_s += seconds
+        self.sink(self._event())
+
+    def finish(self) -> ProgressEvent:
+        event = self._event(finished=True)
+        self.sink(event)
+        return event
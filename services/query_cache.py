@@ -0,0 +1,163 @@
+# File: services/query_cache.py
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class QueryResultCache:
+    """
+    Caché local (Parquet) de resultados de consultas SQL.
+
+    La clave es un hash del texto SQL, sus parámetros y la conexión (driver,
+    servidor, base de datos): cambiar de BD en el .env no reutiliza los
+    resultados de otra. Una entrada es válida
+    si no ha superado el TTL y, si hay sonda de frescura, si el valor de la
+    sonda coincide con el que se guardó junto al resultado.
+    """
+    def __init__(self, cache_dir: str, ttl: float = 86400, log_callback=None):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.log_fn = log_callback or (lambda x: None)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(sql_query: str, params: Optional[dict] = None, connection: str = "") -> str:
+        raw = f"{connection}\n{sql_query.strip()}" if connection else sql_query.strip()
+        if params:
+            raw += "\n" + json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def _paths(self, key: str):
+        return self.cache_dir / f"{key}.parquet", self.cache_dir / f"{key}.json"
+
+    def is_valid(self, key: str, probe_value: Optional[str] = None) -> bool:
+        data_path, meta_path = self._paths(key)
+        if not data_path.exists() or not meta_path.exists():
+            return False
+        try:
+            with meta_path.open("r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if self.ttl and time.time() - meta.get("created", 0) > self.ttl:
+            return False
+        # Si la sonda no responde (None) nos quedamos solo con el TTL
+        if probe_value is not None and meta.get("probe") != probe_value:
+            return False
+        return True
+
+    def invalidate(self, key: str):
+        """Borra una entrada (p. ej. un Parquet truncado o corrupto)"""
+        for path in self._paths(key):
+            try:
+                path.unlink(missing_ok=True)
+            except OSError as e:
+                self.log_fn(f"⚠️ No se pudo borrar {path.name} de la caché: {e}")
+
+    def record(self, hit: bool):
+        """Contabiliza un acierto/fallo y lo deja en el log"""
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.log_fn(
+            f"📦 Caché de consulta: {'HIT' if hit else 'MISS'} "
+            f"(aciertos={self.hits}, fallos={self.misses})"
+        )
+
+    def iter_chunks(self, key: str, chunksize: int) -> Iterator["pd.DataFrame"]:
+        """Lee la entrada cacheada por bloques de `chunksize` filas"""
+        import pyarrow.parquet as pq
+
+        data_path, _ = self._paths(key)
+        parquet = pq.ParquetFile(data_path)
+        for batch in parquet.iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+
+    def load(self, key: str) -> "pd.DataFrame":
+        import pandas as pd
+
+        data_path, _ = self._paths(key)
+        return pd.read_parquet(data_path)
+
+    def writer(self, key: str, probe_value: Optional[str] = None) -> "CacheWriter":
+        return CacheWriter(self, key, probe_value)
+
+    def store(self, key: str, df: "pd.DataFrame", probe_value: Optional[str] = None):
+        with self.writer(key, probe_value) as w:
+            w.write(df)
+
+
+class CacheWriter:
+    """
+    Escribe un resultado por bloques en un fichero temporal y solo lo publica
+    (rename atómico) si se cierra sin error. Si un bloque no encaja en el
+    esquema del primero, la entrada se descarta sin afectar a la consulta.
+    """
+    def __init__(self, cache: QueryResultCache, key: str, probe_value: Optional[str]):
+        self.cache = cache
+        self.key = key
+        self.probe_value = probe_value
+        self.data_path, self.meta_path = cache._paths(key)
+        self.tmp_path = self.data_path.with_suffix(".parquet.tmp")
+        self._writer = None
+        self._schema = None
+        self.failed = False
+        self.rows = 0
+
+    def write(self, df: "pd.DataFrame"):
+        if self.failed:
+            return
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self.cache.cache_dir.mkdir(parents=True, exist_ok=True)
+                self._schema = table.schema
+                self._writer = pq.ParquetWriter(self.tmp_path, self._schema)
+            else:
+                table = table.cast(self._schema)
+            self._writer.write_table(table)
+            self.rows += len(df)
+        except Exception as e:
+            self.cache.log_fn(f"⚠️ No se pudo cachear el resultado de la consulta: {e}")
+            self.abort()
+
+    def abort(self):
+        self.failed = True
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self.tmp_path.exists():
+            self.tmp_path.unlink()
+
+    def commit(self):
+        if self.failed or self._writer is None:
+            self.abort()
+            return
+        self._writer.close()
+        self._writer = None
+        os.replace(self.tmp_path, self.data_path)
+        meta_tmp = self.meta_path.with_suffix(".json.tmp")
+        with meta_tmp.open("w", encoding="utf-8") as f:
+            json.dump({"created": time.time(), "probe": self.probe_value, "rows": self.rows}, f)
+        os.replace(meta_tmp, self.meta_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
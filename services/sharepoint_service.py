@@ -3,7 +3,6 @@ from datetime import date, datetime
 import math
 import os
 import time
-import uuid
 from typing import Any, Dict, List, Optional
 from collections import Counter
 import pandas as pd
@@ -13,8 +12,14 @@ import msal
 import webbrowser
 import json
 import asyncio
+import threading
 import aiohttp
 
+try:
+    import orjson  # Opcional: serialización JSON más rápida
+except ImportError:
+    orjson = None
+
 
 from config import (
     SP_CLIENT_ID, 
@@ -22,28 +27,58 @@ from config import (
     USER_EMAIL, 
     SP_SITE_HOST, 
     SP_SITE_PATH, 
-    SP_LIST_NAME
+    SP_LIST_NAME,
+    SP_CACHE_FILE,
+    SP_CACHE_TTL,
+    SP_COUNT_ON_CONNECT
 )
+from services.graph_cache import GraphMetadataCache
+from services.calendar_service import CALENDAR_COLUMNS
+from services.table_writers import open_table_writer
+from services.progress import ProgressTracker
+from services.jobs import check_cancelled, sleep_cancellable
+from services.profiling import run_coroutine
+from services.throttle import budget_penalize, budget_slot
+from services.tracing import span
 
 GRAPH_BASE = "https://graph.microsoft.com/v1.0"
 SCOPES = ["Sites.ReadWrite.All"]
 TOKEN_CACHE_FILE = "token_cache.bin"
+TOKEN_REFRESH_MARGIN = 300  # segundos antes de caducar en los que se renueva el token
+BATCH_MAX_REQUESTS = 20  # Límite de Graph para peticiones por $batch
 
 class SharePointService:
-    def __init__(self, log_callback=None):
+    def __init__(self, log_callback=None, site_host: Optional[str] = None,
+                 site_path: Optional[str] = None, list_name: Optional[str] = None,
+                 throttle_budget=None):
+        """
+        Por defecto usa el site y la lista de config; `site_host`/`site_path`/
+        `list_name` permiten apuntar a otra lista (procesos por lotes).
+        `throttle_budget` (ThrottleBudget) se comparte entre sincronizaciones concurrentes.
+        """
         self.log_fn = log_callback or (lambda x: None)
         self._graph = None
         self._site_id = None
         self._list_id = None
         self.client = None
         self._column_map = None
+        self.list_name = list_name or SP_LIST_NAME
+        self.throttle_budget = throttle_budget
+        self._site_graph_id = f"{site_host or SP_SITE_HOST}:{site_path or SP_SITE_PATH}"
+        self._cache = GraphMetadataCache(SP_CACHE_FILE, ttl=SP_CACHE_TTL, log_callback=self.log_fn)
+        self._cache_key = GraphMetadataCache.make_key(self._site_graph_id, self.list_name)
         
     @property
     def is_authenticated(self):
         return self.client is not None and self.client.token is not None
+
+    @property
+    def is_session_ready(self) -> bool:
+        """Cliente autenticado con token vigente y site/list ya resueltos."""
+        return self.is_authenticated and self.client.token_is_fresh and bool(self._site_id and self._list_id)
         
     def initialize(self):
-        """Initialize Graph client"""
+        """Initialize Graph client (se conserva durante toda la vida de la app)"""
         if self.client is None:
             self.client = GraphDelegatedClient(
                 SP_CLIENT_ID,
@@ -51,40 +86,77 @@ class SharePointService:
                 USER_EMAIL,
                 self.log_fn
             )
+        self.client.ensure_token()
         return self.client
         
-    def authenticate(self):
-        """Authenticate and resolve site/list"""
+    def authenticate(self, force: bool = False):
+        """
+        Authenticate and resolve site/list.
+
+        Si la sesión ya está lista no se hace ninguna llamada de red; con
+        `force=True` se vuelve a resolver site/list ignorando la caché.
+        """
         try:
+            if self.is_session_ready and not force:
+                return True
             self.initialize()
-            return self.resolve_site_and_list()
+            if self._site_id and self._list_id and not force:
+                return True
+            return self.resolve_site_and_list(use_cache=not force)
         except Exception as e:
             self.log_fn(f"Error en autenticación: {str(e)}")
             return False
             
-    def resolve_site_and_list(self):
-        """Resolve SharePoint site and list IDs"""
-        site_graph_id = f"{SP_SITE_HOST}:{SP_SITE_PATH}"
-        self.log_fn(f"Resolviendo Site por ruta {site_graph_id}...")
-        
-        self._site_id = self.client.get_site_id_by_path(site_graph_id)
-        if not self._site_id:
-            self.log_fn("No se pudo resolver site_id")
-            return False
-            
-        self._list_id = self.client.get_list_id_by_name(self._site_id, SP_LIST_NAME)
-        if not self._list_id:
-            self.log_fn(f"No se encontró la lista '{SP_LIST_NAME}'")
-            return False
-            
-        self.log_fn(f"Conectado. SiteID={self._site_id} | ListID={self._list_id}")
-        
-        # Get item count
+    def resolve_site_and_list(self, use_cache: bool = True, count_items: bool = SP_COUNT_ON_CONNECT):
+        """
+        Resolve SharePoint site and list IDs.
+
+        Usa la caché persistida si está vigente; el conteo de elementos solo se
+        hace si `count_items` es True (recorre todas las páginas de la lista).
+        """
+        cached = self._cache.get(self._cache_key) if use_cache else None
+        if cached and cached.get("site_id") and cached.get("list_id"):
+            self._site_id = cached["site_id"]
+            self._list_id = cached["list_id"]
+            if self._column_map is None and cached.get("column_map"):
+                self._column_map = cached["column_map"]
+            self.log_fn(f"Conectado (caché). SiteID={self._site_id} | ListID={self._list_id}")
+        else:
+            self.log_fn(f"Resolviendo Site por ruta {self._site_graph_id}...")
+
+            self._site_id = self.client.get_site_id_by_path(self._site_graph_id)
+            if not self._site_id:
+                self.log_fn("No se pudo resolver site_id")
+                return False
+
+            self._list_id = self.client.get_list_id_by_name(self._site_id, self.list_name)
+            if not self._list_id:
+                self.log_fn(f"No se encontró la lista '{self.list_name}'")
+                return False
+
+            self.log_fn(f"Conectado. SiteID={self._site_id} | ListID={self._list_id}")
+            self._column_map = None
+            self._cache.update(self._cache_key, site_id=self._site_id, list_id=self._list_id, column_map=None)
+
+        if count_items:
+            self.get_item_count()
+
+        return True
+
+    def get_item_count(self) -> int:
+        """Cuenta los elementos de la lista (bajo demanda; -1 si falla)."""
         item_count = self.client.get_list_item_count(self._site_id, self._list_id)
         if item_count != -1:
-            self.log_fn(f"La lista '{SP_LIST_NAME}' contiene actualmente {item_count} elementos.")
-            
-        return True
+            self.log_fn(f"La lista '{self.list_name}' contiene actualmente {item_count} elementos.")
+        return item_count
+
+    def invalidate_metadata(self):
+        """Descarta site id, list id y mapa de columnas (memoria y disco)."""
+        self._site_id = None
+        self._list_id = None
+        self._column_map = None
+        self._cache.invalidate(self._cache_key)
+        self.log_fn("🧹 Caché de metadatos de SharePoint invalidada.")
     
 
     
@@ -93,32 +165,52 @@ class SharePointService:
         max_concurrent: int = 1,
         max_retries: int = 10,
         base_delay: float = 5.0,
-        progress_cb: callable = None
+        progress_cb: callable = None,
+        throttle_cb: callable = None,
+        cancel_event=None
     ):
         """
         Borra todos los elementos de la lista en batches, con manejo de throttling (async)
-        y reporte de progreso opcional.
+        y reporte de progreso opcional. `throttle_cb(segundos)` recibe cada espera por 429.
+        Si se activa `cancel_event` se lanza JobCancelled antes del siguiente batch.
         """
         headers = {
-            "Authorization": f"Bearer {self.client.token}",
+            "Authorization": f"Bearer {await asyncio.to_thread(self.client.ensure_token)}",
             "Accept": "application/json",
             "Content-Type": "application/json"
         }
 
+        async def refresh_auth():
+            token = await asyncio.to_thread(self.client.ensure_token, True)
+            headers["Authorization"] = f"Bearer {token}"
+
         # 1️⃣ Obtener todos los IDs
         url = f"{GRAPH_BASE}/sites/{self._site_id}/lists/{self._list_id}/items?$select=id"
         item_ids = []
+        auth_retries = 0
         while url:
             async with aiohttp.ClientSession() as session:
                 async with session.get(url, headers=headers) as response:
                     if response.status == 429:
                         retry_after = int(response.headers.get("Retry-After", base_delay))
                         self.log_fn(f"⏳ Throttling detectado. Esperando {retry_after}s...")
-                        await asyncio.sleep(retry_after)
+                        if throttle_cb:
+                            throttle_cb(retry_after)
+                        await sleep_cancellable(retry_after, cancel_event)
+                        continue
+                    elif response.status == 401:
+                        auth_retries += 1
+                        if auth_retries > max_retries:
+                            # p. ej. consentimiento revocado: refrescar el token no lo arregla
+                            self.log_fn(f"❌ Token rechazado (401) tras {max_retries} refrescos; se aborta el borrado.")
+                            return False
+                        self.log_fn("🔑 Token rechazado (401); refrescando...")
+                        await refresh_auth()
                         continue
                     elif response.status != 200:
                         self.log_fn(f"❌ Error obteniendo items: {response.status}")
                         return False
+                    auth_retries = 0
                     data = await response.json()
                     items = data.get("value", [])
                     item_ids.extend([item["id"] for item in items])
@@ -132,51 +224,62 @@ class SharePointService:
             return True
 
         # 2️⃣ Preparar batches
-        batches = [item_ids[i:i+20] for i in range(0, total, 20)]
+        batches = [item_ids[i:i+BATCH_MAX_REQUESTS] for i in range(0, total, BATCH_MAX_REQUESTS)]
+        # Serializamos todos los cuerpos fuera del event loop
+        payloads = await asyncio.to_thread(
+            encode_batches, encode_delete_batch, self._site_id, self._list_id, batches
+        )
         sem = asyncio.Semaphore(max_concurrent)
         deleted_count = 0
 
         async with aiohttp.ClientSession() as session:
 
-            async def delete_batch(batch, batch_index):
+            async def delete_batch(batch, payload, batch_index):
                 nonlocal deleted_count
                 async with sem:
-                    requests_batch = {
-                        "requests": [
-                            {
-                                "id": str(uuid.uuid4()),
-                                "method": "DELETE",
-                                "url": f"/sites/{self._site_id}/lists/{self._list_id}/items/{item_id}"
-                            }
-                            for item_id in batch
-                        ]
-                    }
-
+                    check_cancelled(cancel_event)
                     delay = base_delay
                     for attempt in range(1, max_retries + 1):
-                        async with session.post(f"{GRAPH_BASE}/$batch", json=requests_batch, headers=headers) as response:
-                            if response.status == 429:
-                                retry_after = int(response.headers.get("Retry-After", delay))
-                                self.log_fn(f"⏳ Batch {batch_index}: Throttling. Esperando {retry_after}s...")
-                                await asyncio.sleep(retry_after)
-                                continue
-                            elif response.status == 200:
-                                deleted_count += len(batch)
-                                self.log_fn(f"✔️ Batch {batch_index}: Eliminados {len(batch)} elementos ({deleted_count}/{total})")
-                                if progress_cb:
-                                    progress_cb(deleted_count, total)
-                                await asyncio.sleep(base_delay)
-                                return True
-                            else:
-                                error_text = await response.text()
-                                self.log_fn(f"⚠️ Batch {batch_index}: Error {response.status} - {error_text}. Reintento {attempt}/{max_retries} en {delay}s")
-                                await asyncio.sleep(delay)
-                                delay *= 2  # backoff exponencial
+                        wait, done = 0, False
+                        async with budget_slot(self.throttle_budget, cancel_event):
+                            # El span se abre con el hueco ya concedido: mide solo la petición HTTP
+                            with span("graph.batch.delete", rows=len(batch), bytes=len(payload), attempt=attempt) as request_span:
+                                async with session.post(f"{GRAPH_BASE}/$batch", data=payload, headers=headers) as response:
+                                    request_span.set(status=response.status).stop()
+                                    if response.status == 429:
+                                        wait = int(response.headers.get("Retry-After", delay))
+                                        self.log_fn(f"⏳ Batch {batch_index}: Throttling. Esperando {wait}s...")
+                                        budget_penalize(self.throttle_budget, wait)
+                                        if throttle_cb:
+                                            throttle_cb(wait)
+                                    elif response.status == 401:
+                                        self.log_fn(f"🔑 Batch {batch_index}: token rechazado (401); refrescando...")
+                                        await refresh_auth()
+                                        continue
+                                    elif response.status == 200:
+                                        deleted_count += len(batch)
+                                        self.log_fn(f"✔️ Batch {batch_index}: Eliminados {len(batch)} elementos ({deleted_count}/{total})")
+                                        if progress_cb:
+                                            progress_cb(deleted_count, total)
+                                        wait, done = base_delay, True
+                                    else:
+                                        error_text = await response.text()
+                                        self.log_fn(f"⚠️ Batch {batch_index}: Error {response.status} - {error_text}. Reintento {attempt}/{max_retries} en {delay}s")
+                                        wait = delay
+                                        delay *= 2  # backoff exponencial
+                        # Se espera ya sin el hueco del presupuesto: el resto de listas
+                        # sigue enviando (un 429 ya las pausa a todas vía penalize)
+                        await sleep_cancellable(wait, cancel_event)
+                        if done:
+                            return True
 
                     self.log_fn(f"❌ Batch {batch_index} falló tras {max_retries} intentos")
                     return False
 
-            results = await asyncio.gather(*(delete_batch(batch, idx) for idx, batch in enumerate(batches)))
+            results = await asyncio.gather(*(
+                delete_batch(batch, payload, idx)
+                for idx, (batch, payload) in enumerate(zip(batches, payloads))
+            ))
             ok = all(results)
 
         self.log_fn("✅ Borrado completado." if ok else f"⚠️ Borrado incompleto: {deleted_count}/{total} elementos eliminados")
@@ -191,11 +294,16 @@ class SharePointService:
         self.log_fn(f"📦 Verificación: la lista contiene {count} elementos.")
         return count == 0    
     
-    def sync_data(self, rows: List[Dict[str, Any]], mode: str = "replace") -> bool:
+    def sync_data(self, rows: List[Dict[str, Any]], mode: str = "replace",
+                  progress_cb: callable = None, cancel_event=None) -> bool:
         """
         Sincroniza datos en SharePoint en dos modos:
         - 'replace': elimina TODOS los elementos y vuelve a insertar todo.
         - 'update' : NO elimina; inserta SOLO los nuevos (Title único).
+
+        `progress_cb` (opcional) recibe ProgressEvent por fase (borrado/inserción)
+        con avance, elementos/s, segundos de throttling y ETA. `cancel_event`
+        permite cancelar entre batches (lanza JobCancelled).
         """
         import asyncio, time
 
@@ -210,13 +318,13 @@ class SharePointService:
                 # ya hay loop activo (ej. FastAPI, Flet, Jupyter)
                 return asyncio.ensure_future(coro)
             else:
-                return asyncio.run(coro)
+                return run_coroutine(coro)
 
         # ---- Logs iniciales y guardas defensivas ----
-        self.log_fn(f"🔎 sync_data recibe tipo: {type(rows)} con len={len(rows) if rows is not None else 'NA'}; mode={mode}")
+        self.log_fn(f"[DEBUG] 🔎 sync_data recibe tipo: {type(rows)} con len={len(rows) if rows is not None else 'NA'}; mode={mode}")
 
         if isinstance(rows, list) and rows:
-            self.log_fn(f"   Primer elemento: {type(rows[0])} -> {rows[0]}")
+            self.log_fn(f"[DEBUG]    Primer elemento: {type(rows[0])} -> {rows[0]}")
 
         if not all([self.client, self._site_id, self._list_id]):
             raise ValueError("SharePoint not properly initialized")
@@ -242,7 +350,7 @@ class SharePointService:
 
         # 🔍 Debug: primeras filas mapeadas
         for i, row in enumerate(mapped_rows[:3]):
-            self.log_fn(f"   [DEBUG] mapped_rows[{i}] = {type(row)} -> {row}")
+            self.log_fn(f"[DEBUG]    mapped_rows[{i}] = {type(row)} -> {row}")
 
         # ------------------------------
         # MODO REPLACE: BORRA + INSERTA
@@ -250,22 +358,33 @@ class SharePointService:
         if mode == "replace":
             self.log_fn("🔄 Iniciando borrado de elementos de la lista (modo REPLACE)...")
 
-            # Callback opcional para progreso
-            def delete_progress(deleted, total):
-                self.log_fn(f"⏳ Progreso borrado: {deleted}/{total}")
+            delete_tracker = ProgressTracker("Borrado", sink=progress_cb)
 
             # Ejecutar borrado de manera segura en cualquier loop
-            run_async(self.delete_all_items_async(progress_cb=delete_progress))
+            run_async(self.delete_all_items_async(
+                progress_cb=delete_tracker.update,
+                throttle_cb=delete_tracker.add_throttle,
+                cancel_event=cancel_event
+            ))
+            delete_tracker.finish()
+            check_cancelled(cancel_event)
 
             self.log_fn("🔄 Iniciando inserción de nuevos elementos en la lista (CREAR LISTA)...")
+            insert_tracker = ProgressTracker("Inserción", total=len(mapped_rows), sink=progress_cb)
             run_async(insert_dataframe_in_batches_async(
-                self.client.token,
+                self.client.ensure_token(),
                 self._site_id,
                 self._list_id,
                 mapped_rows,
                 log=self.log_fn,
-                batch_size=20
+                batch_size=20,
+                progress_cb=insert_tracker.update,
+                token_refresher=self.client.ensure_token,
+                throttle_cb=insert_tracker.add_throttle,
+                cancel_event=cancel_event,
+                throttle_budget=self.throttle_budget
             ))
+            insert_tracker.finish()
 
             new_count = self.client.get_list_item_count(self._site_id, self._list_id)
             if new_count != -1:
@@ -282,6 +401,7 @@ class SharePointService:
             self.log_fn(f"📦 Modo UPDATE: conteo actual = {before_count}")
 
             existing_titles = self.get_existing_titles()
+            check_cancelled(cancel_event)
             self.log_fn(f"🔎 Títulos existentes: {len(existing_titles)}")
 
             seen = set()
@@ -305,14 +425,21 @@ class SharePointService:
                 return True
 
             self.log_fn("🔄 Iniciando inserción de NUEVOS elementos (UPDATE)...")
+            insert_tracker = ProgressTracker("Inserción", total=len(new_rows), sink=progress_cb)
             run_async(insert_dataframe_in_batches_async(
-                self.client.token,
+                self.client.ensure_token(),
                 self._site_id,
                 self._list_id,
                 new_rows,
                 log=self.log_fn,
-                batch_size=20
+                batch_size=20,
+                progress_cb=insert_tracker.update,
+                token_refresher=self.client.ensure_token,
+                throttle_cb=insert_tracker.add_throttle,
+                cancel_event=cancel_event,
+                throttle_budget=self.throttle_budget
             ))
+            insert_tracker.finish()
 
             after_count = self.client.get_list_item_count(self._site_id, self._list_id)
             self.log_fn(f"📈 Conteo tras UPDATE: {after_count} (antes {before_count})")
@@ -326,6 +453,127 @@ class SharePointService:
             self.log_fn(f"❌ mode desconocido: {mode}")
             return False
 
+    def _export_field_map(self) -> Dict[str, str]:
+        """{columna del calendario -> internal name} para las columnas presentes en la lista."""
+        col_map = self.get_column_map() or {}
+        field_map = {}
+        for col in CALENDAR_COLUMNS:
+            internal = "Title" if col == "Title" else col_map.get(col)
+            if internal:
+                field_map[col] = internal
+        return field_map
+
+    async def _iter_list_pages_async(self, select_fields: List[str], page_size: int = 1000,
+                                     prefetch: int = 2, max_retries: int = 5, base_delay: float = 5.0,
+                                     cancel_event=None):
+        """
+        Generador asíncrono de páginas de items (lista de dicts `fields` + id).
+
+        Una tarea productora sigue los `@odata.nextLink` y deja hasta `prefetch`
+        páginas listas en una cola acotada mientras el consumidor procesa la
+        actual, de modo que la memoria no crece con el tamaño de la lista.
+        """
+        headers = {"Accept": "application/json"}
+        queue = asyncio.Queue(maxsize=max(1, prefetch))
+        done = object()
+        url = (
+            f"{GRAPH_BASE}/sites/{self._site_id}/lists/{self._list_id}/items"
+            f"?$top={page_size}&$select=id&$expand=fields($select={','.join(select_fields)})"
+        )
+
+        async def producer(session):
+            next_url = url
+            retries = 0
+            try:
+                while next_url:
+                    check_cancelled(cancel_event)
+                    token = await asyncio.to_thread(self.client.ensure_token)
+                    headers["Authorization"] = f"Bearer {token}"
+                    async with session.get(next_url, headers=headers) as response:
+                        if response.status in (401, 429, 503):
+                            retries += 1
+                            if retries > max_retries:
+                                raise RuntimeError(f"Demasiados reintentos leyendo la lista (HTTP {response.status})")
+                            if response.status == 401:
+                                await asyncio.to_thread(self.client.ensure_token, True)
+                                continue
+                            retry_after = int(response.headers.get("Retry-After", base_delay))
+                            self.log_fn(f"⏳ Throttling leyendo la lista. Esperando {retry_after}s...")
+                            await sleep_cancellable(retry_after, cancel_event)
+                            continue
+                        if response.status != 200:
+                            raise RuntimeError(f"Error leyendo la lista: HTTP {response.status} - {await response.text()}")
+                        retries = 0
+                        data = await response.json()
+                    await queue.put(data.get("value", []))
+                    next_url = data.get("@odata.nextLink")
+                await queue.put(done)
+            except Exception as e:
+                await queue.put(e)
+
+        async with aiohttp.ClientSession() as session:
+            task = asyncio.create_task(producer(session))
+            try:
+                while True:
+                    page = await queue.get()
+                    if page is done:
+                        break
+                    if isinstance(page, Exception):
+                        raise page
+                    yield page
+            finally:
+                task.cancel()
+
+    async def export_list_async(self, filepath: Optional[str] = None, page_size: int = 1000,
+                                prefetch: int = 2, progress_cb: callable = None,
+                                cancel_event=None):
+        """
+        Descarga la lista completa (incluida la asistencia) a `filepath`
+        (.xlsx, .parquet o .csv) página a página con memoria constante.
+        Si no se indica fichero, devuelve un DataFrame.
+        """
+        field_map = await asyncio.to_thread(self._export_field_map)
+        if not field_map:
+            self.log_fn("❌ No hay columnas exportables en la lista.")
+            return None
+        columns = ["ID"] + list(field_map)
+        self.log_fn(f"📥 Exportando lista '{self.list_name}' ({', '.join(columns)})...")
+
+        writer = open_table_writer(filepath, columns, date_columns=["Fecha"]) if filepath else None
+        frames = []
+        exported = 0
+        try:
+            async for page in self._iter_list_pages_async(list(field_map.values()), page_size, prefetch,
+                                                          cancel_event=cancel_event):
+                rows = []
+                for item in page:
+                    fields = item.get("fields") or {}
+                    row = {col: fields.get(internal) for col, internal in field_map.items()}
+                    row["ID"] = item.get("id")
+                    rows.append(row)
+                if writer is not None:
+                    # La escritura va a un hilo mientras se descarga la siguiente página
+                    await asyncio.to_thread(writer.write_rows, rows)
+                else:
+                    frames.append(pd.DataFrame(rows, columns=columns))
+                exported += len(rows)
+                if progress_cb:
+                    progress_cb(exported, None)
+        finally:
+            if writer is not None:
+                await asyncio.to_thread(writer.close)
+
+        self.log_fn(f"✅ Exportados {exported} elementos de SharePoint" + (f" a {filepath}" if filepath else ""))
+        if writer is not None:
+            return filepath
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+    def export_list(self, filepath: Optional[str] = None, **kwargs):
+        """Versión síncrona de export_list_async (para hilos de trabajo)."""
+        if not all([self.client, self._site_id, self._list_id]):
+            raise ValueError("SharePoint not properly initialized")
+        return run_coroutine(self.export_list_async(filepath, **kwargs))
+
     def get_existing_titles(self) -> set:
         """
         Devuelve un set de Title (str) existentes en la lista.
@@ -352,15 +600,24 @@ class SharePointService:
 
     def get_column_map(self, force=False):
         """
-        Obtiene y cachea el diccionario {displayName -> internalName} de la lista.
-        También loguea la tabla display/internal.
+        Obtiene y cachea (en memoria y en disco) el diccionario
+        {displayName -> internalName} de la lista.
+        También loguea la tabla display/internal al consultarla a Graph.
         """
         if self._column_map is not None and not force:
             return self._column_map
 
+        if not force:
+            cached = self._cache.get(self._cache_key)
+            if cached and cached.get("list_id") == self._list_id and cached.get("column_map"):
+                self._column_map = cached["column_map"]
+                return self._column_map
+
         cols = self.client.get_list_columns(self._site_id, self._list_id)
         if cols is None:
             self.log_fn("❌ No se pudieron obtener las columnas de la lista para construir el mapa.")
+            # Los IDs cacheados pueden estar obsoletos (lista recreada, etc.)
+            self._cache.invalidate(self._cache_key)
             self._column_map = {}
             return self._column_map
 
@@ -379,6 +636,12 @@ class SharePointService:
 
         # Construimos el mapa display->internal
         self._column_map = {c.get("displayName"): c.get("name") for c in cols if c.get("displayName") and c.get("name")}
+        self._cache.update(
+            self._cache_key,
+            site_id=self._site_id,
+            list_id=self._list_id,
+            column_map=self._column_map
+        )
         return self._column_map
 
     def _sanitize_value(self, v):
@@ -406,10 +669,14 @@ class SharePointService:
         Devuelve lista de dicts con internal names, asegurando 'Title'.
         Convierte a texto campos como PERNR y Grupo, y omite campos con valores por defecto.
         """        
+        with span("sp.map_rows", rows=len(rows)):
+            return self._map_rows_to_internal_impl(rows, col_map)
+
+    def _map_rows_to_internal_impl(self, rows, col_map):
         missing = Counter()
         mapped_rows = []
 
-        self.log_fn(f"🔎 _map_rows_to_internal recibe {len(rows)} filas, primer tipo: {type(rows[0])}")
+        self.log_fn(f"[DEBUG] 🔎 _map_rows_to_internal recibe {len(rows)} filas, primer tipo: {type(rows[0])}")
 
         # Campos de SharePoint que no debemos enviar porque tienen valores por defecto
         EXCLUDE_FIELDS = {"Asistencia", "Aviso24h", "Observaciones"}
@@ -457,7 +724,7 @@ class SharePointService:
         # Log de un ejemplo mapeado
         if mapped_rows:
             try:
-                self.log_fn(f"🧭 Ejemplo de fila mapeada a internal names: {json.dumps(mapped_rows[0], ensure_ascii=False)}")
+                self.log_fn(f"[DEBUG] 🧭 Ejemplo de fila mapeada a internal names: {json.dumps(mapped_rows[0], ensure_ascii=False)}")
             except Exception:
                 pass    
         mapped_rows = [copy.deepcopy(r) for r in mapped_rows]
@@ -475,35 +742,63 @@ class GraphDelegatedClient:
         self.authority = f"https://login.microsoftonline.com/{tenant_id}"
         self.log = log_fn
         self.token = None
-        
+        self.token_expires_at = 0.0
+        self._token_lock = threading.RLock()
+        # Sesión HTTP reutilizable (mantiene las conexiones TLS abiertas)
+        self.http = requests.Session()
+
+        # La caché de MSAL se carga la primera vez que se necesita un token
+        self.cache = None
+        self.app = None
+
+    def _init_msal(self):
+        """Carga la caché de token y crea la aplicación MSAL (una sola vez)."""
+        if self.app is not None:
+            return
         self.cache = msal.SerializableTokenCache()
         if os.path.exists(TOKEN_CACHE_FILE):
             self.log(f"Cargando caché de token desde {TOKEN_CACHE_FILE}")
-            self.cache.deserialize(open(TOKEN_CACHE_FILE, "r").read())                
+            with open(TOKEN_CACHE_FILE, "r") as cache_file:
+                self.cache.deserialize(cache_file.read())
 
         self.app = msal.PublicClientApplication(
-            client_id,
+            self.client_id,
             authority=self.authority,
             token_cache=self.cache
         )
-        
-        self.token = self._get_token_interactive()
-    
+
+    @property
+    def token_is_fresh(self) -> bool:
+        """True si hay token y le quedan más de TOKEN_REFRESH_MARGIN segundos."""
+        return self.token is not None and time.time() < self.token_expires_at - TOKEN_REFRESH_MARGIN
+
+    def ensure_token(self, force_refresh: bool = False) -> str:
+        """
+        Devuelve un token válido. Solo llama a MSAL si no hay token, si está
+        a punto de caducar o si se fuerza el refresco (p. ej. tras un 401).
+        """
+        with self._token_lock:
+            if not force_refresh and self.token_is_fresh:
+                return self.token
+            self._init_msal()
+            self.token = self._get_token_interactive(force_refresh=force_refresh)
+            return self.token
+
     def save_cache(self):
         """Saves the token cache to a file if it has changed."""
-        if self.cache.has_state_changed:
+        if self.cache is not None and self.cache.has_state_changed:
             self.log(f"Guardando caché de token en {TOKEN_CACHE_FILE}")
             with open(TOKEN_CACHE_FILE, "w") as cache_file:
                 cache_file.write(self.cache.serialize())
 
-    def _get_token_interactive(self):
+    def _get_token_interactive(self, force_refresh: bool = False):
         """Obtiene un token, primero desde la caché, y si no, interactivamente."""
         accounts = self.app.get_accounts()
         result = None
 
         if accounts:
             self.log(f"Cuenta encontrada en caché: {accounts[0]['username']}")
-            result = self.app.acquire_token_silent(SCOPES, account=accounts[0])
+            result = self.app.acquire_token_silent(SCOPES, account=accounts[0], force_refresh=force_refresh)
 
         if not result:
             self.log("No hay token en caché o ha expirado. Iniciando autenticación interactiva...")
@@ -515,21 +810,25 @@ class GraphDelegatedClient:
             webbrowser.open(flow['verification_uri'])
             
             result = self.app.acquire_token_by_device_flow(flow)
-            # Guardar la caché inmediatamente después de una autenticación exitosa
-            self.save_cache()
+
+        # Un refresco silencioso también puede modificar la caché
+        self.save_cache()
 
         if "access_token" in result:
             self.log("Token de acceso obtenido con éxito.")
+            self.token_expires_at = time.time() + int(result.get("expires_in", 0))
             return result['access_token']
         else:
             error_desc = result.get("error_description", "No hay descripción del error.")
             self.log(f"Error al obtener el token: {result.get('error')}\n{error_desc}")
             raise Exception(f"No se pudo obtener el token de acceso: {error_desc}")
 
-    def _make_request(self, method, url, **kwargs):
+    def _make_request(self, method, url, _retry_auth=True, **kwargs):
         """Helper para realizar peticiones a la API Graph con el token de acceso."""
-        if not self.token:
-            self.log("Error: no hay token de acceso disponible.")
+        try:
+            self.ensure_token()
+        except Exception as e:
+            self.log(f"Error: no hay token de acceso disponible ({e}).")
             return None, "Token no disponible", 500, None
 
         headers = kwargs.get("headers", {})
@@ -541,7 +840,12 @@ class GraphDelegatedClient:
         kwargs['headers'] = headers
         
         try:
-            response = requests.request(method, url, **kwargs)
+            response = self.http.request(method, url, **kwargs)
+            if response.status_code == 401 and _retry_auth:
+                # Token revocado o caducado antes de tiempo: refrescar y reintentar una vez
+                self.log("🔑 Graph devolvió 401; refrescando token...")
+                self.ensure_token(force_refresh=True)
+                return self._make_request(method, url, _retry_auth=False, **kwargs)
             response.raise_for_status()
             
             # Para respuestas sin contenido (ej. DELETE 204)
@@ -643,7 +947,54 @@ class GraphDelegatedClient:
             return None
         return data.get("value", [])
 
-            
+
+
+
+def dumps_json(obj) -> bytes:
+    """Serializa a JSON (bytes UTF-8), usando orjson si está instalado."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_insert_batch(site_id: str, list_id: str, batch: list) -> bytes:
+    """
+    Codifica un $batch de altas. Los ids son secuenciales: Graph solo exige
+    que sean únicos dentro de cada batch.
+    """
+    url = f"/sites/{site_id}/lists/{list_id}/items"
+    return dumps_json({
+        "requests": [
+            {
+                "id": str(i),
+                "method": "POST",
+                "url": url,
+                "headers": {"Content-Type": "application/json"},
+                "body": {"fields": item}
+            }
+            for i, item in enumerate(batch, start=1)
+        ]
+    })
+
+
+def encode_delete_batch(site_id: str, list_id: str, batch: list) -> bytes:
+    """Codifica un $batch de borrados a partir de una lista de IDs de item."""
+    return dumps_json({
+        "requests": [
+            {
+                "id": str(i),
+                "method": "DELETE",
+                "url": f"/sites/{site_id}/lists/{list_id}/items/{item_id}"
+            }
+            for i, item_id in enumerate(batch, start=1)
+        ]
+    })
+
+
+def encode_batches(encoder: callable, site_id: str, list_id: str, batches: list) -> List[bytes]:
+    """Codifica todos los batches con `encoder` (pensado para ejecutarse en un hilo)."""
+    return [encoder(site_id, list_id, batch) for batch in batches]
+
 
 async def insert_dataframe_in_batches_async(
     token: str,
@@ -655,10 +1006,21 @@ async def insert_dataframe_in_batches_async(
     progress_cb: callable = None,
     max_concurrent: int = 2,
     max_retries: int = 5,
-    base_delay: float = 2.0
+    base_delay: float = 2.0,
+    token_refresher: callable = None,
+    throttle_cb: callable = None,
+    cancel_event=None,
+    throttle_budget=None
 ) -> bool:
     """
     Inserta registros en SharePoint en batches, con manejo de throttling (async).
+    `progress_cb(insertados, total)` y `throttle_cb(segundos)` son opcionales.
+    `cancel_event` (threading.Event) corta el proceso antes del siguiente batch.
+
+    `token_refresher(force_refresh)` (opcional) devuelve un token nuevo cuando
+    Graph responde 401; se ejecuta en un hilo para no bloquear el loop.
+    `throttle_budget` (ThrottleBudget, opcional) limita las peticiones en vuelo
+    entre varias inserciones concurrentes y reparte los Retry-After.
     """
     headers = {
         "Authorization": f"Bearer {token}",
@@ -669,61 +1031,68 @@ async def insert_dataframe_in_batches_async(
     total = len(rows)
     log(f"📦 insert_dataframe_in_batches_async: {total} registros a insertar en batches de {batch_size}")
     inserted = 0
+    batch_size = min(batch_size, BATCH_MAX_REQUESTS)
     batches = [rows[i:i+batch_size] for i in range(0, total, batch_size)]
+    # Los cuerpos se codifican a bytes en un hilo: las corrutinas solo envían buffers
+    payloads = await asyncio.to_thread(encode_batches, encode_insert_batch, site_id, list_id, batches)
     sem = asyncio.Semaphore(max_concurrent)
 
     async with aiohttp.ClientSession() as session:
 
-        async def insert_batch(batch, batch_index):
+        async def insert_batch(batch, payload, batch_index):
             nonlocal inserted
             async with sem:
-                requests_batch = {
-                    "requests": [
-                        {
-                            "id": str(uuid.uuid4()),  # IDs únicos
-                            "method": "POST",
-                            "url": f"/sites/{site_id}/lists/{list_id}/items",
-                            "headers": {"Content-Type": "application/json"},
-                            "body": {"fields": item}
-                        }
-                        for item in batch
-                    ]
-                }
-
+                check_cancelled(cancel_event)
                 delay = base_delay
                 for attempt in range(1, max_retries + 1):
-                    async with session.post(f"{GRAPH_BASE}/$batch", json=requests_batch, headers=headers) as response:
-                        data = await response.json()
-                        if response.status == 200:
-                            # Validar respuestas internas
-                            failures = [r for r in data.get("responses", []) if r.get("status", 500) >= 400]
-                            if not failures:
-                                inserted += len(batch)
-                                log(f"✔️ Batch {batch_index}: Insertados {len(batch)} elementos ({inserted}/{total})")
-                                if progress_cb:
-                                    progress_cb(inserted, total)
-                                return True
-                            else:
-                                log(f"⚠️ Batch {batch_index}: {len(failures)} fallos internos en batch.")
-                                # tratar como error -> aplicar retry
-                        else:
-                            error_text = await response.text()
-                            log(f"⚠️ Batch {batch_index}: Error {response.status} - {error_text}")
-
-                        # Manejo de throttling
-                        retry_after = response.headers.get("Retry-After")
-                        if retry_after:
-                            delay = int(retry_after)
-                        else:
-                            delay = delay * 2  # backoff exponencial
-
-                        log(f"Reintento {attempt}/{max_retries} en {delay}s...")
-                        await asyncio.sleep(delay)
+                    async with budget_slot(throttle_budget, cancel_event):
+                        # El span se abre con el hueco ya concedido: mide solo la petición HTTP
+                        with span("graph.batch.insert", rows=len(batch), bytes=len(payload), attempt=attempt) as request_span:
+                            async with session.post(f"{GRAPH_BASE}/$batch", data=payload, headers=headers) as response:
+                                request_span.set(status=response.status)
+                                if response.status == 401 and token_refresher:
+                                    log(f"🔑 Batch {batch_index}: token rechazado (401); refrescando...")
+                                    headers["Authorization"] = f"Bearer {await asyncio.to_thread(token_refresher, True)}"
+                                    continue
+                                data = await response.json()
+                                request_span.stop()
+                                if response.status == 200:
+                                    # Validar respuestas internas
+                                    failures = [r for r in data.get("responses", []) if r.get("status", 500) >= 400]
+                                    if not failures:
+                                        inserted += len(batch)
+                                        log(f"✔️ Batch {batch_index}: Insertados {len(batch)} elementos ({inserted}/{total})")
+                                        if progress_cb:
+                                            progress_cb(inserted, total)
+                                        return True
+                                    else:
+                                        log(f"⚠️ Batch {batch_index}: {len(failures)} fallos internos en batch.")
+                                        # tratar como error -> aplicar retry
+                                else:
+                                    error_text = await response.text()
+                                    log(f"⚠️ Batch {batch_index}: Error {response.status} - {error_text}")
+
+                                # Manejo de throttling
+                                retry_after = response.headers.get("Retry-After")
+                                if retry_after:
+                                    delay = int(retry_after)
+                                    budget_penalize(throttle_budget, delay)
+                                    if throttle_cb:
+                                        throttle_cb(delay)
+                                else:
+                                    delay = delay * 2  # backoff exponencial
+
+                    # Se espera ya sin el hueco del presupuesto (ver penalize)
+                    log(f"Reintento {attempt}/{max_retries} en {delay}s...")
+                    await sleep_cancellable(delay, cancel_event)
 
                 log(f"❌ Batch {batch_index} falló tras {max_retries} intentos")
                 return False
 
-        results = await asyncio.gather(*(insert_batch(batch, idx) for idx, batch in enumerate(batches)))
+        results = await asyncio.gather(*(
+            insert_batch(batch, payload, idx)
+            for idx, (batch, payload) in enumerate(zip(batches, payloads))
+        ))
         ok = all(results)
 
     log("✅ Inserción completada." if ok else f"⚠️ Inserción incompleta: {inserted}/{total} registros insertados")
@@ -0,0 +1,211 @@
+# File: services/table_writers.py
+import csv
+import importlib.util
+import os
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+EXCEL_DATE_FORMAT = "yyyy-mm-dd"
+# Formatos que necesitan pyarrow (dependencia opcional)
+COLUMNAR_SUFFIXES = (".parquet", ".feather")
+
+
+def pyarrow_available() -> bool:
+    """True si pyarrow está instalado (sin importarlo: se comprueba al arrancar la UI)"""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def require_pyarrow(filepath):
+    """ImportError claro si el formato de `filepath` necesita pyarrow y no está instalado"""
+    suffix = Path(filepath).suffix.lower()
+    if suffix in COLUMNAR_SUFFIXES and not pyarrow_available():
+        raise ImportError(f"El formato {suffix} necesita pyarrow (pip install pyarrow)")
+
+
+def _as_date(value):
+    """'YYYY-MM-DD' / datetime / Timestamp -> date; devuelve el valor tal cual si no es fecha"""
+    if value is None or isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    if isinstance(value, datetime):  # incluye pd.Timestamp
+        return value.date()
+    if isinstance(value, str):
+        try:
+            return date.fromisoformat(value[:10])
+        except ValueError:
+            return value
+    return value
+
+
+class TableWriter(ABC):
+    """
+    Escritor incremental de tablas: recibe filas (dicts) por bloques y las
+    vuelca a disco sin mantener el fichero completo en memoria.
+    """
+    def __init__(self, filepath: str, columns: List[str],
+                 date_columns: Optional[Sequence[str]] = None):
+        self.filepath = str(filepath)
+        self.columns = list(columns)
+        # Columnas que se escriben como fecha nativa (solo formatos que la soportan)
+        self.date_columns = [c for c in (date_columns or []) if c in self.columns]
+        self.rows_written = 0
+
+    @abstractmethod
+    def write_rows(self, rows: Iterable[Dict[str, Any]]):
+        """Escribe un bloque de filas"""
+
+    def close(self):
+        pass
+
+    def abort(self):
+        """Cierra y elimina el fichero a medio escribir (cancelación o error)."""
+        try:
+            self.close()
+        except Exception:
+            pass
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class CsvTableWriter(TableWriter):
+    def __init__(self, filepath, columns, date_columns=None):
+        super().__init__(filepath, columns, date_columns)
+        self._fh = open(self.filepath, "w", newline="", encoding="utf-8-sig")
+        self._writer = csv.DictWriter(self._fh, fieldnames=self.columns, extrasaction="ignore")
+        self._writer.writeheader()
+
+    def write_rows(self, rows):
+        for row in rows:
+            self._writer.writerow(row)
+            self.rows_written += 1
+
+    def close(self):
+        self._fh.close()
+
+
+class ExcelTableWriter(TableWriter):
+    """Excel en modo write-only de openpyxl: las filas se serializan al vuelo."""
+    def __init__(self, filepath, columns, date_columns=None):
+        super().__init__(filepath, columns, date_columns)
+        from openpyxl import Workbook
+
+        self._wb = Workbook(write_only=True)
+        self._ws = self._wb.create_sheet()
+        self._ws.append(self.columns)
+        self._date_idx = [self.columns.index(c) for c in self.date_columns]
+
+    def write_rows(self, rows):
+        for row in rows:
+            values = [row.get(col) for col in self.columns]
+            for i in self._date_idx:
+                # openpyxl asigna formato de fecha a los objetos date
+                values[i] = _as_date(values[i])
+            self._ws.append(values)
+            self.rows_written += 1
+
+    def close(self):
+        if self._wb is not None:
+            self._wb.save(self.filepath)
+            self._wb = None
+
+
+class XlsxWriterTableWriter(TableWriter):
+    """
+    Excel con xlsxwriter en modo `constant_memory`: cada fila se vuelca al
+    disco al escribir la siguiente, así que la memoria no crece con el tamaño.
+    """
+    def __init__(self, filepath, columns, date_columns=None):
+        super().__init__(filepath, columns, date_columns)
+        import xlsxwriter
+
+        self._wb = xlsxwriter.Workbook(self.filepath, {"constant_memory": True})
+        self._ws = self._wb.add_worksheet()
+        self._date_fmt = self._wb.add_format({"num_format": EXCEL_DATE_FORMAT})
+        self._date_idx = set(self.columns.index(c) for c in self.date_columns)
+        self._ws.write_row(0, 0, self.columns)
+        for i in self._date_idx:
+            self._ws.set_column(i, i, 11)
+
+    def write_rows(self, rows):
+        ws = self._ws
+        for row in rows:
+            r = self.rows_written + 1
+            for c, col in enumerate(self.columns):
+                value = row.get(col)
+                if value is None:
+                    continue
+                if c in self._date_idx:
+                    value = _as_date(value)
+                    if isinstance(value, date):
+                        ws.write_datetime(r, c, value, self._date_fmt)
+                        continue
+                ws.write(r, c, value)
+            self.rows_written += 1
+
+    def close(self):
+        if self._wb is not None:
+            self._wb.close()
+            self._wb = None
+
+
+class ParquetTableWriter(TableWriter):
+    """Parquet por row groups; todas las columnas se guardan como texto."""
+    def __init__(self, filepath, columns, date_columns=None):
+        super().__init__(filepath, columns, date_columns)
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema([(col, pa.string()) for col in self.columns])
+        self._writer = pq.ParquetWriter(self.filepath, self._schema)
+
+    def write_rows(self, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        data = {
+            col: [None if r.get(col) is None else str(r.get(col)) for r in rows]
+            for col in self.columns
+        }
+        self._writer.write_table(self._pa.Table.from_pydict(data, schema=self._schema))
+        self.rows_written += len(rows)
+
+    def close(self):
+        self._writer.close()
+
+
+def _excel_writer_cls():
+    """xlsxwriter (constant_memory) si está instalado; si no, openpyxl write-only."""
+    try:
+        import xlsxwriter  # noqa: F401
+        return XlsxWriterTableWriter
+    except ImportError:
+        return ExcelTableWriter
+
+
+WRITERS = {
+    ".csv": CsvTableWriter,
+    ".xlsx": ExcelTableWriter,
+    ".parquet": ParquetTableWriter,
+}
+
+
+def open_table_writer(filepath: str, columns: List[str],
+                      date_columns: Optional[Sequence[str]] = None) -> TableWriter:
+    """Devuelve el escritor adecuado según la extensión del fichero."""
+    suffix = Path(filepath).suffix.lower()
+    writer_cls = WRITERS.get(suffix)
+    if writer_cls is None:
+        raise ValueError(f"Formato no soportado: '{suffix}' (usa {', '.join(WRITERS)})")
+    if writer_cls is ExcelTableWriter:
+        writer_cls = _excel_writer_cls()
+    require_pyarrow(filepath)
+    return writer_cls(filepath, columns, date_columns)
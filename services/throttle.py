@@ -0,0 +1,65 @@
+# File: services/throttle.py
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, nullcontext
+
+from services.jobs import check_cancelled
+
+
+class ThrottleBudget:
+    """
+    Presupuesto de throttling compartido entre varias sincronizaciones
+    concurrentes (cada una en su hilo y su event loop).
+
+    - Limita las peticiones `$batch` en vuelo a `max_in_flight` en total.
+    - Un 429 en cualquier sincronización (`penalize`) pausa a todas hasta que
+      pase el Retry-After: Graph limita por usuario/tenant, no por lista.
+    """
+    def __init__(self, max_in_flight: int = 4, poll: float = 0.05):
+        self.max_in_flight = max(1, max_in_flight)
+        self.poll = poll
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._cooldown_until = 0.0
+        self.penalties = 0
+        self.throttled_s = 0.0
+
+    async def acquire(self, cancel_event=None):
+        while True:
+            check_cancelled(cancel_event)
+            with self._lock:
+                wait = self._cooldown_until - time.monotonic()
+                if wait <= 0 and self._in_flight < self.max_in_flight:
+                    self._in_flight += 1
+                    return
+            await asyncio.sleep(min(max(wait, self.poll), 0.5))
+
+    def release(self):
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+    def penalize(self, seconds: float):
+        """Registra un 429: nadie envía nuevas peticiones durante `seconds`"""
+        with self._lock:
+            self.penalties += 1
+            self.throttled_s += seconds
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + seconds)
+
+    @asynccontextmanager
+    async def slot(self, cancel_event=None):
+        await self.acquire(cancel_event)
+        try:
+            yield self
+        finally:
+            self.release()
+
+
+def budget_slot(budget, cancel_event=None):
+    """`async with budget_slot(...)`: hueco del presupuesto, o nada si no hay presupuesto"""
+    return budget.slot(cancel_event) if budget is not None else nullcontext()
+
+
+def budget_penalize(budget, seconds: float):
+    if budget is not None:
+        budget.penalize(seconds)
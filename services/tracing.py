@@ -0,0 +1,224 @@
+# File: services/tracing.py
+"""
+Trazas ligeras de rendimiento: spans con duración, filas y bytes.
+
+    from services.tracing import span, traced
+
+    with span("db.read_clases") as s:
+        df = ...
+        s.set(rows=len(df))
+
+    @traced("calendar.expand")
+    def generar(...): ...
+
+Los spans se guardan en memoria (últimos TRACE_MAX_SPANS), se agregan por
+nombre en histogramas y se exportan a JSON o al formato de Chrome trace
+(chrome://tracing / https://ui.perfetto.dev).
+"""
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+from config import TRACE_ENABLED, TRACE_MAX_SPANS
+
+# Límites superiores (ms) de los cubos del histograma; el último cubo es "más"
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+@dataclass
+class Span:
+    name: str
+    start_ns: int
+    duration_ns: int = 0
+    run: str = ""
+    tid: int = 0
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+    def set(self, **attrs):
+        """Añade atributos al span (rows, bytes, status...)"""
+        self.attrs.update(attrs)
+        return self
+
+    def stop(self):
+        """Cierra el span antes de salir del bloque (p. ej. antes de una espera de reintento)"""
+        if not self.duration_ns:
+            self.duration_ns = time.perf_counter_ns() - self.start_ns
+        return self
+
+    @property
+    def duration_ms(self) -> float:
+        return self.duration_ns / 1e6
+
+
+class _NullSpan:
+    """Span que no registra nada (trazas desactivadas)"""
+    def set(self, **attrs):
+        return self
+
+    def stop(self):
+        return self
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _track_id() -> int:
+    """Pista del span: la tarea asyncio en curso o, si no hay, el hilo"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return id(task) & 0xFFFFFF
+    return threading.get_ident() & 0xFFFFFF
+
+
+class Tracer:
+    def __init__(self, enabled: bool = True, max_spans: int = 20000):
+        self.enabled = enabled
+        self._spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+        self._origin_ns = time.perf_counter_ns()
+        self._local = threading.local()
+
+    @property
+    def run(self) -> str:
+        return getattr(self._local, "run", "")
+
+    def begin_run(self, label: str):
+        """
+        Etiqueta los spans siguientes de este hilo (p. ej. 'Generar calendario
+        10:32:05'): trabajos concurrentes en otros hilos no se mezclan.
+        """
+        self._local.run = label
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+        self._origin_ns = time.perf_counter_ns()
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        if not self.enabled:
+            yield _NULL_SPAN
+            return
+        s = Span(name, time.perf_counter_ns(), run=self.run, tid=_track_id(), attrs=dict(attrs))
+        try:
+            yield s
+        except BaseException as e:
+            s.attrs.setdefault("error", type(e).__name__)
+            raise
+        finally:
+            s.stop()
+            with self._lock:
+                self._spans.append(s)
+
+    def traced(self, name: Optional[str] = None):
+        """Decorador: un span por llamada (funciones normales o corrutinas)"""
+        def decorator(fn):
+            span_name = name or fn.__qualname__
+            if asyncio.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(span_name):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def spans(self, run: Optional[str] = None) -> List[Span]:
+        with self._lock:
+            spans = list(self._spans)
+        return [s for s in spans if run is None or s.run == run]
+
+    def runs(self) -> List[str]:
+        seen = {}
+        for s in self.spans():
+            seen.setdefault(s.run, None)
+        return list(seen)
+
+    def stats(self, run: Optional[str] = None) -> Dict[str, dict]:
+        """Agregado por nombre: n, total/media/p50/p95/máx en ms, filas, bytes e histograma"""
+        groups: Dict[str, List[Span]] = {}
+        for s in self.spans(run):
+            groups.setdefault(s.name, []).append(s)
+
+        result = {}
+        for name, spans in groups.items():
+            durations = sorted(s.duration_ms for s in spans)
+            n = len(durations)
+            histogram = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+            for d in durations:
+                idx = next((i for i, limit in enumerate(HISTOGRAM_BUCKETS_MS) if d <= limit),
+                           len(HISTOGRAM_BUCKETS_MS))
+                histogram[idx] += 1
+            total_ms = sum(durations)
+            rows = sum(s.attrs.get("rows", 0) or 0 for s in spans)
+            result[name] = {
+                "count": n,
+                "total_ms": total_ms,
+                "mean_ms": total_ms / n,
+                "p50_ms": durations[n // 2],
+                "p95_ms": durations[min(n - 1, int(n * 0.95))],
+                "max_ms": durations[-1],
+                "rows": rows,
+                "bytes": sum(s.attrs.get("bytes", 0) or 0 for s in spans),
+                "rows_per_s": rows / (total_ms / 1000) if total_ms > 0 else 0.0,
+                "histogram": histogram,
+            }
+        return result
+
+    def export_json(self, filepath: str, run: Optional[str] = None) -> str:
+        """Spans crudos + agregados por nombre"""
+        data = {
+            "buckets_ms": list(HISTOGRAM_BUCKETS_MS),
+            "stats": self.stats(run),
+            "spans": [
+                {**asdict(s), "start_ms": (s.start_ns - self._origin_ns) / 1e6, "duration_ms": s.duration_ms}
+                for s in self.spans(run)
+            ],
+        }
+        _write_json(filepath, data)
+        return filepath
+
+    def export_chrome_trace(self, filepath: str, run: Optional[str] = None) -> str:
+        """Formato Trace Event (eventos 'X'), abrible en chrome://tracing o Perfetto"""
+        pid = os.getpid()
+        events = [
+            {
+                "name": s.name,
+                "cat": s.name.split(".", 1)[0],
+                "ph": "X",
+                "ts": (s.start_ns - self._origin_ns) / 1000,
+                "dur": s.duration_ns / 1000,
+                "pid": pid,
+                "tid": s.tid,
+                "args": {**s.attrs, "run": s.run},
+            }
+            for s in self.spans(run)
+        ]
+        _write_json(filepath, {"traceEvents": events, "displayTimeUnit": "ms"})
+        return filepath
+
+
+def _write_json(filepath: str, data):
+    with open(filepath, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, default=str)
+
+
+# Tracer del proceso: los servicios usan estos atajos
+tracer = Tracer(enabled=TRACE_ENABLED, max_spans=TRACE_MAX_SPANS)
+span = tracer.span
+traced = tracer.traced
@@ -0,0 +1,135 @@
+# File: services/workers.py
+"""
+Funciones de trabajo de nivel de módulo (picklables) para lanzar la
+generación, la exportación y la sincronización en un ProcessPoolExecutor.
+
+Cada proceso crea sus propios servicios a partir de config; logs y progreso
+vuelven al proceso principal a través de un EventSink (p. ej. QueueSink).
+`cancel_event` puede ser un `multiprocessing.Manager().Event()`.
+"""
+import math
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from services.events import EventSink
+
+_db_service = None
+
+
+@dataclass
+class WorkerResult:
+    """Resumen de un trabajo: filas procesadas, duración y fichero generado."""
+    task: str
+    rows: int
+    seconds: float
+    output: Optional[str] = None
+    data: Optional[object] = None  # DataFrame cuando no se escribe fichero
+
+    @property
+    def rows_per_s(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+def _get_db_service(log_fn):
+    """Un DatabaseService (y su pool) por proceso, reutilizado entre trabajos"""
+    global _db_service
+    from services.db_service import DatabaseService
+
+    if _db_service is None:
+        _db_service = DatabaseService(log_callback=log_fn)
+    # La caché de consultas guarda su propio callback: también se reasigna
+    _db_service.log_fn = log_fn
+    if _db_service.cache is not None:
+        _db_service.cache.log_fn = log_fn
+    return _db_service
+
+
+def records_from_df(df) -> List[dict]:
+    """DataFrame -> lista de dicts con NaN como None (formato que espera sync_data)"""
+    return [
+        {k: (None if (isinstance(v, float) and math.isnan(v)) else v) for k, v in row.items()}
+        for row in df.to_dict(orient="records")
+    ]
+
+
+def generate_calendar_job(start_date: datetime, end_date: datetime, sink: Optional[EventSink] = None,
+                          festivos=None, output: Optional[str] = None,
+                          sql_query: Optional[str] = None, params: Optional[dict] = None,
+                          refresh: bool = False, cancel_event=None) -> WorkerResult:
+    """
+    Genera el calendario de un rango. `festivos` es un HolidayCalendar o una
+    lista de fechas. Con `output` lo guarda (formato según la extensión) y no
+    devuelve el DataFrame, para no serializarlo entre procesos.
+    """
+    from services.calendar_service import CalendarService, default_query
+    from services.excel_service import guardar_calendario
+    from services.progress import ProgressTracker
+
+    sink = sink or EventSink()
+    t0 = time.perf_counter()
+    if sql_query is None:
+        sql_query, params = default_query(start_date, end_date)
+
+    service = CalendarService(db_service=_get_db_service(sink.log), log_callback=sink.log)
+    tracker = ProgressTracker("Clases procesadas", sink=sink.progress)
+    df = service.generate_calendar(
+        start_date=start_date,
+        end_date=end_date,
+        sql_query=sql_query,
+        festivos=festivos,
+        refresh=refresh,
+        params=params,
+        progress_cb=tracker.update,
+        cancel_event=cancel_event,
+    )
+    tracker.finish()
+
+    if output and not df.empty:
+        tracker = ProgressTracker("Exportación", total=len(df), sink=sink.progress)
+        guardar_calendario(df, output, progress_cb=tracker.update, cancel_event=cancel_event)
+        tracker.finish()
+        return WorkerResult("generate", len(df), time.perf_counter() - t0, output=output)
+    return WorkerResult("generate", len(df), time.perf_counter() - t0, data=None if output else df)
+
+
+def export_calendar_job(df, output: str, sink: Optional[EventSink] = None,
+                        cancel_event=None) -> WorkerResult:
+    """Guarda un calendario ya generado en `output` (.xlsx/.parquet/.feather/.csv)"""
+    from services.excel_service import guardar_calendario
+    from services.progress import ProgressTracker
+
+    sink = sink or EventSink()
+    t0 = time.perf_counter()
+    tracker = ProgressTracker("Exportación", total=len(df), sink=sink.progress)
+    guardar_calendario(df, output, progress_cb=tracker.update, cancel_event=cancel_event)
+    tracker.finish()
+    return WorkerResult("export", len(df), time.perf_counter() - t0, output=output)
+
+
+def sync_calendar_job(source, mode: str = "update", sink: Optional[EventSink] = None,
+                      cancel_event=None, site_host: Optional[str] = None,
+                      site_path: Optional[str] = None, list_name: Optional[str] = None,
+                      throttle_budget=None) -> WorkerResult:
+    """
+    Sube un calendario a SharePoint. `source` es la ruta de un calendario
+    guardado o un DataFrame. Site y lista por defecto los de config.
+    `throttle_budget` solo se comparte entre hilos (no es picklable).
+    """
+    from services.excel_service import leer_calendario
+    from services.sharepoint_service import SharePointService
+
+    sink = sink or EventSink()
+    t0 = time.perf_counter()
+    df = leer_calendario(source, log_fn=sink.log) if isinstance(source, str) else source
+
+    service = SharePointService(log_callback=sink.log, site_host=site_host, site_path=site_path,
+                                list_name=list_name, throttle_budget=throttle_budget)
+    if not service.authenticate():
+        raise RuntimeError("No se pudo autenticar en SharePoint")
+    ok = service.sync_data(records_from_df(df), mode=mode, progress_cb=sink.progress,
+                           cancel_event=cancel_event)
+    if not ok:
+        raise RuntimeError(f"La sincronización ({mode}) no se completó")
+    return WorkerResult("sync", len(df), time.perf_counter() - t0)
@@ -0,0 +1,21 @@
+import pandas as pd
+
+from gencal import cli
+from services.workers import WorkerResult
+
+
+def test_bench_smoke(monkeypatch, capsys):
+    df = pd.DataFrame({
+        "Title": ["1-45901-ING", "2-45902-FRA"],
+        "PERNR": ["1", "2"],
+        "Fecha": ["2025-09-01", "2025-09-02"],
+    })
+    # Sin BD: el calendario "generado" es un DataFrame pequeño
+    monkeypatch.setattr(cli, "_generate", lambda args, progress: WorkerResult("generate", len(df), 0.01, data=df))
+
+    code = cli.main(["bench", "2025-09-01", "2025-09-02", "--formats", "xlsx,parquet,feather"])
+
+    out = capsys.readouterr().out
+    assert code == cli.EXIT_OK
+    assert "write xlsx" in out
+    assert "read xlsx" in out
@@ -0,0 +1,104 @@
+import json
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.holiday_service import HolidayCalendar, HolidayRule, easter_sunday, load_festivos
+
+
+@pytest.mark.parametrize("year, expected", [
+    (1818, date(1818, 3, 22)),  # la más temprana posible
+    (2000, date(2000, 4, 23)),
+    (2019, date(2019, 4, 21)),
+    (2024, date(2024, 3, 31)),
+    (2025, date(2025, 4, 20)),
+    (2026, date(2026, 4, 5)),
+    (2038, date(2038, 4, 25)),  # la más tardía posible
+])
+def test_easter_sunday(year, expected):
+    assert easter_sunday(year) == expected
+
+
+def test_easter_rules_follow_easter():
+    cal = HolidayCalendar(regiones=["ES", "ES-CT"])
+    assert "2025-04-18" in cal  # Viernes Santo
+    assert "2025-04-21" in cal  # Lunes de Pascua (ES-CT)
+    assert "2026-04-03" in cal
+    assert "2026-04-06" in cal
+
+
+def test_feb_29_rule_only_in_leap_years():
+    rule = HolidayRule("Bisiesto", mes=2, dia=29)
+    assert rule.date_for(2024) == date(2024, 2, 29)
+    assert rule.date_for(2025) is None
+
+    cal = HolidayCalendar(reglas=[rule])
+    cal.ensure_years(2023, 2025)
+    assert list(cal) == ["2024-02-29"]
+    assert "2025-02-28" not in cal
+    assert "2025-03-01" not in cal
+
+
+def test_remove_rule_date_excludes_only_that_day():
+    cal = HolidayCalendar(regiones=["ES"])
+    cal.remove("2025-12-25")
+
+    assert "2025-12-25" not in cal
+    assert "2026-12-25" in cal
+    assert cal.to_dict()["excluidos"] == ["2025-12-25"]
+
+    # La exclusión se conserva al guardar/cargar y se deshace al volver a añadirla
+    reloaded = HolidayCalendar.from_dict(cal.to_dict())
+    assert "2025-12-25" not in reloaded
+    reloaded.append("2025-12-25")
+    assert "2025-12-25" in reloaded
+    assert "excluidos" not in reloaded.to_dict()
+
+
+def test_remove_non_holiday_raises():
+    cal = HolidayCalendar(regiones=["ES"])
+    with pytest.raises(ValueError):
+        cal.remove("2025-12-24")
+
+
+def test_mask_across_year_boundary():
+    cal = HolidayCalendar(regiones=["ES"], festivos=["2025-12-31"])
+    days = pd.date_range("2025-12-20", "2026-01-10")
+
+    mask = cal.mask(days)
+
+    assert mask.dtype == bool
+    assert [d.strftime("%Y-%m-%d") for d in days[mask]] == [
+        "2025-12-25", "2025-12-31", "2026-01-01", "2026-01-06",
+    ]
+
+
+def test_mask_empty():
+    assert HolidayCalendar(regiones=["ES"]).mask(np.array([], dtype="datetime64[D]")).size == 0
+
+
+def test_from_dict_skips_invalid_entries():
+    logs = []
+    cal = HolidayCalendar.from_dict({
+        "festivos": ["2025-09-08", "valor raro", "2025-13-01"],
+        "regiones": ["ES", "XX"],
+        "reglas": [{"nombre": "Incompleta", "mes": 5}, {"nombre": "Local", "mes": 11, "dia": 9}],
+        "excluidos": [None],
+    }, log_callback=logs.append)
+
+    assert "2025-09-08" in cal
+    assert "2025-11-09" in cal
+    assert cal.regions == ["ES"]
+    assert len(cal.rules) == 1
+    assert len(logs) == 5
+
+
+def test_load_festivos_tolerates_bad_values(tmp_path):
+    path = tmp_path / "festivos.json"
+    path.write_text(json.dumps({"festivos": ["2025-09-08", "08/09/2025x"]}), encoding="utf-8")
+
+    cal = load_festivos(path)
+
+    assert list(cal) == ["2025-09-08"]
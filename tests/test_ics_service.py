@@ -0,0 +1,29 @@
+import pandas as pd
+
+from services.ics_service import exportar_ics
+
+
+def test_split_skips_keys_without_events(tmp_path):
+    df = pd.DataFrame({
+        "Title": ["1-45659-ING", "1-45660-ING", None, "4-45660-ING"],
+        "Fecha": ["2025-01-02", "2025-01-03", "2025-01-03", "no es fecha"],
+        "PERNR": ["1", "1", "A/B", "4"],
+    })
+
+    paths = exportar_ics(df, tmp_path / "cal.ics", split_by="PERNR")
+
+    assert paths == [str(tmp_path / "cal_1.ics")]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["cal_1.ics"]
+    assert (tmp_path / "cal_1.ics").read_text(encoding="utf-8").count("BEGIN:VEVENT") == 2
+
+
+def test_split_sanitized_name_collisions_get_suffix(tmp_path):
+    df = pd.DataFrame({
+        "Title": ["1", "2"],
+        "Fecha": ["2025-01-02", "2025-01-02"],
+        "Grupo": ["A/B", "A_B"],
+    })
+
+    exportar_ics(df, tmp_path / "cal.ics", split_by="Grupo")
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["cal_A_B.ics", "cal_A_B_2.ics"]
@@ -1,9 +1,18 @@
 # File: ui/components/calendar_manager.py
 from datetime import datetime
-from tkinter import messagebox
-from config import OUTPUT_FILE, CONSULTA
-from services.calendar_service import CalendarService
-from services.excel_service import exportar_calendario, cargar_calendario
+from tkinter import filedialog, messagebox
+from config import OUTPUT_FILE
+from services.jobs import JobCancelled
+from services.table_writers import pyarrow_available
+from ui.components.dialogs import IcsExportDialog
+from ui.utils.progress_dispatcher import ProgressDispatcher
+
+CALENDAR_FILETYPES = [("Excel files", "*.xlsx")]
+# Parquet/Feather solo si pyarrow está instalado (dependencia opcional)
+if pyarrow_available():
+    CALENDAR_FILETYPES += [("Parquet files", "*.parquet"), ("Feather files", "*.feather")]
+# Solo exportación: Outlook / Google Calendar
+EXPORT_FILETYPES = CALENDAR_FILETYPES + [("iCalendar", "*.ics")]
 
 
 class CalendarManager:
@@ -12,48 +21,109 @@ class CalendarManager:
         Componente que conecta la UI con los servicios de calendario.
         """
         self.app = app
-        self.service = CalendarService(
-            db_service=self.app.db_manager.db_service,
-            log_callback=self.app.log
-        )
+        self._service = None
+        self._generation = None
+        self.progress = ProgressDispatcher(app, lambda e: self.app.status_bar.show_progress(e))
+
+    @property
+    def service(self):
+        """CalendarService (importa pandas solo cuando se usa por primera vez)"""
+        if self._service is None:
+            from services.calendar_service import CalendarService
+            self._service = CalendarService(
+                db_service=self.app.db_manager.db_service,
+                log_callback=self.app.log
+            )
+        return self._service
 
     def generate_calendar(self):
-        """Generar calendario desde la BD"""
-        try:
-            # Verificar conexión a la BD
-            self.app.db_manager.test_connection()
+        """Generar calendario desde la BD en un hilo de trabajo (la UI sigue respondiendo)"""
+        if self._generation is not None and self._generation.active:
+            self.cancel_generation()
+            return
 
-            # Obtener fechas desde UI
-            start_str, end_str = self.app.config_panel.fechas_panel.get_dates()
-            if not start_str or not end_str:
-                messagebox.showerror("Fechas requeridas",
-                                     "Debes introducir fecha inicio y fecha fin")
-                return
+        # Obtener fechas desde UI
+        start_str, end_str = self.app.config_panel.fechas_panel.get_dates()
+        if not start_str or not end_str:
+            messagebox.showerror("Fechas requeridas",
+                                 "Debes introducir fecha inicio y fecha fin")
+            return
 
+        try:
             # Convertir fechas
             start = datetime.strptime(start_str, "%Y-%m-%d")
             end = datetime.strptime(end_str, "%Y-%m-%d")
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+
+        # Todo lo que venga de widgets se lee aquí, en el hilo de Tk
+        refresh = self.app.config_panel.fechas_panel.force_refresh()
+        festivos = self.app.holidays.copy()  # snapshot: el panel puede seguir editando
 
-            # Mostrar feedback
-            self.app.update_status("Generando calendario desde la base de datos...")
-            self.app.status_bar.set_progress(0.2)
+        # Mostrar feedback
+        self.app.update_status("Generando calendario desde la base de datos...")
+        self.app.status_bar.set_progress(0)
+        self.app.main_panel.generate_btn.configure(text="Cancelar generación")
+
+        def generation_process(cancel_event):
+            from services.calendar_service import default_query
+            from services.progress import ProgressTracker
+
+            # Verificar conexión a la BD (lanza excepción si falla)
+            self.app.db_manager.db_service.test_connection()
+            self.app.after(0, self.app.db_manager._mark_connected)
 
-            # Llamar al servicio
-            self.app.calendar_df = self.service.generate_calendar(
+            # Consulta parametrizada por rango (filtra en SQL Server) si está configurada
+            sql_query, params = default_query(start, end)
+
+            tracker = ProgressTracker("Clases procesadas", sink=self.progress)
+            df = self.service.generate_calendar(
                 start_date=start,
                 end_date=end,
-                sql_query=CONSULTA,
-                festivos=self.app.holidays
+                sql_query=sql_query,
+                festivos=festivos,
+                refresh=refresh,
+                params=params,
+                progress_cb=tracker.update,
+                cancel_event=cancel_event
             )
+            tracker.finish()
+            return df
+
+        # Cola "db": nunca se solapa con otra consulta o test de conexión
+        self._generation = self.app.submit_job(
+            "Generar calendario", "db", generation_process,
+            on_done=lambda job: self.app.after(0, lambda: self._on_generation_done(job))
+        )
+        if self._generation is None:
+            self.app.main_panel.generate_btn.configure(text="Generar calendario")
+            self.app.update_status("Ready")
 
-            # Completar generación
-            self.app.after(1000, self._complete_calendar_generation)
+    def cancel_generation(self):
+        """Pide la cancelación de la generación en curso"""
+        if self._generation is not None:
+            self._generation.cancel()
+            self.app.update_status("Cancelando generación...")
 
+    def _on_generation_done(self, job):
+        """Recoge el resultado del hilo de trabajo (se ejecuta en el hilo de Tk)"""
+        self._generation = None
+        self.app.main_panel.generate_btn.configure(text="Generar calendario")
+        try:
+            self.app.calendar_df = job.raise_for_error()
+        except JobCancelled:
+            self.app.update_status("Generación cancelada")
+            self.app.status_bar.set_progress(0)
+            return
         except Exception as e:
             self.app.update_status("Error al generar calendario")
             self.app.log(f"Error: {str(e)}")
             messagebox.showerror("Error", str(e))
             self.app.status_bar.set_progress(0)
+            return
+
+        self._complete_calendar_generation()
 
     def _complete_calendar_generation(self):
         """Finalizar la generación y refrescar UI"""
@@ -67,26 +137,109 @@ class CalendarManager:
         self.app.status_bar.set_progress(0)
 
     def export_cal(self):
-        """Exportar calendario a Excel"""
-        if self.app.calendar_df is not None and not self.app.calendar_df.empty:
-            filepath = exportar_calendario(self.app.calendar_df)
-            if filepath:
-                self.app.update_status(f"Calendario exportado a {filepath}")
-                self.app.log(
-                    f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - "
-                    f"Calendario exportado correctamente a {filepath}."
-                )
-        else:
+        """Exportar calendario a Excel, Parquet, Feather o iCalendar (según la extensión)"""
+        if self.app.calendar_df is None or self.app.calendar_df.empty:
             messagebox.showinfo("Sin datos", "Por favor, genera primero el calendario de clases")
+            return
+
+        filepath = self._ask_save_path()
+        if not filepath:
+            return
+
+        # Se captura el DataFrame actual: una generación posterior no afecta a esta exportación
+        df = self.app.calendar_df
+        if filepath.lower().endswith(".ics"):
+            IcsExportDialog(self.app, callback=lambda split_by: self._start_export(df, filepath, split_by))
+        else:
+            self._start_export(df, filepath)
+
+    def _start_export(self, df, filepath, split_by=None):
+        """Lanza la exportación como trabajo; `split_by` (PERNR/Grupo) solo aplica a .ics"""
+        def export_process(cancel_event):
+            from services.excel_service import guardar_calendario
+            from services.ics_service import exportar_ics
+            from services.progress import ProgressTracker
+            tracker = ProgressTracker("Exportación", total=len(df), sink=self.progress)
+            try:
+                if split_by:
+                    exportar_ics(df, filepath, split_by=split_by, progress_cb=tracker.update,
+                                 cancel_event=cancel_event, log_fn=self.app.log)
+                else:
+                    guardar_calendario(df, filepath, progress_cb=tracker.update, cancel_event=cancel_event)
+                event = tracker.finish()
+                self.app.log(f"📤 Calendario exportado: {event.format()}")
+                self.app.after(0, lambda: self._complete_export(filepath))
+            except JobCancelled:
+                self.app.log("🛑 Exportación cancelada por el usuario.")
+                raise
+            except Exception as e:
+                msg = str(e)
+                self.app.log(f"Error exportando calendario: {msg}")
+                self.app.after(0, lambda m=msg: messagebox.showerror("Error", f"No se pudo exportar el calendario: {m}"))
+                raise
+            finally:
+                self.app.after(0, lambda: self.app.status_bar.set_progress(0))
+
+        self.app.update_status("Exportando calendario...")
+        self.app.submit_job("Exportar calendario", "fichero", export_process)
+
+    # Los diálogos de fichero viven solo aquí: los servicios reciben rutas
+    def _ask_save_path(self):
+        filepath = filedialog.asksaveasfilename(
+            parent=self.app,
+            defaultextension=".xlsx",
+            filetypes=EXPORT_FILETYPES,
+            initialfile="calendario.xlsx",
+            title="Guardar calendario como"
+        )
+        return filepath or None
+
+    def _ask_open_path(self):
+        filepath = filedialog.askopenfilename(
+            parent=self.app,
+            title="Seleccionar archivo de calendario",
+            filetypes=[("Calendarios", " ".join(pattern for _, pattern in CALENDAR_FILETYPES))]
+                      + CALENDAR_FILETYPES + [("All files", "*.*")]
+        )
+        return filepath or None
+
+    def _complete_export(self, filepath):
+        self.app.update_status(f"Calendario exportado a {filepath}")
+        self.app.log(
+            f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - "
+            f"Calendario exportado correctamente a {filepath}."
+        )
 
     def load_cal(self):
-        """Cargar calendario desde Excel"""
-        df = cargar_calendario()
+        """Cargar calendario desde Excel, Parquet o Feather"""
+        from services.excel_service import leer_calendario
+        filepath = self._ask_open_path()
+        if not filepath:
+            return
+
+        def load_process(cancel_event):
+            try:
+                df = leer_calendario(filepath, log_fn=self.app.log)
+            except Exception as e:
+                msg = str(e)
+                self.app.log(f"Error cargando calendario: {msg}")
+                self.app.after(0, lambda m=msg: self._load_failed(m))
+                raise
+            self.app.after(0, lambda: self._complete_load(df))
+
+        self.app.update_status("Cargando calendario...")
+        self.app.submit_job("Cargar calendario", "fichero", load_process)
+
+    def _load_failed(self, message=""):
+        self.app.update_status("Error al cargar calendario")
+        messagebox.showerror("Error", f"No se pudo cargar el calendario desde el fichero.\n{message}")
+
+    def _complete_load(self, df):
         if df is None or df.empty:
-            messagebox.showerror("Error", "No se pudo cargar el calendario desde el fichero Excel.")
+            self._load_failed("El fichero no contiene registros.")
             return
-        
+
         self.app.calendar_df = df
-        self.app.update_status("Calendario cargado desde fichero Excel")
-        self.app.log(f"Calendario cargado desde fichero Excel con {len(df)} registros")
+        self.app.update_status("Calendario cargado desde fichero")
+        self.app.log(f"Calendario cargado desde fichero con {len(df)} registros")
         self.app.load_sample_data()
@@ -1,9 +1,8 @@
-import threading
 from datetime import datetime
 from tkinter import messagebox
 from config import COLORS
 from services.db_service import DatabaseService
-import pandas as pd
+from services.jobs import JobRejected
 
 class DatabaseManager:
     def __init__(self, app):
@@ -15,7 +14,7 @@ class DatabaseManager:
         """Test database connection with UI feedback"""
         self.app.log(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - Testing database connection")
         
-        def test_process():
+        def test_process(cancel_event):
             try:
                 if self.db_service.test_connection():
                     self.app.after(0, self._connection_success)
@@ -24,10 +23,27 @@ class DatabaseManager:
             except Exception as e:
                 self.app.log(f"Error en conexión: {str(e)}")
                 self.app.after(0, lambda: self._connection_failed(str(e)))
+                raise
 
         self.app.update_status("Probando la conexión a la base de datos...")
         self.app.status_bar.set_progress(0.3)
-        threading.Thread(target=test_process, daemon=True).start()
+        self.app.submit_job("Test conexión BD", "db", test_process)
+
+    def warm_up(self):
+        """Abre una conexión del pool en segundo plano sin bloquear la UI"""
+        def warm_up_process(cancel_event):
+            if self.db_service.warm_up():
+                self.app.after(0, self._mark_connected)
+
+        try:
+            self.app.jobs.submit("Precalentar BD", "db", warm_up_process)
+        except JobRejected:
+            pass
+
+    def _mark_connected(self):
+        """Marca la BD como conectada sin tocar la barra de estado"""
+        self.is_connected = True
+        self.app.header.db_status.configure(text_color=COLORS['success'])
 
     def _connection_success(self):
         """Handle successful connection"""
@@ -55,7 +71,7 @@ class DatabaseManager:
                 return False
         return True
     
-    def read_clases(self, sql_query: str) -> pd.DataFrame:
+    def read_clases(self, sql_query: str) -> "pd.DataFrame":
         """Execute query with error handling and connection check"""
         if not self.ensure_connection():
             raise RuntimeError("No hay conexión activa con la base de datos")
@@ -1,7 +1,23 @@
 import customtkinter as ctk
 import tkinter as tk
+from tkinter import filedialog
 from config import COLORS
 
+
+def center_on_parent(window):
+    """Centra una ventana Toplevel respecto a su ventana padre"""
+    window.update_idletasks()  # Calcula tamaño real de la ventana
+    w = window.winfo_width()
+    h = window.winfo_height()
+    parent_w = window.master.winfo_width()
+    parent_h = window.master.winfo_height()
+    parent_x = window.master.winfo_rootx()
+    parent_y = window.master.winfo_rooty()
+    x = parent_x + (parent_w - w) // 2
+    y = parent_y + (parent_h - h) // 2
+    window.geometry(f"{w}x{h}+{x}+{y}")
+
+
 class ConfirmDialog(ctk.CTkToplevel):
     def __init__(self, parent, title, message, callback=None):
         super().__init__(parent)
@@ -90,13 +106,185 @@ class SharePointDialog(ConfirmDialog):
     
     def center_window(self):
         """Centra la ventana respecto a la ventana padre"""
-        self.update_idletasks()  # Calcula tamaño real de la ventana
-        w = self.winfo_width()
-        h = self.winfo_height()
-        parent_w = self.master.winfo_width()
-        parent_h = self.master.winfo_height()
-        parent_x = self.master.winfo_rootx()
-        parent_y = self.master.winfo_rooty()
-        x = parent_x + (parent_w - w) // 2
-        y = parent_y + (parent_h - h) // 2
-        self.geometry(f"{w}x{h}+{x}+{y}")
\ No newline at end of file
+        center_on_parent(self)
+
+
+class IcsExportDialog(ctk.CTkToplevel):
+    """Elige cómo repartir la exportación .ics; callback(None | "PERNR" | "Grupo")"""
+    def __init__(self, parent, callback=None):
+        super().__init__(parent)
+        self.title("Exportar a iCalendar")
+        self.geometry("560x200")
+        self.transient(parent)
+        self.result = None
+
+        ctk.CTkLabel(self, text="¿Cómo quieres generar los ficheros .ics?", wraplength=500,
+                     font=ctk.CTkFont(size=14)).pack(pady=20)
+
+        btn_frame = ctk.CTkFrame(self, fg_color="transparent")
+        btn_frame.pack(pady=10)
+
+        def elegir(split_by):
+            self.result = split_by
+            if callback:
+                callback(split_by)
+            self.destroy()
+
+        def cancelar():
+            self.result = None
+            self.destroy()
+
+        ctk.CTkButton(btn_frame, text="UN FICHERO", command=lambda: elegir(None)).pack(side="left", padx=5)
+        ctk.CTkButton(btn_frame, text="UNO POR PERSONA", command=lambda: elegir("PERNR")).pack(side="left", padx=5)
+        ctk.CTkButton(btn_frame, text="UNO POR GRUPO", command=lambda: elegir("Grupo")).pack(side="left", padx=5)
+        ctk.CTkButton(btn_frame, text="CANCELAR", command=cancelar).pack(side="left", padx=5)
+
+        center_on_parent(self)
+        self.after(10, self._set_grab)
+
+    def _set_grab(self):
+        try:
+            self.grab_set()
+            self.focus_set()
+        except tk.TclError:
+            self.after(50, self._set_grab)
+
+
+class JobsDialog(ctk.CTkToplevel):
+    """Lista los trabajos del planificador y permite cancelar los activos"""
+    REFRESH_MS = 500
+
+    def __init__(self, parent, scheduler):
+        super().__init__(parent)
+        self.title("Trabajos en segundo plano")
+        self.geometry("560x320")
+        self.transient(parent)
+        self.scheduler = scheduler
+
+        self.list_frame = ctk.CTkScrollableFrame(self)
+        self.list_frame.pack(fill="both", expand=True, padx=10, pady=(10, 5))
+
+        btn_frame = ctk.CTkFrame(self, fg_color="transparent")
+        btn_frame.pack(fill="x", padx=10, pady=(0, 10))
+        ctk.CTkButton(btn_frame, text="Cancelar todos", fg_color=COLORS['error'],
+                      hover_color="#C0392B", command=self.scheduler.cancel_all).pack(side="left")
+        ctk.CTkButton(btn_frame, text="Cerrar", command=self.destroy).pack(side="right")
+
+        self.refresh()
+
+    def refresh(self):
+        """Redibuja la lista (es corta: como mucho unas decenas de trabajos)"""
+        if not self.winfo_exists():
+            return
+        for widget in self.list_frame.winfo_children():
+            widget.destroy()
+
+        jobs = list(reversed(self.scheduler.jobs()))
+        if not jobs:
+            ctk.CTkLabel(self.list_frame, text="No hay trabajos").pack(pady=10)
+
+        for i, job in enumerate(jobs):
+            row = ctk.CTkFrame(self.list_frame, fg_color="gray20" if i % 2 == 0 else "gray15")
+            row.pack(fill="x", pady=1)
+            ctk.CTkLabel(
+                row,
+                text=f"#{job.id} {job.name} [{job.resource}] · {job.status} · {job.elapsed:.1f}s",
+                anchor="w"
+            ).pack(side="left", padx=10, pady=5)
+            if job.active:
+                ctk.CTkButton(
+                    row, text="Cancelar", width=80, height=25,
+                    fg_color=COLORS['error'], hover_color="#C0392B",
+                    command=lambda j=job: self.scheduler.cancel(j.id)
+                ).pack(side="right", padx=5, pady=2)
+
+        self.after(self.REFRESH_MS, self.refresh)
+
+
+class PerformanceDialog(ctk.CTkToplevel):
+    """Agregados de los spans de rendimiento por nombre, con exportación"""
+    REFRESH_MS = 1000
+    ALL_RUNS = "(todas las ejecuciones)"
+    BARS = "▁▂▃▄▅▆▇█"
+
+    def __init__(self, parent, tracer):
+        super().__init__(parent)
+        self.title("Rendimiento")
+        self.geometry("980x420")
+        self.transient(parent)
+        self.tracer = tracer
+
+        top = ctk.CTkFrame(self, fg_color="transparent")
+        top.pack(fill="x", padx=10, pady=(10, 5))
+        ctk.CTkLabel(top, text="Ejecución:").pack(side="left")
+        self.run_var = ctk.StringVar(value=self.ALL_RUNS)
+        self.run_menu = ctk.CTkOptionMenu(top, variable=self.run_var, values=[self.ALL_RUNS],
+                                          width=320, command=lambda _: self._render())
+        self.run_menu.pack(side="left", padx=10)
+
+        self.txt = ctk.CTkTextbox(self, wrap="none", font=ctk.CTkFont(family="Courier", size=12))
+        self.txt.pack(fill="both", expand=True, padx=10, pady=5)
+
+        btn_frame = ctk.CTkFrame(self, fg_color="transparent")
+        btn_frame.pack(fill="x", padx=10, pady=(0, 10))
+        ctk.CTkButton(btn_frame, text="Exportar JSON", command=self._export_json).pack(side="left")
+        ctk.CTkButton(btn_frame, text="Exportar Chrome trace",
+                      command=self._export_chrome).pack(side="left", padx=10)
+        ctk.CTkButton(btn_frame, text="Reiniciar", fg_color=COLORS['warning'],
+                      command=self._reset).pack(side="left")
+        ctk.CTkButton(btn_frame, text="Cerrar", command=self.destroy).pack(side="right")
+
+        self.refresh()
+
+    def _selected_run(self):
+        run = self.run_var.get()
+        return None if run == self.ALL_RUNS else run
+
+    def _sparkline(self, histogram):
+        peak = max(histogram) or 1
+        return "".join(" " if n == 0 else self.BARS[min(7, n * 8 // (peak + 1))] for n in histogram)
+
+    def _render(self):
+        stats = self.tracer.stats(self._selected_run())
+        header = (f"{'span':<26}{'n':>7}{'total ms':>11}{'media':>9}{'p50':>9}{'p95':>9}"
+                  f"{'máx':>9}{'filas':>10}{'filas/s':>10}{'MB':>8}  histograma (1ms…10s)")
+        lines = [header, "-" * len(header)]
+        for name, st in sorted(stats.items(), key=lambda kv: -kv[1]["total_ms"]):
+            lines.append(
+                f"{name[:25]:<26}{st['count']:>7}{st['total_ms']:>11.0f}{st['mean_ms']:>9.1f}"
+                f"{st['p50_ms']:>9.1f}{st['p95_ms']:>9.1f}{st['max_ms']:>9.1f}{st['rows']:>10}"
+                f"{st['rows_per_s']:>10.0f}{st['bytes'] / 1e6:>8.1f}  {self._sparkline(st['histogram'])}"
+            )
+        if not stats:
+            lines.append("Sin datos todavía: lanza una generación o sincronización.")
+
+        self.txt.configure(state="normal")
+        self.txt.delete("1.0", "end")
+        self.txt.insert("end", "\n".join(lines))
+        self.txt.configure(state="disabled")
+
+    def refresh(self):
+        if not self.winfo_exists():
+            return
+        self.run_menu.configure(values=[self.ALL_RUNS] + [r for r in self.tracer.runs() if r])
+        self._render()
+        self.after(self.REFRESH_MS, self.refresh)
+
+    def _export(self, default_name, exporter):
+        filepath = filedialog.asksaveasfilename(
+            parent=self, defaultextension=".json", initialfile=default_name,
+            filetypes=[("JSON", "*.json")], title="Exportar trazas"
+        )
+        if filepath:
+            exporter(filepath, self._selected_run())
+
+    def _export_json(self):
+        self._export("rendimiento.json", self.tracer.export_json)
+
+    def _export_chrome(self):
+        self._export("trace.json", self.tracer.export_chrome_trace)
+
+    def _reset(self):
+        self.tracer.reset()
+        self.run_var.set(self.ALL_RUNS)
+        self._render()
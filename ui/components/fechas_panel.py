@@ -43,6 +43,14 @@ class FechasPanel(ctk.CTkFrame):
         self.end_picker.delete(0, "end")
         self.end_picker.pack(side="left", fill="x", expand=True, padx=(0, 5))
 
+        # Forzar lectura de la BD ignorando la caché local de la consulta
+        self.refresh_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(
+            self,
+            text="Releer datos de la BD (ignorar caché)",
+            variable=self.refresh_var
+        ).pack(anchor="w", padx=10, pady=(0, 10))
+
     def get_date_range(self):
         """Get selected start and end dates"""
         start_date = self.start_picker.get_date()
@@ -54,6 +62,10 @@ class FechasPanel(ctk.CTkFrame):
         self.start_picker.delete(0, "end")
         self.end_picker.delete(0, "end")
 
+    def force_refresh(self) -> bool:
+        """True si el usuario pide ignorar la caché de la consulta"""
+        return bool(self.refresh_var.get())
+
     def get_dates(self) -> tuple[str, str]:
         """Get start and end dates as strings"""
         return (
@@ -1,10 +1,17 @@
 # File: ui/components/holiday_panel.py
+import bisect
 import customtkinter as ctk
 from datetime import datetime
 from tkcalendar import DateEntry
-from tkinter import messagebox
+from tkinter import filedialog, messagebox
 from config import COLORS
-from services.holiday_service import save_festivos
+from services.holiday_service import REGIONAL_RULES, import_festivos
+
+# Años que se muestran en el listado (las reglas valen para cualquier año)
+DISPLAY_YEARS_AHEAD = 1
+# Filas visibles del listado: son las únicas que existen como widgets (se reutilizan al desplazar)
+VISIBLE_ROWS = 8
+SCROLL_STEP = 3
 
 class HolidayPanel(ctk.CTkFrame):
     def __init__(self, parent, app):
@@ -16,7 +23,11 @@ class HolidayPanel(ctk.CTkFrame):
             fg_color="transparent"
         )
         self.app = app
-        self.holidays = app.holidays  # Referencia a la lista de festivos
+        self.holidays = app.holidays  # Referencia al HolidayCalendar de la app
+        self._items = []   # fechas ISO mostradas, siempre ordenadas (bisect)
+        self._first = 0    # índice de _items en la primera fila visible
+        self._rows = []    # pool de filas: (frame, label, button)
+        self._row_state = []  # (texto, color) pintado en cada fila, para no reconfigurar en vano
         
         self.setup_holiday_panel()
         self.refresh_holiday_list()
@@ -55,21 +66,50 @@ class HolidayPanel(ctk.CTkFrame):
             font=ctk.CTkFont(size=12)
         ).pack(anchor="w", padx=10, pady=(10,0))
         
-        self.holiday_list_frame = ctk.CTkScrollableFrame(self, height=250)
-        self.holiday_list_frame.pack(fill="both", expand=True, padx=10, pady=(5,10))
+        list_frame = ctk.CTkFrame(self, fg_color="transparent")
+        list_frame.pack(fill="both", expand=True, padx=10, pady=(5,10))
+
+        self.holiday_list_frame = ctk.CTkFrame(list_frame, height=250)
+        self.holiday_list_frame.pack(side="left", fill="both", expand=True)
+        self.holiday_list_frame.grid_columnconfigure(0, weight=1)
+        self.holiday_list_frame.grid_propagate(False)  # altura fija aunque haya pocas filas
+
+        self.holiday_scrollbar = ctk.CTkScrollbar(list_frame, command=self._on_scrollbar)
+        self.holiday_scrollbar.pack(side="right", fill="y")
+
+        self._bind_wheel(self.holiday_list_frame)
+        for slot in range(VISIBLE_ROWS):
+            self._create_row(slot)
         
         # Quick presets
         preset_frame = ctk.CTkFrame(self, fg_color="transparent")
         preset_frame.pack(fill="x", padx=10, pady=(0,10))
         
+        self.region_menu = ctk.CTkOptionMenu(
+            preset_frame,
+            values=list(REGIONAL_RULES),
+            width=80,
+            height=28
+        )
+        self.region_menu.set("ES")
+        self.region_menu.pack(side="left", padx=2)
+
         ctk.CTkButton(
             preset_frame, 
-            text="Añadir festivos nacionales", 
-            width=120, 
+            text="Añadir festivos", 
+            width=100, 
             height=28,
             command=self.add_es_holidays
         ).pack(side="left", padx=2)
         
+        ctk.CTkButton(
+            preset_frame,
+            text="Importar...",
+            width=80,
+            height=28,
+            command=self.import_holidays
+        ).pack(side="left", padx=2)
+
         ctk.CTkButton(
             preset_frame, 
             text="Borrar todos", 
@@ -94,8 +134,8 @@ class HolidayPanel(ctk.CTkFrame):
                 if holiday_iso not in self.holidays:
                     self.holidays.append(holiday_iso)
                     self.holiday_entry.delete(0, 'end')
-                    self.refresh_holiday_list()
-                    save_festivos(self.holidays)
+                    self._insert_item(holiday_iso)
+                    self.app.holiday_writer.schedule(self.holidays)
                     self.app.update_status(f"Añadido festivo: {holiday_date}") 
             except ValueError:
                 messagebox.showerror(
@@ -103,84 +143,156 @@ class HolidayPanel(ctk.CTkFrame):
                     "Por favor, introduce una fecha en formato DD/MM/AAAA"
                 )
 
+    def _create_row(self, slot):
+        """Una fila del pool: se crea una vez y luego solo cambia su texto"""
+        item_frame = ctk.CTkFrame(self.holiday_list_frame, fg_color="gray20")
+        label = ctk.CTkLabel(item_frame, text="")
+        label.pack(side="left", padx=10, pady=5)
+
+        remove_btn = ctk.CTkButton(
+            item_frame, 
+            text="×", 
+            width=30, 
+            height=25,
+            fg_color=COLORS['error'], 
+            hover_color="#C0392B",
+            command=lambda s=slot: self._remove_slot(s)
+        )
+        remove_btn.pack(side="right", padx=5, pady=2)
+
+        self._bind_wheel(item_frame)
+        self._bind_wheel(label)
+        self._rows.append((item_frame, label, remove_btn))
+        self._row_state.append(None)
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", lambda e: self._scroll_by(-SCROLL_STEP if e.delta > 0 else SCROLL_STEP))
+        widget.bind("<Button-4>", lambda e: self._scroll_by(-SCROLL_STEP))  # Linux
+        widget.bind("<Button-5>", lambda e: self._scroll_by(SCROLL_STEP))
+
     def refresh_holiday_list(self):
-        """Refresh the holiday list display"""
-        # Clear existing items
-        for widget in self.holiday_list_frame.winfo_children():
-            widget.destroy()
-        
-        # Add holiday items
-        for i, holiday in enumerate(sorted(self.holidays)):
-            item_frame = ctk.CTkFrame(
-                self.holiday_list_frame, 
-                fg_color="gray20" if i % 2 == 0 else "gray15"
-            )
-            item_frame.pack(fill="x", pady=1)
-
-            # Convertir YYYY-MM-DD → DD/MM/YYYY
-            try:
-                fecha_obj = datetime.strptime(holiday, "%Y-%m-%d")
-                fecha_str = fecha_obj.strftime("%d/%m/%Y")
-            except ValueError:
-                fecha_str = holiday  # fallback por si hay un valor raro
-            
-            ctk.CTkLabel(
-                item_frame, 
-                text=fecha_str
-            ).pack(side="left", padx=10, pady=5)
-            
-            remove_btn = ctk.CTkButton(
-                item_frame, 
-                text="×", 
-                width=30, 
-                height=25,
-                fg_color=COLORS['error'], 
-                hover_color="#C0392B",
-                command=lambda h=holiday: self.remove_holiday(h)
-            )
-            remove_btn.pack(side="right", padx=5, pady=2)
+        """Recarga el listado completo (tras cambios masivos: región, importación, borrar todo)"""
+        # Expandir las reglas del año actual y siguientes antes de listar
+        current_year = datetime.now().year
+        self.holidays.ensure_years(current_year, current_year + DISPLAY_YEARS_AHEAD)
+        self._items = list(self.holidays)
+        self._scroll_to(self._first, force=True)
+
+    def _insert_item(self, holiday):
+        """Añade una fecha al listado sin reconstruirlo: solo se repintan las filas desde ella"""
+        if len(self.holidays) != len(self._items) + 1:
+            # La fecha caía en un año aún no expandido y ha traído sus reglas consigo
+            self.refresh_holiday_list()
+            return
+        index = bisect.bisect_left(self._items, holiday)
+        self._items.insert(index, holiday)
+        if index < self._first:
+            self._first += 1  # la vista no se mueve
+        self._render(max(index - self._first, 0))
+
+    def _remove_item(self, holiday):
+        if len(self.holidays) != len(self._items) - 1:
+            self.refresh_holiday_list()
+            return
+        index = bisect.bisect_left(self._items, holiday)
+        if index < len(self._items) and self._items[index] == holiday:
+            del self._items[index]
+        if index < self._first:
+            self._first -= 1
+        self._scroll_to(self._first, from_slot=max(index - self._first, 0))
+
+    def _scroll_by(self, rows):
+        self._scroll_to(self._first + rows)
+
+    def _on_scrollbar(self, action, value, units=None):
+        if action == "moveto":
+            self._scroll_to(round(float(value) * len(self._items)))
+        elif action == "scroll":
+            self._scroll_to(self._first + int(float(value)) * (VISIBLE_ROWS if units == "pages" else 1))
+
+    def _scroll_to(self, first, force=False, from_slot=None):
+        first = max(0, min(first, len(self._items) - VISIBLE_ROWS))
+        if first != self._first or force:
+            from_slot = 0
+        self._first = first
+        if from_slot is not None:
+            self._render(from_slot)
+
+    def _render(self, from_slot=0):
+        """Pinta las filas visibles desde `from_slot`; las que sobran se ocultan"""
+        for slot in range(from_slot, VISIBLE_ROWS):
+            item_frame, label, _ = self._rows[slot]
+            index = self._first + slot
+            if index >= len(self._items):
+                if self._row_state[slot] is not None:
+                    item_frame.grid_remove()
+                    self._row_state[slot] = None
+                continue
+
+            holiday = self._items[index]
+            # YYYY-MM-DD → DD/MM/YYYY sin parsear
+            state = (f"{holiday[8:10]}/{holiday[5:7]}/{holiday[:4]}", "gray20" if index % 2 == 0 else "gray15")
+            if state != self._row_state[slot]:
+                label.configure(text=state[0])
+                item_frame.configure(fg_color=state[1])
+                if self._row_state[slot] is None:
+                    item_frame.grid(row=slot, column=0, sticky="ew", pady=1)
+                self._row_state[slot] = state
+
+        total = len(self._items)
+        if total > VISIBLE_ROWS:
+            self.holiday_scrollbar.set(self._first / total, (self._first + VISIBLE_ROWS) / total)
+        else:
+            self.holiday_scrollbar.set(0, 1)
+
+    def _remove_slot(self, slot):
+        index = self._first + slot
+        if index < len(self._items):
+            self.remove_holiday(self._items[index])
 
     def remove_holiday(self, holiday):
         """Remove a holiday from the list"""
         if holiday in self.holidays:
             self.holidays.remove(holiday)
-            self.refresh_holiday_list()
-            save_festivos(self.holidays)
+            self._remove_item(holiday)
+            self.app.holiday_writer.schedule(self.holidays)
             self.app.update_status(f"Eliminado festivo: {holiday}")
 
     def add_es_holidays(self):
-        """Add common ES holidays"""
-        es_holidays = [
-            ("01-01", "Año Nuevo"),
-            ("01-06", "Reyes Magos"),
-            ("05-01", "Día del Trabajo"),
-            ("08-15", "Asunción"),
-            ("10-12", "Hispanidad"),
-            ("11-01", "Todos los Santos"),
-            ("12-06", "Constitución"),
-            ("12-08", "Inmaculada"),
-            ("12-25", "Navidad")
-        ]
-
-        # Obtener año actual
-        current_year = datetime.now().year
+        """Activa el conjunto regional elegido (ES = nacionales, Pascua incluida) para todos los años"""
+        region = self.region_menu.get()
+        if self.holidays.add_region(region):
+            self.refresh_holiday_list()
+            self.app.holiday_writer.schedule(self.holidays)
+            self.app.update_status(f"Añadidos festivos {region} (todos los años)")
 
-        added = False
-        for date, _ in es_holidays:
-            full_date = f"{current_year}-{date}"
-            if full_date not in self.holidays:
-                self.holidays.append(full_date)
-                added = True
+    def import_holidays(self):
+        """Importa una lista de festivos (.csv / .ics) con una sola escritura"""
+        filepath = filedialog.askopenfilename(
+            parent=self.app,
+            title="Importar festivos",
+            filetypes=[("Listas de festivos", "*.csv *.ics"), ("CSV", "*.csv"), ("iCalendar", "*.ics")]
+        )
+        if not filepath:
+            return
+        try:
+            dates, rules = import_festivos(filepath)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error importando festivos", str(e))
+            return
 
+        added = self.holidays.extend(dates) + self.holidays.add_rules(rules)
         if added:
             self.refresh_holiday_list()
-            save_festivos(self.holidays)
-            self.app.update_status("Añadidos festivos nacionales para el año actual")
+            self.app.holiday_writer.schedule(self.holidays)
+        self.app.update_status(
+            f"Importados {len(dates)} festivos y {len(rules)} reglas ({added} nuevos)"
+        )
 
     def clear_holidays(self):
         """Clear all holidays"""
         if self.holidays:
             self.holidays.clear()
             self.refresh_holiday_list()
-            save_festivos(self.holidays)
+            self.app.holiday_writer.schedule(self.holidays)
             self.app.update_status("Eliminados todos los festivos")
\ No newline at end of file
@@ -48,9 +48,5 @@ class LogPanel(ctk.CTkFrame):
         )
         self.txt_log.pack(fill="both", expand=True, padx=10, pady=(0, 10))
 
-        # Configure log manager
-        self.app.log_manager.set_log_widget(self.txt_log)
-
-        # Show existing logs if any
-        for entry in self.app.log_manager.logs:
-            self.app.log_manager._append_to_log_box(entry)
\ No newline at end of file
+        # Configure log manager (replays existing logs into the widget)
+        self.app.log_manager.set_log_widget(self.txt_log)
\ No newline at end of file
@@ -1,5 +1,6 @@
 import customtkinter as ctk
 from config import COLORS
+from services.tracing import span
 
 
 class MainPanel(ctk.CTkFrame):
@@ -145,6 +146,16 @@ class MainPanel(ctk.CTkFrame):
         )
         self.delete_btn.pack(side="left", padx=5)
 
+        self.download_btn = ctk.CTkButton(
+            right_frame,
+            text="Descargar de SharePoint",
+            width=150, height=40,
+            fg_color=COLORS['info'],
+            font=ctk.CTkFont(size=14),
+            command=self.app.export_from_sharepoint
+        )
+        self.download_btn.pack(side="left", padx=5)
+
         self.sync_btn = ctk.CTkButton(
             right_frame,
             text="Subir a SharePoint",
@@ -174,14 +185,15 @@ class MainPanel(ctk.CTkFrame):
             data (list[dict] | None): Registros a mostrar en la grid.
                                       Si es None, se usa self.app.class_data.
         """
-        for widget in self.data_rows_frame.winfo_children():
-            widget.destroy()
-        
         # Si no se pasa data, usamos class_data
         rows = data if data is not None else self.app.class_data
 
-        for i, row_data in enumerate(rows):
-            self.create_data_row(row_data, i)
+        with span("ui.refresh_data_grid", rows=len(rows)):
+            for widget in self.data_rows_frame.winfo_children():
+                widget.destroy()
+
+            for i, row_data in enumerate(rows):
+                self.create_data_row(row_data, i)
 
     def create_data_row(self, row_data, row_index):
         """Create a single data row"""
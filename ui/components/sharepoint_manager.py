@@ -1,37 +1,55 @@
 # File: ui/components/sharepoint_manager.py
-import asyncio
 import math
-import threading
 from datetime import datetime
-from tkinter import messagebox
-from config import COLORS
-from services.sharepoint_service import SharePointService
+from tkinter import filedialog, messagebox
+from config import COLORS, SP_LIST_NAME
 from ui.components.dialogs import SharePointDialog
+from ui.utils.progress_dispatcher import ProgressDispatcher
+from services.progress import ProgressTracker
+from services.jobs import JobCancelled
+from services.table_writers import pyarrow_available
+from services.profiling import run_coroutine
 
 
 class SharePointManager:
     def __init__(self, app):
         self.app = app        
         self.log_fn = app.log        
-        self.sp_service = SharePointService(log_callback=app.log)
+        self._sp_service = None
+        # Eventos de progreso -> hilo de Tk, como mucho 10 veces por segundo
+        self.progress = ProgressDispatcher(app, lambda e: self.app.status_bar.show_progress(e))
         
-    def authenticate(self, on_success=None):
-        """Start SharePoint authentication process"""
+    @property
+    def sp_service(self):
+        """SharePointService (msal, aiohttp y requests se importan en el primer uso)"""
+        if self._sp_service is None:
+            from services.sharepoint_service import SharePointService
+            self._sp_service = SharePointService(log_callback=self.app.log)
+        return self._sp_service
+
+    def authenticate(self, on_success=None, force=False):
+        """Start SharePoint authentication process (reusa la sesión si sigue vigente)"""
+        if self.sp_service.is_session_ready and not force:
+            self._complete_auth(on_success)
+            return
+
         self.app.update_status("Autenticando con SharePoint...")
         self.app.log(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - Autenticando con SharePoint")
         self.app.status_bar.set_progress(0.5)
 
-        def auth_process():
+        def auth_process(cancel_event):
             try:
-                if self.sp_service.authenticate():
+                if self.sp_service.authenticate(force=force):
                     self.app.after(0, lambda: self._complete_auth(on_success))
                 else:
                     self.app.after(0, self._auth_failed)
             except Exception as e:
                 self.app.log(f"Error en autenticación: {str(e)}")
                 self.app.after(0, self._auth_failed)
+                raise
 
-        threading.Thread(target=auth_process, daemon=True).start()
+        if self.app.submit_job("Autenticar SharePoint", "sharepoint", auth_process) is None:
+            self.app.status_bar.set_progress(0)
     
     def _complete_auth(self, on_success=None):
         """Handle successful authentication"""
@@ -111,7 +129,7 @@ class SharePointManager:
     def _perform_sync(self, mode: str):
         """Execute the sync operation in the chosen mode ('replace' or 'update')"""
         self.app.update_status("Sincronizando con SharePoint...")
-        self.app.status_bar.set_progress(0.1)
+        self.app.status_bar.set_progress(0)
 
         if not self.app.class_data:
             self.app.log("⚠️ No hay registros en class_data para insertar.")
@@ -125,18 +143,26 @@ class SharePointManager:
             for row in self.app.class_data
         ]
 
-        def sync_process():
+        def sync_process(cancel_event):
             try:                
-                ok = self.sp_service.sync_data(clean_data, mode=mode)
+                ok = self.sp_service.sync_data(clean_data, mode=mode, progress_cb=self.progress,
+                                               cancel_event=cancel_event)
                 if ok:
                     self.app.after(0, self._complete_sync)
                 else:
                     self.app.after(0, self._sync_failed)
+            except JobCancelled:
+                self.app.log("🛑 Sincronización cancelada por el usuario.")
+                self.app.after(0, self._sync_failed)
+                raise
             except Exception as e:
                 self.app.log(f"Error en sincronización: {str(e)}")
                 self.app.after(0, self._sync_failed)
+                raise
 
-        threading.Thread(target=sync_process, daemon=True).start()
+        # Un doble clic no lanza dos sincronizaciones: el planificador rechaza el duplicado
+        if self.app.submit_job("Sincronizar SharePoint", "sharepoint", sync_process) is None:
+            self.app.status_bar.set_progress(0)
     
     def _complete_sync(self):
         """Handle successful sync"""
@@ -157,22 +183,71 @@ class SharePointManager:
         """Autentica y borra todos los elementos de la lista SharePoint"""
         def continue_delete():
             self.app.update_status("Borrando todos los elementos de SharePoint...")
-            self.app.status_bar.set_progress(0.3)
+            self.app.status_bar.set_progress(0)
 
-            def delete_process():
+            def delete_process(cancel_event):
                 try:
-                    ok = asyncio.run(self.sp_service.delete_all_items_async())                    
+                    tracker = ProgressTracker("Borrado", sink=self.progress)
+                    ok = run_coroutine(self.sp_service.delete_all_items_async(
+                        progress_cb=tracker.update,
+                        throttle_cb=tracker.add_throttle,
+                        cancel_event=cancel_event
+                    ))
+                    tracker.finish()
                     if ok and self.sp_service.is_list_empty():
                         self.app.after(0, lambda: messagebox.showinfo("✅ Borrado verificado", "La lista está vacía."))
                     else:
                         self.app.after(0, lambda: messagebox.showwarning("⚠️ Verificación fallida", "La lista aún contiene elementos."))
 
+                except JobCancelled:
+                    self.app.log("🛑 Borrado cancelado por el usuario.")
+                    raise
                 except Exception as e:
                     self.app.log(f"Error en borrado: {str(e)}")
                     self.app.after(0, lambda: messagebox.showerror("Error", f"No se pudo completar el borrado: {str(e)}"))
+                    raise
                 finally:
-                    self.app.status_bar.set_progress(0)
+                    self.app.after(0, lambda: self.app.status_bar.set_progress(0))
 
-            threading.Thread(target=delete_process, daemon=True).start()
+            self.app.submit_job("Borrar lista SharePoint", "sharepoint", delete_process)
 
         self.authenticate(on_success=continue_delete)
+
+    def export_from_sharepoint(self):
+        """Descarga la lista de SharePoint (con asistencia) a Excel/Parquet/CSV"""
+        filepath = filedialog.asksaveasfilename(
+            defaultextension=".xlsx",
+            filetypes=[("Excel files", "*.xlsx")]
+                      + ([("Parquet files", "*.parquet")] if pyarrow_available() else [])
+                      + [("CSV files", "*.csv")],
+            initialfile=f"{SP_LIST_NAME}.xlsx",
+            title="Guardar lista de SharePoint como"
+        )
+        if not filepath:
+            return
+
+        def continue_export():
+            self.app.update_status("Descargando lista de SharePoint...")
+            self.app.status_bar.set_progress(0)
+
+            def export_process(cancel_event):
+                try:
+                    tracker = ProgressTracker("Descarga", sink=self.progress)
+                    self.sp_service.export_list(filepath, progress_cb=tracker.update,
+                                                cancel_event=cancel_event)
+                    tracker.finish()
+                    self.app.after(0, lambda: self.app.update_status(f"Lista de SharePoint exportada a {filepath}"))
+                except JobCancelled:
+                    self.app.log("🛑 Descarga cancelada por el usuario.")
+                    raise
+                except Exception as e:
+                    msg = str(e)
+                    self.app.log(f"Error exportando lista de SharePoint: {msg}")
+                    self.app.after(0, lambda m=msg: messagebox.showerror("Error", f"No se pudo exportar la lista: {m}"))
+                    raise
+                finally:
+                    self.app.after(0, lambda: self.app.status_bar.set_progress(0))
+
+            self.app.submit_job("Descargar lista SharePoint", "sharepoint", export_process)
+
+        self.authenticate(on_success=continue_export)
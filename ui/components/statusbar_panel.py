@@ -29,6 +29,15 @@ class StatusBar(ctk.CTkFrame):
             font=ctk.CTkFont(size=12)
         )
         self.status_label.pack(side="left", padx=10, pady=15)
+
+        # Throughput / ETA de trabajos largos
+        self.throughput_label = ctk.CTkLabel(
+            self,
+            text="",
+            font=ctk.CTkFont(size=12),
+            text_color=COLORS['neutral']
+        )
+        self.throughput_label.pack(side="left", padx=10, pady=15)
         
         # # Log button
         # self.log_btn = ctk.CTkButton(
@@ -40,6 +49,37 @@ class StatusBar(ctk.CTkFrame):
         # )
         # self.log_btn.pack(side="right", padx=20, pady=15)
 
+        # Performance button (spans agregados de services.tracing)
+        self.perf_btn = ctk.CTkButton(
+            self,
+            text="Rendimiento",
+            width=90,
+            height=30,
+            command=self.app.show_performance
+        )
+        self.perf_btn.pack(side="right", padx=5)
+
+        # Jobs button (ver / cancelar trabajos en segundo plano)
+        self.jobs_btn = ctk.CTkButton(
+            self,
+            text="Trabajos",
+            width=80,
+            height=30,
+            command=self.app.show_jobs
+        )
+        self.jobs_btn.pack(side="right", padx=(5, 20))
+
+        # Profiling switch (cProfile + tracemalloc de los trabajos siguientes)
+        self.profile_switch = ctk.CTkSwitch(
+            self,
+            text="Perfilar",
+            width=80,
+            command=self.toggle_profiling
+        )
+        if self.app.profiling_enabled:
+            self.profile_switch.select()
+        self.profile_switch.pack(side="right", padx=5)
+
         # Test SharePoint connection button
         self.test_sp_btn = ctk.CTkButton(
             self,
@@ -67,10 +107,29 @@ class StatusBar(ctk.CTkFrame):
         self.status_label.update()
 
     def set_progress(self, value: float):
-        """Set progress bar value (0-1)"""
+        """Set progress bar value (0-1); el resumen del último trabajo se conserva"""
         self.progress_bar.set(value)
 
+    def clear_summary(self):
+        """Borra el resumen de velocidad (al empezar el siguiente trabajo)"""
+        self.throughput_label.configure(text="")
+
+    def show_progress(self, event):
+        """Pinta un ProgressEvent: barra de progreso y velocidad/ETA"""
+        # El evento final solo deja el resumen; la barra la resetea quien termina el trabajo
+        if event.fraction is not None and not event.finished:
+            self.progress_bar.set(event.fraction)
+        self.throughput_label.configure(text=event.format())
+
     
+    def update_jobs(self, active: int):
+        """Muestra el número de trabajos activos en el botón de trabajos"""
+        self.jobs_btn.configure(text=f"Trabajos ({active})" if active else "Trabajos")
+
+    def toggle_profiling(self):
+        """Activa/desactiva el perfilado de los trabajos que se lancen a partir de ahora"""
+        self.app.set_profiling(bool(self.profile_switch.get()))
+
     def test_database(self):
         """Wrapper para el test de BD de la app"""
         self.app.test_database_connection()
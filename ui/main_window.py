@@ -1,10 +1,15 @@
 # File: ui/main_window.py
 import customtkinter as ctk
 import tkinter as tk
+from datetime import datetime
+from tkinter import messagebox
+from config import DB_WARMUP, PROFILE_ENABLED
+from services.holiday_service import FestivosWriter, load_festivos
+from services.jobs import JobRejected, JobScheduler
+from services.profiling import ProfileSession
+from services.tracing import tracer
 
-from services.holiday_service import load_festivos
-
-from ui.components.dialogs import ConfirmDialog
+from ui.components.dialogs import ConfirmDialog, JobsDialog, PerformanceDialog
 from ui.components.header import Header
 from ui.components.config_panel import ConfigPanel
 from ui.components.calendar_manager import CalendarManager
@@ -24,8 +29,15 @@ class SharePointSyncApp(ctk.CTk):
         super().__init__()
         self.calendar_df = None
         self.logs = []
+        # Interruptor "Perfilar" de la StatusBar: cada trabajo deja un paquete en PROFILE_DIR
+        self.profiling_enabled = PROFILE_ENABLED
 
         self.log_manager = LogManager(self)
+        # Planificador compartido: un trabajo a la vez por recurso ("db", "sharepoint")
+        self.jobs = JobScheduler(
+            log_callback=self.log,
+            on_change=lambda: self.after(0, self._on_jobs_changed)
+        )
         self.db_manager = DatabaseManager(self)
         self.calendar_manager = CalendarManager(self)
         self.sp_manager = SharePointManager(self)
@@ -41,7 +53,8 @@ class SharePointSyncApp(ctk.CTk):
         self.grid_rowconfigure(1, weight=1)
         
         # Initialize data
-        self.holidays = load_festivos()
+        self.holidays = load_festivos(log_callback=self.log)
+        self.holiday_writer = FestivosWriter(log_callback=self.log)
         self.class_data = []
         # self.db_connected = False
         # self.sp_authenticated = False
@@ -58,6 +71,10 @@ class SharePointSyncApp(ctk.CTk):
         # Load sample data
         self.load_sample_data()
 
+        # Precalentar el pool de la BD una vez pintada la ventana
+        if DB_WARMUP:
+            self.after(500, self.db_manager.warm_up)
+
     # ------------------------------
     # FUNCIÓN PRINCIPAL DE LOGS
     # ------------------------------
@@ -68,6 +85,44 @@ class SharePointSyncApp(ctk.CTk):
         self.log_manager.show_logs()
 
 
+    # ------------------------------
+    # TRABAJOS EN SEGUNDO PLANO
+    # ------------------------------
+    def submit_job(self, name: str, resource: str, fn, on_done=None):
+        """Encola un trabajo; si se rechaza (duplicado/cola llena) avisa y devuelve None"""
+        label = f"{name} {datetime.now().strftime('%H:%M:%S')}"
+        profiled = self.profiling_enabled
+
+        def traced_fn(cancel_event):
+            # Los spans del trabajo se agrupan bajo su nombre en la ventana "Rendimiento"
+            tracer.begin_run(label)
+            # El resumen "N · X/s" del trabajo anterior se mantiene hasta que empieza este
+            self.after(0, self.status_bar.clear_summary)
+            if not profiled:
+                return fn(cancel_event)
+            with ProfileSession(name, log_callback=self.log):
+                return fn(cancel_event)
+
+        try:
+            return self.jobs.submit(name, resource, traced_fn, on_done=on_done)
+        except JobRejected as e:
+            messagebox.showinfo("Trabajo en curso", str(e))
+            return None
+
+    def show_jobs(self):
+        JobsDialog(self, self.jobs)
+
+    def set_profiling(self, enabled: bool):
+        self.profiling_enabled = enabled
+        self.log(f"🧪 Perfilado {'activado' if enabled else 'desactivado'}")
+
+    def show_performance(self):
+        PerformanceDialog(self, tracer)
+
+    def _on_jobs_changed(self):
+        if hasattr(self, "status_bar"):
+            self.status_bar.update_jobs(len(self.jobs.active_jobs()))
+
     # Event handlers and business logic methods
     def test_database_connection(self):
         """Test database connection"""
@@ -86,7 +141,8 @@ class SharePointSyncApp(ctk.CTk):
         self.calendar_manager.load_cal()
     
     def authenticate_sharepoint(self):
-        self.sp_manager.authenticate()
+        # El test explícito vuelve a validar site/list aunque haya sesión
+        self.sp_manager.authenticate(force=True)
 
     def sync_to_sharepoint(self):
         self.sp_manager.sync_to_sharepoint()
@@ -97,6 +153,9 @@ class SharePointSyncApp(ctk.CTk):
 
     def delete_all_items(self):
         self.sp_manager.delete_all_items()
+
+    def export_from_sharepoint(self):
+        self.sp_manager.export_from_sharepoint()
     
     def load_sample_data(self):        
         """Load data from calendar_df and show a preview in the grid"""        
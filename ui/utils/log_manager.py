@@ -1,38 +1,115 @@
 import customtkinter as ctk
+import logging
+import os
+import queue
+from collections import deque
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from config import LOG_FILE, LOG_FILE_BACKUPS, LOG_FILE_MAX_BYTES, LOG_FLUSH_MS, LOG_LEVEL, LOG_MAX_LINES
+
+LEVELS = {"DEBUG": logging.DEBUG, "INFO": logging.INFO, "WARNING": logging.WARNING, "ERROR": logging.ERROR}
+
+
+def infer_level(message: str) -> int:
+    """Nivel de un mensaje de los servicios (usan texto libre con emojis)"""
+    if "[DEBUG]" in message:
+        return logging.DEBUG
+    head = message.lstrip()[:12]
+    if head.startswith(("❌", "Error")):
+        return logging.ERROR
+    if head.startswith("⚠️"):
+        return logging.WARNING
+    return logging.INFO
+
 
 class LogManager:
+    """
+    Logs de la app sin bloquear a quien escribe: `log()` solo encola (es
+    seguro desde cualquier hilo) y el hilo de Tk vuelca lo pendiente en un
+    único insert cada LOG_FLUSH_MS. Se guardan las últimas LOG_MAX_LINES
+    líneas; con LOG_FILE se escribe además a un fichero rotativo.
+    """
     def __init__(self, app):
         self.app = app
-        self.logs = []
+        self.logs = deque(maxlen=LOG_MAX_LINES)
         self.txt_log = None
+        self.level = LEVELS.get(LOG_LEVEL, logging.INFO)
+        self.max_lines = LOG_MAX_LINES
+        self._pending = queue.SimpleQueue()
+        self._file_logger, self._listener = self._setup_file_log()
+        self.app.after(LOG_FLUSH_MS, self._flush)
+
+    def _setup_file_log(self):
+        """Fichero rotativo escrito por un QueueListener (la E/S de disco va en su propio hilo)"""
+        if not LOG_FILE:
+            return None, None
+        directory = os.path.dirname(LOG_FILE)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = RotatingFileHandler(LOG_FILE, maxBytes=LOG_FILE_MAX_BYTES,
+                                      backupCount=LOG_FILE_BACKUPS, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+        records = queue.SimpleQueue()
+        listener = QueueListener(records, handler)
+        listener.start()
+
+        logger = logging.getLogger("gencal")
+        logger.setLevel(self.level)
+        logger.propagate = False
+        logger.addHandler(QueueHandler(records))
+        return logger, listener
 
     def set_log_widget(self, txt_log):
         """Set the text widget for displaying logs"""
         self.txt_log = txt_log
+        if self.logs:
+            self._append_to_log_box(list(self.logs))
 
-    def log(self, message: str):
-        """Add a message to the list of logs and update viewer"""
+    def log(self, message: str, level: int = None):
+        """Add a message to the log pipeline (thread-safe; DEBUG is dropped unless LOG_LEVEL=DEBUG)"""
+        level = infer_level(message) if level is None else level
+        if level < self.level:
+            return
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        entry = f"{timestamp} - {message}"
+        self._pending.put(f"{timestamp} - {message}")
+        if self._file_logger is not None:
+            self._file_logger.log(level, message)
 
-        # Save to history
-        self.logs.append(entry)
+    def _flush(self):
+        """Vuelca al visor los mensajes pendientes (hilo de Tk, a ritmo fijo)"""
+        entries = []
+        try:
+            while len(entries) < self.max_lines:
+                entries.append(self._pending.get_nowait())
+        except queue.Empty:
+            pass
 
-        # Update viewer if exists
-        if self.txt_log is not None:
-            # Ensure UI updates happen in the main thread
-            self.app.after(0, lambda e=entry: self._append_to_log_box(e))
+        if entries:
+            self.logs.extend(entries)
+            if self.txt_log is not None:
+                self._append_to_log_box(entries)
+        self.app.after(LOG_FLUSH_MS, self._flush)
 
-    def _append_to_log_box(self, entry: str):
-        """Insert text in the log viewer"""
+    def _append_to_log_box(self, entries):
+        """Insert a block of lines in the log viewer and trim it to max_lines"""
         if self.txt_log is None:
             return
+        # Si llega más de lo que cabe, solo se insertan las últimas líneas
+        entries = entries[-self.max_lines:]
         self.txt_log.configure(state="normal")
-        self.txt_log.insert("end", entry + "\n")
+        self.txt_log.insert("end", "\n".join(entries) + "\n")
+        lines = int(self.txt_log.index("end-1c").split(".")[0]) - 1
+        if lines > self.max_lines:
+            self.txt_log.delete("1.0", f"{lines - self.max_lines + 1}.0")
         self.txt_log.see("end")
         self.txt_log.configure(state="disabled")
 
+    def shutdown(self):
+        """Vacía y detiene el escritor del fichero de log"""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
     def show_logs(self):
         """Show all logs in a separate window"""
         log_window = ctk.CTkToplevel(self.app)
@@ -43,7 +120,6 @@ class LogManager:
         log_text.pack(fill="both", expand=True, padx=10, pady=10)
 
         log_text.configure(state="normal")
-        for entry in self.logs:
-            log_text.insert("end", entry + "\n")
+        log_text.insert("end", "\n".join(self.logs) + ("\n" if self.logs else ""))
         log_text.see("end")
-        log_text.configure(state="disabled")
\ No newline at end of file
+        log_text.configure(state="disabled")
@@ -0,0 +1,34 @@
+import threading
+
+
+class ProgressDispatcher:
+    """
+    Lleva eventos de progreso desde hilos de trabajo al hilo de Tk.
+
+    Solo se conserva el último evento y se entrega como mucho `max_hz` veces
+    por segundo, para no inundar la cola de eventos de Tk.
+    """
+    def __init__(self, app, handler, max_hz: float = 10):
+        self.app = app
+        self.handler = handler
+        self.interval_ms = max(1, int(1000 / max_hz))
+        self._lock = threading.Lock()
+        self._latest = None
+        self._scheduled = False
+
+    def __call__(self, event):
+        with self._lock:
+            self._latest = event
+            if self._scheduled:
+                return
+            self._scheduled = True
+        # Los eventos finales se entregan enseguida; el resto, al ritmo máximo
+        delay = 0 if getattr(event, "finished", False) else self.interval_ms
+        self.app.after(delay, self._flush)
+
+    def _flush(self):
+        with self._lock:
+            event, self._latest = self._latest, None
+            self._scheduled = False
+        if event is not None:
+            self.handler(event)